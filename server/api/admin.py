@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Item
+from .models import Item, Job, ComponentTemplate
 
 
 @admin.register(Item)
@@ -7,3 +7,18 @@ class ItemAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'created_at', 'updated_at')
     list_filter = ('created_at', 'updated_at')
     search_fields = ('name', 'description')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status', 'created_at')
+    search_fields = ('id', 'error')
+
+
+@admin.register(ComponentTemplate)
+class ComponentTemplateAdmin(admin.ModelAdmin):
+    list_display = ('id', 'architecture_hash', 'structure_hash', 'hits', 'created_at', 'last_used_at')
+    list_filter = ('chain_version', 'created_at')
+    search_fields = ('architecture_hash', 'structure_hash')
+    exclude = ('shingles', 'signature')
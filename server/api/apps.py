@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # LangChain 체인을 서버 시작 시 한 번 등록하고 입력 변수를 검증
+        from utils.langchain import validate_chains
+        from .langchain.chains import register_chains
+
+        register_chains()
+        validate_chains()
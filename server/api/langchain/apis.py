@@ -1,14 +1,27 @@
 from rest_framework import viewsets, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from utils.langchain import initialize_langchain, get_langchain_model, set_prompt
-from langchain_core.output_parsers import JsonOutputParser
+from django.http import StreamingHttpResponse
+from django.db import connections
+from utils.langchain import initialize_langchain, get_chain_version, prewarm_connections, get_routed_chain, route_request, hedged_invoke, get_hedge_stats, get_json_repair_stats, warm_chains, TokenUsageCallbackHandler, get_endpoint_usage, get_route_stats, get_rate_governor, get_response_cache, get_single_flight, canonicalize_architecture, hash_canonical, strip_volatile_ids, restore_volatile_ids, get_message_text, stream_json_fields, format_sse_event, batch_each_with_latency, get_routed_chains
 from typing import Dict, Any, Optional
 import json
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
-from prompt.image_parse_prompt import image_text_extract_format_instruction, image_text_extract_prompt, image_description_format_instruction, image_description_prompt, image_construct_format_instruction, image_construct_prompt
-from prompt.ui_create_prompt import ui_component_format_instructions, ui_component_example, ui_component_prompt
 from .types import RequestImageDict
+from .renderers import EventStreamRenderer
+from utils.llm_image import prepare_image, image_summary
+from utils.metrics import stage_timer
+from utils.image_upload import read_image_upload, upload_summary, ImageUploadError
+from utils.image_store import get_image_store, get_chain_image_version, stored_image_digest
+from utils.ui_tree import plan_architecture, split_token_budget, plan_units, compose_plan, get_tree_id, diff_units, SPLIT_MAX_CONCURRENCY
+from .chains import UI_COMPONENT, UI_COMPONENT_EDIT, IMAGE_PARSE, IMAGE_DESCRIPTION
+from .component_library import find_component, edit_inputs, remember_component, record_library_result, get_library_stats
+from .jobs import submit_job, get_job, wait_for_job, job_summary
+from api.models import Job
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
@@ -18,110 +31,464 @@ def init_langchain(request, format=None):
     """
     # 실제 LangChain 초기화 로직 호출
     initialize_langchain()
-    print("Initialize LangChain")
+    # Anthropic API와 TLS 연결을 미리 맺어 첫 요청의 handshake 비용 제거
+    connections = prewarm_connections()
+    warm_chains()
+    print(f"Initialize LangChain (예열된 연결: {connections})")
 
     return Response({
         'status': 'Success',
         'message': 'LangChain initialized successfully'
     })
 
+def parse_request_body(request):
+    """
+    요청 본문을 JSON으로 파싱합니다. 실패 시 원본 문자열을 반환합니다.
+    """
+    with stage_timer('body_parse'):
+        try:
+            # request.body는 바이트 문자열이므로 디코딩 후 JSON으로 파싱
+            return json.loads(request.body.decode('utf-8'))
+        except Exception as e:
+            print(f"JSON 파싱 오류: {e}")
+            # 오류 발생 시 원본 바이트 문자열 사용
+            architecture = request.body.decode('utf-8')
+            print(f"원본 문자열 사용: {architecture}")
+            return architecture
+
+
+def adapt_library_component(architecture, canonical, volatile):
+    """
+    컴포넌트 라이브러리에서 구조가 같거나 비슷한 컴포넌트를 찾아 요청 architecture에 맞게 바꿉니다.
+    구조가 같으면 라벨만 치환하고, 비슷하면 찾은 컴포넌트를 작은 모델로 수정합니다.
+
+    Returns:
+        id를 placeholder로 바꾼 응답 또는 찾지 못하면 None
+    """
+    match = find_component(canonical)
+    if match is None:
+        return None
+    if match['component'] is not None:
+        return match['component']
+
+    route = route_request('req_ui_component_edit', architecture)
+    try:
+        response = get_routed_chain(UI_COMPONENT_EDIT, route).invoke(
+            edit_inputs(match['template'], architecture, volatile),
+            config={'callbacks': [TokenUsageCallbackHandler('req_ui_component_edit', route)]}
+        )
+    except Exception as e:
+        print(f"컴포넌트 수정 요청 오류: {e}")
+        record_library_result('edit_failures')
+        return None
+    record_library_result('edited')
+    stripped = strip_volatile_ids(response, volatile)
+    remember_component(canonical, stripped)
+    return stripped
+
+
+def generate_component(architecture):
+    """
+    architecture 하나의 JSX 코드를 생성합니다.
+    같은 architecture(id 제외)는 응답 캐시에서 가져오고, 동시에 들어온 같은 요청은 한 번만 호출합니다.
+    캐시에 없으면 컴포넌트 라이브러리에서 비슷한 컴포넌트를 찾아 재사용합니다.
+
+    Returns:
+        tuple: (응답, 캐시 사용 여부)
+    """
+    # 동일한 architecture(id 제외)에 대한 캐시된 응답이 있으면 바로 반환
+    cache = get_response_cache()
+    canonical, volatile = canonicalize_architecture(architecture)
+    cache_key = hash_canonical('req_ui_component', canonical)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return restore_volatile_ids(cached, volatile), True
+
+    # 요청 크기에 따라 선택된 모델로 구성된 체인 사용
+    route = route_request('req_ui_component', architecture)
+    chain = get_routed_chain(UI_COMPONENT, route)
+
+    def generate_and_cache():
+        # 구조가 같거나 비슷한 컴포넌트가 라이브러리에 있으면 라벨 치환 또는 짧은 수정 요청으로 생성
+        stripped = adapt_library_component(architecture, canonical, volatile)
+        if stripped is None:
+            # 응답이 관측된 p90 지연 시간을 넘기면 헤징 요청을 추가로 보냄
+            response = hedged_invoke(chain, {
+                "architecture": architecture,
+                "new_id" : architecture.get('newId', ''),
+            }, route, config={'callbacks': [TokenUsageCallbackHandler('req_ui_component', route)]})
+            stripped = strip_volatile_ids(response, volatile)
+            remember_component(canonical, stripped)
+        cache.set(cache_key, stripped)
+        return stripped
+
+    # 동시에 들어온 동일한 architecture는 한 번만 호출하고 결과(id 제외)를 함께 사용
+    return restore_volatile_ids(get_single_flight().do(cache_key, generate_and_cache), volatile), False
+
+
+def generate_split_component(architecture, plan):
+    """
+    architecture를 하위 트리로 나눠 병렬로 JSX 코드를 생성한 뒤 하나의 컴포넌트로 합칩니다. (utils.ui_tree)
+    - 증분 생성: 트리(treeId/id)별로 마지막 요청의 하위 트리 결과를 저장하므로 이전 요청과 같은 하위 트리는 다시 생성하지 않고 바뀐 하위 트리만 생성합니다.
+    - 분할 생성: 토큰 예산을 넘는 하위 트리는 다시 나누고, 모든 하위 트리를 동시에 생성하여 가장 큰 하위 트리의 생성 시간에 가깝게 응답합니다.
+
+    Args:
+        architecture (dict): 요청 architecture
+        plan (dict): plan_architecture()의 결과
+
+    Returns:
+        tuple: (합친 응답, 생성 정보) 또는 합친 결과가 검증을 통과하지 못한 경우 (None, None)
+    """
+    units = plan_units(plan)
+    volatiles = [canonicalize_architecture(unit)[1] for unit in units]
+    unit_keys = [hash_canonical('req_ui_component', canonicalize_architecture(unit)[0]) for unit in units]
+
+    # 같은 트리의 이전 요청과 비교 (트리별로 마지막 요청의 하위 트리 목록과 결과를 저장)
+    cache = get_response_cache()
+    tree_id = get_tree_id(architecture)
+    tree_key = hash_canonical('ui_tree', tree_id) if tree_id else None
+    previous = (cache.get(tree_key) if tree_key else None) or {}
+    stored = previous.get('fragments', {})
+
+    def generate_unit(unit, key, volatile):
+        # 같은 트리의 이전 결과에 같은 하위 트리가 있으면 다시 생성하지 않음
+        if key in stored:
+            return restore_volatile_ids(stored[key], volatile), True
+        try:
+            return generate_component(unit)
+        finally:
+            # 작업 스레드가 연 데이터베이스 연결(컴포넌트 라이브러리)은 Django가 닫지 않으므로 직접 닫음
+            connections.close_all()
+
+    # 바뀐 하위 트리만 동시에 생성 (호출한 스레드의 contextvars 유지)
+    with ThreadPoolExecutor(max_workers=max(1, min(len(units), SPLIT_MAX_CONCURRENCY))) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, generate_unit, *args) for args in zip(units, unit_keys, volatiles)]
+        results = [future.result() for future in futures]
+
+    response, errors = compose_plan(plan, [fragment for fragment, _ in results])
+    if errors:
+        print(f"하위 트리 결과를 합칠 수 없어 전체를 다시 생성합니다: {errors}")
+        return None, None
+
+    if tree_key:
+        cache.set(tree_key, {'units': unit_keys, 'fragments': {
+            key: strip_volatile_ids(fragment, volatile) for key, (fragment, _), volatile in zip(unit_keys, results, volatiles)
+        }})
+    regenerated = sum(not cached for _, cached in results)
+    return response, {
+        'units': len(units),
+        'regenerated': regenerated,
+        'reused': len(units) - regenerated,
+        **diff_units(previous.get('units'), unit_keys),
+    }
+
+
+def create_ui_component(architecture):
+    """
+    요청 architecture의 JSX 코드를 생성합니다. (req_ui_component와 백그라운드 작업에서 사용)
+    큰 architecture는 하위 트리로 나눠 동시에 생성하고, 증분 생성을 켜면 같은 트리(treeId/id)에서 바뀐 하위 트리만 다시 생성합니다.
+
+    Returns:
+        dict: message(응답), 하위 트리로 나눠 생성한 경우 incremental
+    """
+    if not isinstance(architecture, dict):
+        route = route_request('req_ui_component', architecture)
+        response = hedged_invoke(get_routed_chain(UI_COMPONENT, route), {
+            "architecture": architecture,
+            "new_id" : '',
+        }, route, config={'callbacks': [TokenUsageCallbackHandler('req_ui_component', route)]})
+        return {'message': response}
+
+    # 증분 생성 대상이거나 선택된 모델의 토큰 예산을 넘는 architecture는 하위 트리로 나눠 생성
+    plan = plan_architecture(architecture, split_token_budget(route_request('req_ui_component', architecture)['max_tokens']))
+    if 'children' in plan:
+        response, incremental = generate_split_component(architecture, plan)
+        if response is not None:
+            return {'message': response, 'incremental': incremental}
+
+    response, _ = generate_component(architecture)
+    return {'message': response}
+
+
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def req_ui_component(request, format=None):
     """
     LangChain을 통해 architecture를 받아 JSX 코드를 JSON 형식으로 반환
+    큰 architecture는 하위 트리로 나눠 동시에 생성하고, 증분 생성을 켜면 같은 트리(treeId/id)에서 바뀐 하위 트리만 다시 생성합니다.
+    """
+    architecture = parse_request_body(request)
+
+    return Response({
+        'status': 'Success',
+        **create_ui_component(architecture)
+    })
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def req_ui_component_batch(request, format=None):
+    """
+    여러 architecture를 한 번에 받아 JSX 코드를 생성
+    하나의 체인으로 chain.batch를 실행하며, 결과는 입력 순서대로 항목별 상태와 소요 시간을 포함합니다.
+    요청 형식: [architecture, ...] 또는 {"architectures": [...], "max_concurrency": N}
     """
     try:
-        # request.body는 바이트 문자열이므로 디코딩 후 JSON으로 파싱
-        import json
-        architecture = json.loads(request.body.decode('utf-8'))
+        body = json.loads(request.body.decode('utf-8'))
     except Exception as e:
         print(f"JSON 파싱 오류: {e}")
-        # 오류 발생 시 원본 바이트 문자열 사용
-        architecture = request.body.decode('utf-8')
-        print(f"원본 문자열 사용: {architecture}")
+        body = None
 
-    print("LangChain Model을 가져옵니다...")
-    model = get_langchain_model()
-    # 실제 LangChain 초기화 로직 호출
+    max_concurrency = None
+    if isinstance(body, dict):
+        max_concurrency = body.get('max_concurrency')
+        body = body.get('architectures')
+    if not isinstance(body, list):
+        return Response({
+            'status': 'Error',
+            'message': 'architecture 목록이 필요합니다.'
+        }, status=400)
+
+    cache = get_response_cache()
+    results = [None] * len(body)
+    pending = []
+    # 같은 요청 안에서 중복된 architecture는 한 번만 생성
+    duplicates = {}
+    for index, architecture in enumerate(body):
+        if not isinstance(architecture, dict):
+            results[index] = {'status': 'Error', 'message': 'architecture는 객체여야 합니다.', 'latency': 0.0, 'cached': False}
+            continue
+        canonical, volatile = canonicalize_architecture(architecture)
+        cache_key = hash_canonical('req_ui_component', canonical)
+        start = time.perf_counter()
+        if cache_key in duplicates:
+            duplicates[cache_key].append((index, volatile))
+            continue
+        cached = cache.get(cache_key)
+        if cached is not None:
+            results[index] = {'status': 'Success', 'message': restore_volatile_ids(cached, volatile), 'latency': time.perf_counter() - start, 'cached': True}
+            continue
+        duplicates[cache_key] = []
+        pending.append((index, architecture, cache_key, volatile))
+
+    # 항목별로 모델을 선택하고, 모델이 달라도 모든 항목을 하나의 동시 실행 제한 안에서 함께 실행
+    routes = [route_request('req_ui_component', architecture) for _, architecture, _, _ in pending]
+    chains = get_routed_chains(UI_COMPONENT, routes, 'req_ui_component_batch')
+
+    print(f"JSX 코드 {len(pending)}건을 배치로 생성합니다... ({', '.join(sorted({route['model'] for route in routes}))})")
+    outputs = batch_each_with_latency([
+        (chains[route['name']], {"architecture": architecture, "new_id": architecture.get('newId', '')})
+        for (_, architecture, _, _), route in zip(pending, routes)
+    ], max_concurrency)
+
+    for (index, _, cache_key, volatile), route, output in zip(pending, routes, outputs):
+        results[index] = {**output, 'cached': False, 'model': route['model']}
+        if output['status'] != 'Success':
+            for duplicate_index, _ in duplicates[cache_key]:
+                results[duplicate_index] = dict(results[index])
+            continue
+        stripped = strip_volatile_ids(output['message'], volatile)
+        cache.set(cache_key, stripped)
+        for duplicate_index, duplicate_volatile in duplicates[cache_key]:
+            results[duplicate_index] = {**results[index], 'message': restore_volatile_ids(stripped, duplicate_volatile)}
 
-    print('JSX 코드 생성을 위한 프롬프트를 설정합니다...')
-    parser = JsonOutputParser()
-    # JSON 스키마 형식 정의
-    
-    prompt = set_prompt(ui_component_prompt, ["architecture", "new_id"], {"format_instructions": ui_component_format_instructions, "example": ui_component_example})
-    # 체인 구성
-    chain = prompt.pipe(model).pipe(parser)
-    
-    # 딕셔너리에서 id 값 안전하게 추출
-    new_id = architecture.get('newId', '')
-    response = chain.invoke({
-        "architecture": architecture,
-        "new_id" : new_id,
-    })
-    
     return Response({
         'status': 'Success',
-        'message': response
+        'message': results
     })
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
-def req_parse_image(request, format=None):
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def req_ui_component_stream(request, format=None):
     """
-    LangChain을 통해 Image를 받아 컴포넌트를 추출
+    req_ui_component의 스트리밍 버전
+    생성 중인 JSON을 점진적으로 파싱하여 필드 단위 이벤트를 SSE로 전달
+    """
+    architecture = parse_request_body(request)
+
+    cache = get_response_cache()
+    cache_key = None
+    volatile = {}
+    if isinstance(architecture, dict):
+        canonical, volatile = canonicalize_architecture(architecture)
+        cache_key = hash_canonical('req_ui_component', canonical)
+
+    def event_stream():
+        # 캐시된 응답이 있으면 필드 이벤트를 한 번에 전달
+        cached = cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            response = restore_volatile_ids(cached, volatile)
+            for key, value in response.items():
+                yield format_sse_event('field', {'field': key, 'value': value})
+            yield format_sse_event('done', response)
+            return
+
+        # 파서 없이 모델 출력 조각을 그대로 받아 직접 파싱
+        route = route_request('req_ui_component', architecture)
+        chain = get_routed_chain(UI_COMPONENT, route, with_parser=False)
+
+        new_id = architecture.get('newId', '') if isinstance(architecture, dict) else ''
+        upstream = chain.stream({
+            "architecture": architecture,
+            "new_id": new_id,
+        }, config={'callbacks': [TokenUsageCallbackHandler('req_ui_component_stream', route)]})
+        try:
+            for event, data in stream_json_fields(get_message_text(chunk) for chunk in upstream):
+                if event == 'done' and cache_key is not None:
+                    cache.set(cache_key, strip_volatile_ids(data, volatile))
+                yield format_sse_event(event, data)
+        except Exception as e:
+            print(f"req_ui_component_stream 에서 에러 발생: {e}")
+            yield format_sse_event('error', {'message': str(e)})
+        finally:
+            # 최상위 객체가 완성되면 남은 생성을 중단
+            upstream.close()
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def prepare_request_image(base64_data):
+    """
+    요청의 이미지(base64 문자열 또는 업로드된 바이트)를 모델 입력용으로 축소/재압축합니다.
+
+    Returns:
+        tuple: (prepare_image 결과, None) 또는 (None, 오류 Response)
     """
     try:
-        # request.body는 바이트 문자열이므로 디코딩 후 JSON으로 파싱
-        import json
-        architecture: RequestImageDict = json.loads(request.body.decode('utf-8'))
+        return prepare_image(base64_data), None
     except Exception as e:
-        print(f"JSON 파싱 오류: {e}")
-        # 오류 발생 시 원본 바이트 문자열 사용
-        architecture = request.body.decode('utf-8')
-        print(f"원본 문자열 사용: {architecture}")
+        print(f"이미지 처리 오류: {e}")
+        return None, Response({
+            'status': 'Error',
+            'message': f'이미지를 읽을 수 없습니다: {e}'
+        }, status=400)
 
-    print("LangChain Model을 가져옵니다...")
-    model = get_langchain_model()
-    # 실제 LangChain 초기화 로직 호출
 
-    print('Image 파싱을 위한 프롬프트를 작성합니다.')
-    parser = JsonOutputParser()
-    # JSON 스키마 형식 정의
-    format_instructions = '{{ "components" : [{"role" : "해당 컴포넌트의 역할", "tag" : "컴포넌트 종류", "label"?: "컴포넌트에 있는 텍스트나 아이콘" }] }}' 
-    example = """
-        "components" : [ { "role" : "Wrapper 컴포넌트 하위 컴포넌트를 수평 배열", "tag" : "div" }, { "role" : "이메일 입력 Input 컴포넌트 ", "tag" : "input", "label": "placeholder 이메일 입력" }]
+def read_request_upload(request):
     """
-    prompt_template = """
-    You are an expert web developer. Analyze the received image which is encoded into base64 and Extract the components in the image.
+    multipart/form-data 또는 이미지 바이트 본문으로 업로드된 이미지를 읽습니다.
 
-    Example : {example}
+    Returns:
+        tuple: (read_image_upload 결과, None) 또는 (None, 오류 Response)
+    """
+    try:
+        return read_image_upload(request), None
+    except ImageUploadError as e:
+        print(f"이미지 업로드 오류: {e}")
+        return None, Response({
+            'status': 'Error',
+            'message': str(e)
+        }, status=e.status)
 
-    Image : {base64_data}
 
-    1. Return a Only JSON response (without description of response) with the following structure:
-    {format_instructions}
+def run_image_chain(chain_name, data, run):
     """
-    
-    prompt = set_prompt(prompt_template, ["base64_data"], {"format_instructions": format_instructions, "example": example})
-    print(prompt)
-    # 체인 구성
-    chain = prompt.pipe(model).pipe(parser)
-    # architecture 구조 확인을 위한 디버깅 출력
+    이미지(base64 문자열 또는 바이트)로 이미지 체인을 실행합니다.
+    같은 이미지의 결과는 이미지 결과 저장소(이미지 해시 + 체인 이름 + 프롬프트 버전)에서 가져오며,
+    이때는 이미지 축소/재압축과 모델 호출을 모두 생략합니다.
+
+    Args:
+        chain_name (str): 체인 이름 (IMAGE_PARSE, IMAGE_DESCRIPTION)
+        data (str | bytes): 요청 이미지
+        run (callable): 준비된 이미지(prepare_image 결과)로 체인을 실행하는 함수
+
+    Returns:
+        tuple: ({'message', 'image'}, 저장소 적중 여부, None) 또는 (None, False, 오류 Response)
+    """
+    store = get_image_store()
+    version = get_chain_image_version(chain_name, get_chain_version(chain_name))
+    # 해시를 계산할 수 없는 이미지는 prepare_request_image에서 오류 응답으로 처리
+    digest = stored_image_digest(data)
+    if digest is not None:
+        stored = store.get(digest, chain_name, version)
+        if stored is not None:
+            return stored, True, None
+
+    image, error = prepare_request_image(data)
+    if error is not None:
+        return None, False, error
+    result = {'message': run(image), 'image': image_summary(image)}
+    if digest is not None:
+        store.set(digest, chain_name, result, version)
+    return result, False, None
+
+
+def parse_image(image):
+    """
+    준비된 이미지(prepare_image 결과)에서 컴포넌트를 추출합니다.
+    """
+    # 이미지 토큰 수에 따라 선택된 모델로 구성된 체인 사용
+    route = route_request('req_parse_image', prompt_tokens=image['estimated_tokens'])
+    chain = get_routed_chain(IMAGE_PARSE, route)
+
+    # 동시에 들어온 같은 이미지는 한 번만 호출하고 결과를 함께 사용
+    return get_single_flight().do(
+        hash_canonical(IMAGE_PARSE, image['data']),
+        lambda: chain.invoke({
+            "image_url": image['data_url'],
+        }, config={'callbacks': [TokenUsageCallbackHandler('req_parse_image', route)]})
+    )
+
+
+def analyze_image(image):
+    """
+    준비된 이미지(prepare_image 결과)에서 화면의 목적과 구성 요소를 분석합니다.
+    """
+    # 이미지 토큰 수에 따라 선택된 모델로 구성된 체인 사용
+    route = route_request('req_analyze_image', prompt_tokens=image['estimated_tokens'])
+    chain = get_routed_chain(IMAGE_DESCRIPTION, route)
+
+    # 동시에 들어온 같은 이미지는 한 번만 호출하고 결과를 함께 사용
+    return get_single_flight().do(
+        hash_canonical(IMAGE_DESCRIPTION, image['data']),
+        lambda: chain.invoke({
+            "image_url": image['data_url'],
+        }, config={'callbacks': [TokenUsageCallbackHandler('req_analyze_image', route)]})
+    )
+
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def req_parse_image(request, format=None):
+    """
+    LangChain을 통해 Image를 받아 컴포넌트를 추출
+    """
+    architecture: RequestImageDict = parse_request_body(request)
+
     
     # 딕셔너리에서 id 값 안전하게 추출
     base64_data = architecture.get('base64Data', '')
-    
-    response = chain.invoke({
-        "base64_data": base64_data,
-        "format_instructions" : format_instructions,
-        "example" : example
+    result, cached, error = run_image_chain(IMAGE_PARSE, base64_data, parse_image)
+    if error is not None:
+        return error
+
+    return Response({
+        'status': 'Success',
+        **result,
+        'cached': cached
     })
-    print(response)
-    
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def req_parse_image_upload(request, format=None):
+    """
+    multipart/form-data('image' 필드) 또는 이미지 바이트 본문으로 Image를 받아 컴포넌트를 추출
+    응답 형식은 req_parse_image와 같고, 업로드 정보(upload)가 추가됩니다.
+    """
+    upload, error = read_request_upload(request)
+    if error is not None:
+        return error
+    result, cached, error = run_image_chain(IMAGE_PARSE, upload['data'], parse_image)
+    if error is not None:
+        return error
+
     return Response({
         'status': 'Success',
-        'message': response
+        **result,
+        'cached': cached,
+        'upload': upload_summary(upload)
     })
 
 @api_view(['POST'])
@@ -131,38 +498,40 @@ def req_analyze_image(request, format=None):
     LangChain을 통해 Image를 받아 컴포넌트를 추출
     """
 
-    try:
-        # request.body는 바이트 문자열이므로 디코딩 후 JSON으로 파싱
-        import json
-        architecture: RequestImageDict = json.loads(request.body.decode('utf-8'))
-    except Exception as e:
-        print(f"JSON 파싱 오류: {e}")
-        # 오류 발생 시 원본 바이트 문자열 사용
-        architecture = request.body.decode('utf-8')
-        print(f"원본 문자열 사용: {architecture}")
-
-    print("LangChain Model을 가져옵니다...")
-    model = get_langchain_model()
-    # 실제 LangChain 초기화 로직 호출
-
-    print('Image 파싱을 위한 프롬프트를 작성합니다.')
-    parser = JsonOutputParser()
+    architecture: RequestImageDict = parse_request_body(request)
 
-    prompt = set_prompt(image_description_prompt, ["image_url"], {"format_instructions": image_description_format_instruction })
-    print(prompt)
-    # 체인 구성
-    chain = prompt.pipe(model).pipe(parser)
 
     # 딕셔너리에서 id 값 안전하게 추출
     base64_data = architecture.get('base64Data', '')
-    response = chain.invoke({
-        "image_url": "data:image/png;base64," + base64_data,
-        "format_instructions" : image_description_format_instruction,
+    result, cached, error = run_image_chain(IMAGE_DESCRIPTION, base64_data, analyze_image)
+    if error is not None:
+        return error
+
+    return Response({
+        'status': 'Success',
+        **result,
+        'cached': cached
     })
 
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def req_analyze_image_upload(request, format=None):
+    """
+    multipart/form-data('image' 필드) 또는 이미지 바이트 본문으로 Image를 받아 화면의 목적과 구성 요소를 분석
+    응답 형식은 req_analyze_image와 같고, 업로드 정보(upload)가 추가됩니다.
+    """
+    upload, error = read_request_upload(request)
+    if error is not None:
+        return error
+    result, cached, error = run_image_chain(IMAGE_DESCRIPTION, upload['data'], analyze_image)
+    if error is not None:
+        return error
+
     return Response({
         'status': 'Success',
-        'message': response
+        **result,
+        'cached': cached,
+        'upload': upload_summary(upload)
     })
 
 
@@ -173,37 +542,149 @@ def req_analyze_image_with_runnables(request, format=None):
     LangChain을 통해 Image를 받아 컴포넌트를 추출
     """
 
+    architecture: RequestImageDict = parse_request_body(request)
+
+
+
+    # 딕셔너리에서 id 값 안전하게 추출
+    base64_data = architecture.get('base64Data', '')
+    image, error = prepare_request_image(base64_data)
+    if error is not None:
+        return error
+
+    # 이미지 토큰 수에 따라 선택된 모델로 구성된 체인 사용
+    route = route_request('req_analyze_image', prompt_tokens=image['estimated_tokens'])
+    chain = get_routed_chain(IMAGE_DESCRIPTION, route)
+    
+    # 동시에 들어온 같은 이미지는 한 번만 호출하고 결과를 함께 사용
+    response = get_single_flight().do(
+        hash_canonical(IMAGE_DESCRIPTION, image['data']),
+        lambda: chain.invoke({
+            "image_url": image['data_url'],
+        }, config={'callbacks': [TokenUsageCallbackHandler('req_analyze_image_with_runnables', route)]})
+    )
+
+    return Response({
+        'status': 'Success',
+        'message': response,
+        'image': image_summary(image)
+    })
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def req_job_submit(request, format=None):
+    """
+    오래 걸리는 생성을 백그라운드 작업으로 등록하고 바로 작업 id를 반환 (202)
+    요청 형식: {"kind": "ui_component" | "parse_image" | "analyze_image", "payload": 동기 엔드포인트의 요청 본문}
+    결과는 req_job_status, req_job_result, async/req_job_status(?wait= 롱 폴링) 또는 async/req_job_events(SSE)로 확인합니다.
+    """
     try:
-        # request.body는 바이트 문자열이므로 디코딩 후 JSON으로 파싱
-        architecture: RequestImageDict = json.loads(request.body.decode('utf-8'))
+        body = json.loads(request.body.decode('utf-8'))
     except Exception as e:
         print(f"JSON 파싱 오류: {e}")
-        # 오류 발생 시 원본 바이트 문자열 사용
-        architecture = request.body.decode('utf-8')
-        print(f"원본 문자열 사용: {architecture}")
+        body = None
 
+    if not isinstance(body, dict) or not isinstance(body.get('payload'), (dict, str)):
+        return Response({
+            'status': 'Error',
+            'message': '요청 형식: {"kind": 작업 종류, "payload": 요청 본문}'
+        }, status=400)
 
-    print("LangChain Model을 가져옵니다...")
-    model = get_langchain_model()
-    # 실제 LangChain 초기화 로직 호출
+    try:
+        job = submit_job(body.get('kind'), body['payload'])
+    except ValueError as e:
+        return Response({
+            'status': 'Error',
+            'message': str(e)
+        }, status=400)
 
-    print('Image 파싱을 위한 프롬프트를 작성합니다.')
-    parser = JsonOutputParser()
+    return Response({
+        'status': 'Success',
+        'message': job_summary(job)
+    }, status=202)
 
-    prompt = set_prompt(image_description_prompt, ["image_url"], {"format_instructions": image_description_format_instruction })
-    print(prompt)
-    # 체인 구성
-    chain = prompt.pipe(model).pipe(parser)
+def job_not_found(job_id):
+    return Response({
+        'status': 'Error',
+        'message': f'작업을 찾을 수 없습니다: {job_id} (없거나 보관 기한이 지난 작업)'
+    }, status=404)
 
-    # 딕셔너리에서 id 값 안전하게 추출
-    base64_data = architecture.get('base64Data', '')
-    
-    response = chain.invoke({
-        "image_url": "data:image/png;base64," + base64_data,
-        "format_instructions" : image_description_format_instruction,
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def req_job_status(request, job_id, format=None):
+    """
+    작업 상태를 반환
+    ?wait=초 를 지정하면 작업이 끝나거나 대기 시간(최대 LANGCHAIN_JOB_SYNC_WAIT_MAX, 기본값 2초)이 지날 때까지 기다린 뒤 응답합니다.
+    WSGI 워커를 점유하므로 긴 롱 폴링은 async/req_job_status 또는 async/req_job_events를 사용합니다.
+    """
+    try:
+        wait = float(request.GET.get('wait', 0))
+    except ValueError:
+        wait = 0.0
+    job = wait_for_job(job_id, wait) if wait > 0 else get_job(job_id)
+    if job is None:
+        return job_not_found(job_id)
+
+    return Response({
+        'status': 'Success',
+        'message': job_summary(job)
     })
 
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def req_job_result(request, job_id, format=None):
+    """
+    작업 결과를 반환
+    완료: 200(result 포함), 대기/실행 중: 202, 실패: 500, 없거나 보관 기한이 지난 작업: 404
+    """
+    job = get_job(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    if job.status == Job.SUCCEEDED:
+        return Response({
+            'status': 'Success',
+            'message': job_summary(job, include_result=True)
+        })
+    if job.status == Job.FAILED:
+        return Response({
+            'status': 'Error',
+            'message': job_summary(job)
+        }, status=500)
+    return Response({
+        'status': 'Pending',
+        'message': job_summary(job)
+    }, status=202)
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def req_cache_stats(request, format=None):
+    """
+    응답 캐시 적중/실패 통계와 이미지 결과 저장소, 컴포넌트 라이브러리 통계를 반환
+    """
+    return Response({
+        'status': 'Success',
+        'message': {
+            **get_response_cache().stats(),
+            'single_flight': get_single_flight().stats(),
+            'image_store': get_image_store().stats(),
+            'component_library': get_library_stats()
+        }
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def req_usage_stats(request, format=None):
+    """
+    엔드포인트별 누적 토큰 사용량과 비용, 라우트(정책:모델 등급)별 지연 시간과 비용, 헤징 통계,
+    Anthropic 호출 속도 제한기의 대기열 지표, JSON 복구 통계를 반환
+    """
     return Response({
         'status': 'Success',
-        'message': response
+        'message': {
+            'endpoints': get_endpoint_usage(),
+            'routes': get_route_stats(),
+            'hedging': get_hedge_stats(),
+            'governor': get_rate_governor().stats(),
+            'json_repair': get_json_repair_stats()
+        }
     })
@@ -0,0 +1,619 @@
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseNotAllowed
+from asgiref.sync import sync_to_async
+from functools import wraps
+import json
+import asyncio
+import time
+
+from utils.langchain import initialize_langchain, get_chain_version, aprewarm_connections, get_routed_chain, route_request, ahedged_invoke, warm_chains, TokenUsageCallbackHandler, get_response_cache, get_single_flight, canonicalize_architecture, hash_canonical, strip_volatile_ids, restore_volatile_ids, get_message_text, astream_json_fields, format_sse_event, get_async_limiter, abatch_each_with_latency, get_routed_chains
+from utils.llm_image import prepare_image, image_summary
+from utils.metrics import stage_timer
+from utils.image_upload import read_image_upload, upload_summary, ImageUploadError
+from utils.image_store import get_image_store, get_chain_image_version, stored_image_digest
+from utils.ui_tree import plan_architecture, split_token_budget, plan_units, compose_plan, get_tree_id, diff_units
+from .chains import UI_COMPONENT, UI_COMPONENT_EDIT, IMAGE_PARSE, IMAGE_DESCRIPTION
+from .component_library import find_component, edit_inputs, remember_component, record_library_result
+from .jobs import get_job, job_summary, JOB_POLL_INTERVAL, JOB_LONG_POLL_MAX
+from api.models import Job
+
+# ASGI(config/asgi.py)에서 실행되는 비동기 엔드포인트
+# DRF의 @api_view는 비동기 뷰를 지원하지 않으므로 Django 비동기 뷰로 구현합니다.
+# 모든 엔드포인트는 모델 풀의 ChatAnthropic 인스턴스와 이벤트 루프별 keep-alive HTTP 연결 풀을 공유합니다.
+
+
+def async_api_view(http_method_names):
+    """
+    비동기 뷰용 @api_view 대체 데코레이터
+    허용된 메소드만 통과시키고 CSRF 검사를 제외합니다. (Django 4.2의 csrf_exempt, require_http_methods는 비동기 뷰를 지원하지 않음)
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in http_method_names:
+                return HttpResponseNotAllowed(http_method_names)
+            return await view(request, *args, **kwargs)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def prepare_request_image(base64_data):
+    """
+    요청의 이미지(base64 문자열 또는 업로드된 바이트)를 모델 입력용으로 축소/재압축합니다. (이미지 처리는 스레드에서 실행)
+
+    Returns:
+        tuple: (prepare_image 결과, None) 또는 (None, 오류 JsonResponse)
+    """
+    try:
+        return await sync_to_async(prepare_image, thread_sensitive=False)(base64_data), None
+    except Exception as e:
+        print(f"이미지 처리 오류: {e}")
+        return None, JsonResponse({
+            'status': 'Error',
+            'message': f'이미지를 읽을 수 없습니다: {e}'
+        }, status=400)
+
+
+async def read_request_upload(request):
+    """
+    multipart/form-data 또는 이미지 바이트 본문으로 업로드된 이미지를 읽습니다. (본문 읽기는 스레드에서 실행)
+
+    Returns:
+        tuple: (read_image_upload 결과, None) 또는 (None, 오류 JsonResponse)
+    """
+    try:
+        return await sync_to_async(read_image_upload, thread_sensitive=False)(request), None
+    except ImageUploadError as e:
+        print(f"이미지 업로드 오류: {e}")
+        return None, JsonResponse({
+            'status': 'Error',
+            'message': str(e)
+        }, status=e.status)
+
+
+def parse_request_body(request):
+    """
+    요청 본문을 JSON으로 파싱합니다. 실패 시 원본 문자열을 반환합니다.
+    """
+    with stage_timer('body_parse'):
+        try:
+            # request.body는 바이트 문자열이므로 디코딩 후 JSON으로 파싱
+            return json.loads(request.body.decode('utf-8'))
+        except Exception as e:
+            print(f"JSON 파싱 오류: {e}")
+            # 오류 발생 시 원본 바이트 문자열 사용
+            return request.body.decode('utf-8')
+
+
+@async_api_view(['GET'])
+async def init_langchain(request):
+    """
+    LangChain 초기화 엔드포인트 (비동기)
+    """
+    await sync_to_async(initialize_langchain, thread_sensitive=False)()
+    # 현재 이벤트 루프의 연결 풀에 TLS 연결을 미리 맺어 둠
+    await aprewarm_connections()
+    warm_chains()
+
+    return JsonResponse({
+        'status': 'Success',
+        'message': 'LangChain initialized successfully'
+    })
+
+
+async def adapt_library_component(architecture, canonical, volatile):
+    """
+    apis.adapt_library_component의 비동기 버전
+
+    Returns:
+        id를 placeholder로 바꾼 응답 또는 찾지 못하면 None
+    """
+    match = await sync_to_async(find_component)(canonical)
+    if match is None:
+        return None
+    if match['component'] is not None:
+        return match['component']
+
+    route = route_request('req_ui_component_edit', architecture)
+    try:
+        async with get_async_limiter('req_ui_component'):
+            response = await get_routed_chain(UI_COMPONENT_EDIT, route).ainvoke(
+                edit_inputs(match['template'], architecture, volatile),
+                config={'callbacks': [TokenUsageCallbackHandler('req_ui_component_edit', route)]}
+            )
+    except Exception as e:
+        print(f"컴포넌트 수정 요청 오류: {e}")
+        record_library_result('edit_failures')
+        return None
+    record_library_result('edited')
+    stripped = strip_volatile_ids(response, volatile)
+    await sync_to_async(remember_component)(canonical, stripped)
+    return stripped
+
+
+async def generate_component(architecture):
+    """
+    architecture 하나의 JSX 코드를 생성합니다. (apis.generate_component의 비동기 버전)
+
+    Returns:
+        tuple: (응답, 캐시 사용 여부)
+    """
+    cache = get_response_cache()
+    canonical, volatile = canonicalize_architecture(architecture)
+    cache_key = hash_canonical('req_ui_component', canonical)
+    cached = await sync_to_async(cache.get, thread_sensitive=False)(cache_key)
+    if cached is not None:
+        return restore_volatile_ids(cached, volatile), True
+
+    route = route_request('req_ui_component', architecture)
+    chain = get_routed_chain(UI_COMPONENT, route)
+
+    async def generate_and_cache():
+        # 구조가 같거나 비슷한 컴포넌트가 라이브러리에 있으면 라벨 치환 또는 짧은 수정 요청으로 생성
+        stripped = await adapt_library_component(architecture, canonical, volatile)
+        if stripped is None:
+            async with get_async_limiter('req_ui_component'):
+                # 응답이 관측된 p90 지연 시간을 넘기면 헤징 요청을 추가로 보냄
+                response = await ahedged_invoke(chain, {
+                    "architecture": architecture,
+                    "new_id": architecture.get('newId', ''),
+                }, route, config={'callbacks': [TokenUsageCallbackHandler('req_ui_component', route)]})
+            stripped = strip_volatile_ids(response, volatile)
+            await sync_to_async(remember_component)(canonical, stripped)
+        await sync_to_async(cache.set, thread_sensitive=False)(cache_key, stripped)
+        return stripped
+
+    # 동시에 들어온 동일한 architecture는 한 번만 호출하고 결과(id 제외)를 함께 사용
+    return restore_volatile_ids(await get_single_flight().ado(cache_key, generate_and_cache), volatile), False
+
+
+async def generate_split_component(architecture, plan):
+    """
+    architecture를 하위 트리로 나눠 동시에 JSX 코드를 생성한 뒤 하나의 컴포넌트로 합칩니다. (apis.generate_split_component의 비동기 버전)
+
+    Returns:
+        tuple: (합친 응답, 생성 정보) 또는 합친 결과가 검증을 통과하지 못한 경우 (None, None)
+    """
+    units = plan_units(plan)
+    volatiles = [canonicalize_architecture(unit)[1] for unit in units]
+    unit_keys = [hash_canonical('req_ui_component', canonicalize_architecture(unit)[0]) for unit in units]
+
+    # 같은 트리의 이전 요청과 비교 (트리별로 마지막 요청의 하위 트리 목록과 결과를 저장)
+    cache = get_response_cache()
+    tree_id = get_tree_id(architecture)
+    tree_key = hash_canonical('ui_tree', tree_id) if tree_id else None
+    previous = (await sync_to_async(cache.get, thread_sensitive=False)(tree_key) if tree_key else None) or {}
+    stored = previous.get('fragments', {})
+
+    async def generate_unit(unit, key, volatile):
+        # 같은 트리의 이전 결과에 같은 하위 트리가 있으면 다시 생성하지 않음
+        if key in stored:
+            return restore_volatile_ids(stored[key], volatile), True
+        return await generate_component(unit)
+
+    # 바뀐 하위 트리만 동시에 생성 (동시 실행 수는 generate_component의 엔드포인트별 제한을 따름)
+    results = await asyncio.gather(*(generate_unit(*args) for args in zip(units, unit_keys, volatiles)))
+
+    response, errors = compose_plan(plan, [fragment for fragment, _ in results])
+    if errors:
+        print(f"하위 트리 결과를 합칠 수 없어 전체를 다시 생성합니다: {errors}")
+        return None, None
+
+    if tree_key:
+        await sync_to_async(cache.set, thread_sensitive=False)(tree_key, {'units': unit_keys, 'fragments': {
+            key: strip_volatile_ids(fragment, volatile) for key, (fragment, _), volatile in zip(unit_keys, results, volatiles)
+        }})
+    regenerated = sum(not cached for _, cached in results)
+    return response, {
+        'units': len(units),
+        'regenerated': regenerated,
+        'reused': len(units) - regenerated,
+        **diff_units(previous.get('units'), unit_keys),
+    }
+
+
+@async_api_view(['POST'])
+async def req_ui_component(request):
+    """
+    LangChain을 통해 architecture를 받아 JSX 코드를 JSON 형식으로 반환 (비동기)
+    큰 architecture는 하위 트리로 나눠 동시에 생성하고, 증분 생성을 켜면 같은 트리(treeId/id)에서 바뀐 하위 트리만 다시 생성합니다.
+    """
+    architecture = parse_request_body(request)
+
+    try:
+        if not isinstance(architecture, dict):
+            route = route_request('req_ui_component', architecture)
+            async with get_async_limiter('req_ui_component'):
+                response = await ahedged_invoke(get_routed_chain(UI_COMPONENT, route), {
+                    "architecture": architecture,
+                    "new_id": '',
+                }, route, config={'callbacks': [TokenUsageCallbackHandler('req_ui_component', route)]})
+            return JsonResponse({
+                'status': 'Success',
+                'message': response
+            })
+
+        # 증분 생성 대상이거나 선택된 모델의 토큰 예산을 넘는 architecture는 하위 트리로 나눠 생성
+        plan = plan_architecture(architecture, split_token_budget(route_request('req_ui_component', architecture)['max_tokens']))
+        if 'children' in plan:
+            response, incremental = await generate_split_component(architecture, plan)
+            if response is not None:
+                return JsonResponse({
+                    'status': 'Success',
+                    'message': response,
+                    'incremental': incremental
+                })
+
+        response, _ = await generate_component(architecture)
+    except Exception as e:
+        print(f"req_ui_component(async) 에서 에러 발생: {e}")
+        return JsonResponse({
+            'status': 'Error',
+            'message': str(e)
+        }, status=500)
+
+    return JsonResponse({
+        'status': 'Success',
+        'message': response
+    })
+
+
+@async_api_view(['POST'])
+async def req_ui_component_batch(request):
+    """
+    여러 architecture를 한 번에 받아 JSX 코드를 생성 (비동기)
+    요청 형식: [architecture, ...] 또는 {"architectures": [...], "max_concurrency": N}
+    """
+    body = parse_request_body(request)
+
+    max_concurrency = None
+    if isinstance(body, dict):
+        max_concurrency = body.get('max_concurrency')
+        body = body.get('architectures')
+    if not isinstance(body, list):
+        return JsonResponse({
+            'status': 'Error',
+            'message': 'architecture 목록이 필요합니다.'
+        }, status=400)
+
+    cache = get_response_cache()
+    cache_get = sync_to_async(cache.get, thread_sensitive=False)
+    cache_set = sync_to_async(cache.set, thread_sensitive=False)
+    results = [None] * len(body)
+    pending = []
+    # 같은 요청 안에서 중복된 architecture는 한 번만 생성
+    duplicates = {}
+    for index, architecture in enumerate(body):
+        if not isinstance(architecture, dict):
+            results[index] = {'status': 'Error', 'message': 'architecture는 객체여야 합니다.', 'latency': 0.0, 'cached': False}
+            continue
+        canonical, volatile = canonicalize_architecture(architecture)
+        cache_key = hash_canonical('req_ui_component', canonical)
+        start = time.perf_counter()
+        if cache_key in duplicates:
+            duplicates[cache_key].append((index, volatile))
+            continue
+        cached = await cache_get(cache_key)
+        if cached is not None:
+            results[index] = {'status': 'Success', 'message': restore_volatile_ids(cached, volatile), 'latency': time.perf_counter() - start, 'cached': True}
+            continue
+        duplicates[cache_key] = []
+        pending.append((index, architecture, cache_key, volatile))
+
+    # 항목별로 모델을 선택하고, 모델이 달라도 모든 항목을 하나의 동시 실행 제한 안에서 함께 실행
+    routes = [route_request('req_ui_component', architecture) for _, architecture, _, _ in pending]
+    chains = get_routed_chains(UI_COMPONENT, routes, 'req_ui_component_batch')
+
+    async with get_async_limiter('req_ui_component_batch'):
+        outputs = await abatch_each_with_latency([
+            (chains[route['name']], {"architecture": architecture, "new_id": architecture.get('newId', '')})
+            for (_, architecture, _, _), route in zip(pending, routes)
+        ], max_concurrency)
+
+    for (index, _, cache_key, volatile), route, output in zip(pending, routes, outputs):
+        results[index] = {**output, 'cached': False, 'model': route['model']}
+        if output['status'] != 'Success':
+            for duplicate_index, _ in duplicates[cache_key]:
+                results[duplicate_index] = dict(results[index])
+            continue
+        stripped = strip_volatile_ids(output['message'], volatile)
+        await cache_set(cache_key, stripped)
+        for duplicate_index, duplicate_volatile in duplicates[cache_key]:
+            results[duplicate_index] = {**results[index], 'message': restore_volatile_ids(stripped, duplicate_volatile)}
+
+    return JsonResponse({
+        'status': 'Success',
+        'message': results
+    })
+
+
+@async_api_view(['POST'])
+async def req_ui_component_stream(request):
+    """
+    req_ui_component의 스트리밍 버전 (비동기)
+    생성 중인 JSON을 점진적으로 파싱하여 필드 단위 이벤트를 SSE로 전달
+    """
+    architecture = parse_request_body(request)
+
+    cache = get_response_cache()
+    cache_key = None
+    volatile = {}
+    if isinstance(architecture, dict):
+        canonical, volatile = canonicalize_architecture(architecture)
+        cache_key = hash_canonical('req_ui_component', canonical)
+
+    async def event_stream():
+        # 캐시된 응답이 있으면 필드 이벤트를 한 번에 전달
+        cached = None
+        if cache_key is not None:
+            cached = await sync_to_async(cache.get, thread_sensitive=False)(cache_key)
+        if cached is not None:
+            response = restore_volatile_ids(cached, volatile)
+            for key, value in response.items():
+                yield format_sse_event('field', {'field': key, 'value': value})
+            yield format_sse_event('done', response)
+            return
+
+        route = route_request('req_ui_component', architecture)
+        chain = get_routed_chain(UI_COMPONENT, route, with_parser=False)
+
+        new_id = architecture.get('newId', '') if isinstance(architecture, dict) else ''
+        async with get_async_limiter('req_ui_component_stream'):
+            upstream = chain.astream({
+                "architecture": architecture,
+                "new_id": new_id,
+            }, config={'callbacks': [TokenUsageCallbackHandler('req_ui_component_stream', route)]})
+            chunks = (get_message_text(chunk) async for chunk in upstream)
+            try:
+                async for event, data in astream_json_fields(chunks):
+                    if event == 'done' and cache_key is not None:
+                        await sync_to_async(cache.set, thread_sensitive=False)(cache_key, strip_volatile_ids(data, volatile))
+                    yield format_sse_event(event, data)
+            except Exception as e:
+                print(f"req_ui_component_stream(async) 에서 에러 발생: {e}")
+                yield format_sse_event('error', {'message': str(e)})
+            finally:
+                # 최상위 객체가 완성되면 남은 생성을 중단
+                await upstream.aclose()
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def run_image_chain(chain_name, data, run):
+    """
+    이미지(base64 문자열 또는 바이트)로 이미지 체인을 실행합니다. (apis.run_image_chain의 비동기 버전)
+    같은 이미지의 결과는 이미지 결과 저장소에서 가져오며, 이때는 이미지 축소/재압축과 모델 호출을 모두 생략합니다.
+
+    Returns:
+        tuple: ({'message', 'image'}, 저장소 적중 여부, None) 또는 (None, False, 오류 JsonResponse)
+    """
+    store = get_image_store()
+    version = get_chain_image_version(chain_name, get_chain_version(chain_name))
+    digest = await sync_to_async(stored_image_digest, thread_sensitive=False)(data)
+    if digest is not None:
+        stored = await sync_to_async(store.get, thread_sensitive=False)(digest, chain_name, version)
+        if stored is not None:
+            return stored, True, None
+
+    image, error = await prepare_request_image(data)
+    if error is not None:
+        return None, False, error
+    result = {'message': await run(image), 'image': image_summary(image)}
+    if digest is not None:
+        await sync_to_async(store.set, thread_sensitive=False)(digest, chain_name, result, version)
+    return result, False, None
+
+
+async def parse_image(image):
+    """
+    준비된 이미지(prepare_image 결과)에서 컴포넌트를 추출합니다.
+    """
+    route = route_request('req_parse_image', prompt_tokens=image['estimated_tokens'])
+    chain = get_routed_chain(IMAGE_PARSE, route)
+
+    async def generate():
+        async with get_async_limiter('req_parse_image'):
+            return await chain.ainvoke({
+                "image_url": image['data_url'],
+            }, config={'callbacks': [TokenUsageCallbackHandler('req_parse_image', route)]})
+
+    # 동시에 들어온 같은 이미지는 한 번만 호출하고 결과를 함께 사용
+    return await get_single_flight().ado(hash_canonical(IMAGE_PARSE, image['data']), generate)
+
+
+async def analyze_image(image):
+    """
+    준비된 이미지(prepare_image 결과)에서 화면의 목적과 구성 요소를 분석합니다.
+    """
+    route = route_request('req_analyze_image', prompt_tokens=image['estimated_tokens'])
+    chain = get_routed_chain(IMAGE_DESCRIPTION, route)
+
+    async def generate():
+        async with get_async_limiter('req_analyze_image'):
+            return await chain.ainvoke({
+                "image_url": image['data_url'],
+            }, config={'callbacks': [TokenUsageCallbackHandler('req_analyze_image', route)]})
+
+    # 동시에 들어온 같은 이미지는 한 번만 호출하고 결과를 함께 사용
+    return await get_single_flight().ado(hash_canonical(IMAGE_DESCRIPTION, image['data']), generate)
+
+
+@async_api_view(['POST'])
+async def req_parse_image(request):
+    """
+    LangChain을 통해 Image를 받아 컴포넌트를 추출 (비동기)
+    """
+    architecture = parse_request_body(request)
+    base64_data = architecture.get('base64Data', '') if isinstance(architecture, dict) else ''
+    try:
+        result, cached, error = await run_image_chain(IMAGE_PARSE, base64_data, parse_image)
+    except Exception as e:
+        print(f"req_parse_image(async) 에서 에러 발생: {e}")
+        return JsonResponse({
+            'status': 'Error',
+            'message': str(e)
+        }, status=500)
+    if error is not None:
+        return error
+
+    return JsonResponse({
+        'status': 'Success',
+        **result,
+        'cached': cached
+    })
+
+
+@async_api_view(['POST'])
+async def req_parse_image_upload(request):
+    """
+    multipart/form-data('image' 필드) 또는 이미지 바이트 본문으로 Image를 받아 컴포넌트를 추출 (비동기)
+    """
+    upload, error = await read_request_upload(request)
+    if error is not None:
+        return error
+
+    try:
+        result, cached, error = await run_image_chain(IMAGE_PARSE, upload['data'], parse_image)
+    except Exception as e:
+        print(f"req_parse_image_upload(async) 에서 에러 발생: {e}")
+        return JsonResponse({
+            'status': 'Error',
+            'message': str(e)
+        }, status=500)
+    if error is not None:
+        return error
+
+    return JsonResponse({
+        'status': 'Success',
+        **result,
+        'cached': cached,
+        'upload': upload_summary(upload)
+    })
+
+
+@async_api_view(['POST'])
+async def req_analyze_image(request):
+    """
+    LangChain을 통해 Image를 받아 화면의 목적과 구성 요소를 분석 (비동기)
+    """
+    architecture = parse_request_body(request)
+    base64_data = architecture.get('base64Data', '') if isinstance(architecture, dict) else ''
+    try:
+        result, cached, error = await run_image_chain(IMAGE_DESCRIPTION, base64_data, analyze_image)
+    except Exception as e:
+        print(f"req_analyze_image(async) 에서 에러 발생: {e}")
+        return JsonResponse({
+            'status': 'Error',
+            'message': str(e)
+        }, status=500)
+    if error is not None:
+        return error
+
+    return JsonResponse({
+        'status': 'Success',
+        **result,
+        'cached': cached
+    })
+
+
+@async_api_view(['POST'])
+async def req_analyze_image_upload(request):
+    """
+    multipart/form-data('image' 필드) 또는 이미지 바이트 본문으로 Image를 받아 화면의 목적과 구성 요소를 분석 (비동기)
+    """
+    upload, error = await read_request_upload(request)
+    if error is not None:
+        return error
+
+    try:
+        result, cached, error = await run_image_chain(IMAGE_DESCRIPTION, upload['data'], analyze_image)
+    except Exception as e:
+        print(f"req_analyze_image_upload(async) 에서 에러 발생: {e}")
+        return JsonResponse({
+            'status': 'Error',
+            'message': str(e)
+        }, status=500)
+    if error is not None:
+        return error
+
+    return JsonResponse({
+        'status': 'Success',
+        **result,
+        'cached': cached,
+        'upload': upload_summary(upload)
+    })
+
+
+async def await_job(job_id, timeout):
+    """
+    작업이 끝나거나 timeout(초, 최대 JOB_LONG_POLL_MAX)이 지날 때까지 기다린 뒤 작업을 반환합니다.
+    기다리는 동안 이벤트 루프를 막지 않으므로 롱 폴링 요청이 워커를 차지하지 않습니다.
+    """
+    deadline = time.monotonic() + max(0.0, min(timeout, JOB_LONG_POLL_MAX))
+    while True:
+        job = await sync_to_async(get_job)(job_id)
+        if job is None or job.status in Job.FINISHED or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+@async_api_view(['GET'])
+async def req_job_status(request, job_id):
+    """
+    req_job_status의 비동기 버전 (?wait=초 롱 폴링)
+    """
+    try:
+        wait = float(request.GET.get('wait', 0))
+    except ValueError:
+        wait = 0.0
+    job = await await_job(job_id, wait)
+    if job is None:
+        return JsonResponse({
+            'status': 'Error',
+            'message': f'작업을 찾을 수 없습니다: {job_id} (없거나 보관 기한이 지난 작업)'
+        }, status=404)
+
+    return JsonResponse({
+        'status': 'Success',
+        'message': job_summary(job)
+    })
+
+
+@async_api_view(['GET'])
+async def req_job_events(request, job_id):
+    """
+    작업 상태를 SSE로 전달 (비동기)
+    상태가 바뀔 때마다 status 이벤트를 보내고, 완료되면 done(result 포함), 실패하거나 작업이 없으면 error 이벤트를 보낸 뒤 종료합니다.
+    """
+    async def event_stream():
+        status = None
+        idle = 0.0
+        while True:
+            job = await sync_to_async(get_job)(job_id)
+            if job is None:
+                yield format_sse_event('error', {'message': f'작업을 찾을 수 없습니다: {job_id}'})
+                return
+            if job.status == Job.SUCCEEDED:
+                yield format_sse_event('done', job_summary(job, include_result=True))
+                return
+            if job.status == Job.FAILED:
+                yield format_sse_event('error', job_summary(job))
+                return
+            if job.status != status:
+                status = job.status
+                idle = 0.0
+                yield format_sse_event('status', job_summary(job))
+            elif idle >= JOB_LONG_POLL_MAX:
+                # 프록시가 유휴 연결을 끊지 않도록 주석 줄 전송
+                idle = 0.0
+                yield ': keep-alive\n\n'
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            idle += JOB_POLL_INTERVAL
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,25 @@
+from utils.langchain import register_chain
+
+from prompt.image_parse_prompt import image_description_format_instruction, image_description_prompt_prefix, image_description_prompt_suffix, image_parse_format_instruction, image_parse_example, image_parse_prompt_prefix, image_parse_prompt_suffix
+from prompt.ui_create_prompt import ui_component_format_instructions, ui_component_example, ui_component_prompt_prefix, ui_component_prompt_suffix, ui_component_edit_prompt_prefix, ui_component_edit_prompt_suffix
+
+# LangChain 엔드포인트에서 사용하는 체인 정의
+# 서버 시작 시(ApiConfig.ready) 한 번 등록 및 검증되며, 뷰에서는 get_routed_chain(이름, 라우트)으로 가져옵니다.
+
+UI_COMPONENT = 'ui_component'
+UI_COMPONENT_EDIT = 'ui_component_edit'
+IMAGE_PARSE = 'image_parse'
+IMAGE_DESCRIPTION = 'image_description'
+
+
+def register_chains():
+    """
+    엔드포인트에서 사용하는 체인을 레지스트리에 등록합니다.
+    """
+    # 요청마다 동일한 앞부분(prefix)은 Anthropic 프롬프트 캐시 대상으로 표시
+    register_chain(UI_COMPONENT, ui_component_prompt_suffix, ["architecture", "new_id"], {"format_instructions": ui_component_format_instructions, "example": ui_component_example}, prefix=ui_component_prompt_prefix)
+    # 컴포넌트 라이브러리에서 찾은 비슷한 컴포넌트를 새 architecture에 맞게 수정 (api.langchain.component_library)
+    register_chain(UI_COMPONENT_EDIT, ui_component_edit_prompt_suffix, ["reference_architecture", "reference_component", "architecture"], {"format_instructions": ui_component_format_instructions}, prefix=ui_component_edit_prompt_prefix)
+    # 이미지는 축소/재압축한 data URL을 image content block으로 전달 (utils.llm_image.prepare_image)
+    register_chain(IMAGE_PARSE, image_parse_prompt_suffix, ["image_url"], {"format_instructions": image_parse_format_instruction, "example": image_parse_example}, prefix=image_parse_prompt_prefix, image_variable="image_url")
+    register_chain(IMAGE_DESCRIPTION, image_description_prompt_suffix, ["image_url"], {"format_instructions": image_description_format_instruction}, prefix=image_description_prompt_prefix, image_variable="image_url")
@@ -0,0 +1,201 @@
+import os
+import threading
+from functools import reduce
+from operator import or_
+from django.db import DatabaseError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from api.models import ComponentTemplate, ComponentBand
+from utils.langchain import get_chain_version, hash_canonical, restore_volatile_ids
+from utils.ui_fingerprint import architecture_structure, architecture_labels, architecture_shingles, minhash_signature, lsh_buckets, jaccard_similarity, substitute_labels
+from .chains import UI_COMPONENT
+
+# 컴포넌트 라이브러리 설정
+# req_ui_component로 생성한 컴포넌트를 architecture 구조 지문(태그 트리 shingle의 MinHash 서명, LSH 밴드)과 함께 데이터베이스에 저장합니다.
+# 응답 캐시에 없는 요청은 생성하기 전에 라이브러리에서 찾아
+#   - 구조가 같고 라벨만 다르면 라벨을 치환하여 모델 호출 없이 응답하고
+#   - 구조가 비슷하면(Jaccard 유사도 >= LIBRARY_EDIT_THRESHOLD) 찾은 컴포넌트를 작은 모델로 수정합니다.
+# 새로 생성하거나 수정한 컴포넌트는 자동으로 라이브러리에 추가됩니다.
+LIBRARY_ENABLED = os.getenv('LANGCHAIN_COMPONENT_LIBRARY', 'True') == 'True'
+LIBRARY_EDIT_THRESHOLD = float(os.getenv('LANGCHAIN_LIBRARY_EDIT_THRESHOLD', 0.7))
+# LSH 후보 중 유사도를 계산할 최대 개수 (일치하는 밴드가 많은 순)
+LIBRARY_MAX_CANDIDATES = int(os.getenv('LANGCHAIN_LIBRARY_MAX_CANDIDATES', 20))
+# 최대 저장 개수 (넘으면 최근에 사용하지 않은 컴포넌트부터 삭제)
+LIBRARY_MAX_ENTRIES = int(os.getenv('LANGCHAIN_LIBRARY_MAX_ENTRIES', 5000))
+
+# 같은 프로세스의 라이브러리 데이터베이스 접근을 직렬화
+# 분할 생성은 하위 트리를 여러 스레드에서 동시에 조회/저장하는데, SQLite는 쓰기를 하나씩만 허용하고
+# 공유 캐시 메모리 데이터베이스(테스트)의 테이블 잠금은 busy timeout을 기다리지 않고 바로 실패합니다.
+_library_db_lock = threading.RLock()
+
+_library_stats = {'lookups': 0, 'substituted': 0, 'edited': 0, 'edit_failures': 0, 'misses': 0, 'stored': 0}
+_library_stats_lock = threading.Lock()
+
+
+def record_library_result(outcome):
+    """
+    라이브러리 조회 결과를 기록합니다.
+    """
+    with _library_stats_lock:
+        _library_stats[outcome] += 1
+
+
+def get_library_stats():
+    """
+    조회/치환/수정/저장 횟수와 저장된 컴포넌트 수를 반환합니다.
+    """
+    with _library_stats_lock:
+        stats = dict(_library_stats)
+    reused = stats['substituted'] + stats['edited']
+    stats['reuse_rate'] = reused / stats['lookups'] if stats['lookups'] else 0.0
+    try:
+        stats['entries'] = ComponentTemplate.objects.count()
+    except DatabaseError as e:
+        print(f"컴포넌트 라이브러리 조회 실패: {e}")
+    return stats
+
+
+def fingerprint_architecture(canonical):
+    """
+    정규화된 architecture(id 제외)의 구조 지문을 계산합니다.
+
+    Returns:
+        dict: structure_hash, labels, shingles, signature, buckets
+    """
+    shingles = architecture_shingles(canonical)
+    signature = minhash_signature(shingles)
+    return {
+        'structure_hash': hash_canonical('component_structure', architecture_structure(canonical)),
+        'labels': architecture_labels(canonical),
+        'shingles': shingles,
+        'signature': signature,
+        'buckets': lsh_buckets(signature),
+    }
+
+
+def _touch(template):
+    try:
+        with _library_db_lock:
+            ComponentTemplate.objects.filter(pk=template.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    except DatabaseError as e:
+        print(f"컴포넌트 라이브러리 갱신 실패: {e}")
+
+
+def find_component(canonical):
+    """
+    라이브러리에서 요청 architecture와 구조가 같거나 비슷한 컴포넌트를 찾습니다.
+
+    Args:
+        canonical (dict): canonicalize_architecture로 id를 제거한 architecture
+
+    Returns:
+        dict: template, similarity, component(라벨을 치환한 컴포넌트, 수정 요청이 필요하면 None)
+        또는 찾지 못하면 None
+    """
+    if not LIBRARY_ENABLED or not isinstance(canonical, dict):
+        return None
+    record_library_result('lookups')
+    fingerprint = fingerprint_architecture(canonical)
+
+    try:
+        with _library_db_lock:
+            templates = ComponentTemplate.objects.filter(chain_version=get_chain_version(UI_COMPONENT))
+
+            # 구조가 같으면 라벨만 치환
+            same_structure = templates.filter(structure_hash=fingerprint['structure_hash']).order_by('-last_used_at')
+            for template in same_structure[:LIBRARY_MAX_CANDIDATES]:
+                component = substitute_labels(template.component, template.labels, fingerprint['labels'])
+                if component is not None:
+                    _touch(template)
+                    record_library_result('substituted')
+                    return {'template': template, 'similarity': 1.0, 'component': component}
+
+            # LSH 밴드가 하나라도 같은 후보 중 Jaccard 유사도가 가장 높은 컴포넌트
+            condition = reduce(or_, (Q(band=band, bucket=bucket) for band, bucket in fingerprint['buckets']))
+            candidate_ids = list(
+                ComponentBand.objects.filter(condition, template__in=templates)
+                .values('template_id').annotate(matches=Count('id')).order_by('-matches')
+                .values_list('template_id', flat=True)[:LIBRARY_MAX_CANDIDATES]
+            )
+            best, best_similarity = None, 0.0
+            for template in templates.filter(pk__in=candidate_ids):
+                similarity = jaccard_similarity(fingerprint['shingles'], template.shingles)
+                if similarity > best_similarity:
+                    best, best_similarity = template, similarity
+    except DatabaseError as e:
+        print(f"컴포넌트 라이브러리 조회 실패: {e}")
+        return None
+
+    if best is None or best_similarity < LIBRARY_EDIT_THRESHOLD:
+        record_library_result('misses')
+        return None
+    _touch(best)
+    return {'template': best, 'similarity': best_similarity, 'component': None}
+
+
+def edit_inputs(template, architecture, volatile):
+    """
+    UI_COMPONENT_EDIT 체인 입력을 만듭니다. 참고 컴포넌트의 id는 요청 architecture의 id로 바꿔 전달합니다.
+    """
+    return {
+        'reference_architecture': template.architecture,
+        'reference_component': restore_volatile_ids(template.component, volatile),
+        'architecture': architecture,
+    }
+
+
+def remember_component(canonical, component):
+    """
+    생성한 컴포넌트(id를 placeholder로 바꾼 응답)를 구조 지문과 함께 라이브러리에 저장합니다.
+    같은 architecture가 이미 있으면 저장하지 않습니다.
+
+    Returns:
+        bool: 새로 저장했는지 여부
+    """
+    if not LIBRARY_ENABLED or not isinstance(canonical, dict) or not isinstance(component, dict):
+        return False
+    fingerprint = fingerprint_architecture(canonical)
+    try:
+        with _library_db_lock, transaction.atomic():
+            template, created = ComponentTemplate.objects.get_or_create(
+                architecture_hash=hash_canonical('req_ui_component', canonical),
+                defaults={
+                    'structure_hash': fingerprint['structure_hash'],
+                    'chain_version': get_chain_version(UI_COMPONENT),
+                    'architecture': canonical,
+                    'component': component,
+                    'shingles': fingerprint['shingles'],
+                    'signature': fingerprint['signature'],
+                    'labels': fingerprint['labels'],
+                }
+            )
+            if created:
+                ComponentBand.objects.bulk_create([
+                    ComponentBand(template=template, band=band, bucket=bucket) for band, bucket in fingerprint['buckets']
+                ])
+        if created:
+            record_library_result('stored')
+            with _library_db_lock:
+                prune_library()
+        return created
+    except DatabaseError as e:
+        # 다른 워커가 같은 architecture를 먼저 저장한 경우 등
+        print(f"컴포넌트 라이브러리 저장 실패: {e}")
+        return False
+
+
+def prune_library(max_entries=None):
+    """
+    저장 개수가 최대값을 넘으면 최근에 사용하지 않은 컴포넌트부터 삭제합니다.
+
+    Returns:
+        int: 삭제한 컴포넌트 수
+    """
+    max_entries = LIBRARY_MAX_ENTRIES if max_entries is None else max_entries
+    excess = ComponentTemplate.objects.count() - max_entries
+    if excess <= 0:
+        return 0
+    stale = list(ComponentTemplate.objects.order_by('last_used_at').values_list('pk', flat=True)[:excess])
+    ComponentTemplate.objects.filter(pk__in=stale).delete()
+    return len(stale)
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import socket
+from datetime import timedelta
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.models import Job
+from .chains import IMAGE_PARSE, IMAGE_DESCRIPTION
+
+# 백그라운드 작업 큐 설정
+# 오래 걸리는 생성(큰 architecture, 이미지 분석)은 요청에서 작업만 등록하고 바로 응답하며,
+# run_job_worker 명령으로 실행한 워커 프로세스가 데이터베이스(SQLite)의 작업을 가져가 실행합니다. 별도의 브로커는 필요하지 않습니다.
+# 클라이언트는 작업 상태를 롱 폴링(async/req_job_status?wait=) 또는 SSE(async/req_job_events)로 기다리므로
+# 웹 워커가 생성 시간 동안 묶이지 않고, 클라이언트 타임아웃으로 연결이 끊겨도 생성 결과가 버려지지 않습니다.
+# 완료된 결과는 JOB_RESULT_TTL초 동안 보관합니다.
+JOB_RESULT_TTL = int(os.getenv('LANGCHAIN_JOB_RESULT_TTL', 24 * 60 * 60))
+# 워커가 작업 목록을 다시 확인하는 간격(초). 롱 폴링과 SSE의 상태 확인 간격으로도 사용
+JOB_POLL_INTERVAL = float(os.getenv('LANGCHAIN_JOB_POLL_INTERVAL', 0.5))
+# 롱 폴링 최대 대기 시간(초). 프록시/클라이언트 타임아웃보다 짧게 설정
+JOB_LONG_POLL_MAX = float(os.getenv('LANGCHAIN_JOB_LONG_POLL_MAX', 25))
+# 동기(WSGI) req_job_status의 최대 대기 시간(초). 기다리는 동안 WSGI 워커를 점유하므로 짧게 제한 (긴 대기는 비동기 엔드포인트 사용)
+JOB_SYNC_WAIT_MAX = float(os.getenv('LANGCHAIN_JOB_SYNC_WAIT_MAX', 2))
+# 실행 중인 작업이 이 시간(초)을 넘으면 워커가 종료된 것으로 보고 다시 대기열에 넣음
+JOB_LEASE_SECONDS = int(os.getenv('LANGCHAIN_JOB_LEASE_SECONDS', 600))
+# 워커 종료로 다시 실행할 최대 횟수
+JOB_MAX_ATTEMPTS = int(os.getenv('LANGCHAIN_JOB_MAX_ATTEMPTS', 3))
+# 보관 기한이 지난 작업을 삭제하는 간격(초)
+JOB_PURGE_INTERVAL = float(os.getenv('LANGCHAIN_JOB_PURGE_INTERVAL', 60))
+
+
+# 실행 함수는 뷰 모듈(apis)의 생성 로직을 그대로 사용 (apis가 이 모듈을 import하므로 실행 시점에 import)
+def _run_ui_component(payload):
+    from .apis import create_ui_component
+    return create_ui_component(payload.get('architecture', payload))
+
+
+def _run_image(chain_name, run, payload):
+    from .apis import run_image_chain
+    result, cached, error = run_image_chain(chain_name, payload.get('base64Data', ''), run)
+    if error is not None:
+        raise ValueError(error.data.get('message', '이미지를 처리할 수 없습니다.'))
+    return {**result, 'cached': cached}
+
+
+def _run_parse_image(payload):
+    from .apis import parse_image
+    return _run_image(IMAGE_PARSE, parse_image, payload)
+
+
+def _run_analyze_image(payload):
+    from .apis import analyze_image
+    return _run_image(IMAGE_DESCRIPTION, analyze_image, payload)
+
+
+# 작업 종류 -> 실행 함수(payload를 받아 JSON으로 저장할 결과를 반환)
+# payload 형식은 같은 이름의 동기 엔드포인트 요청 본문과 같습니다.
+JOB_HANDLERS = {
+    'ui_component': _run_ui_component,
+    'parse_image': _run_parse_image,
+    'analyze_image': _run_analyze_image,
+}
+
+
+def submit_job(kind, payload):
+    """
+    작업을 대기열에 등록합니다. 문자열 payload는 JSON으로 파싱합니다.
+
+    Raises:
+        ValueError: 알 수 없는 작업 종류 또는 JSON 객체가 아닌 payload
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"알 수 없는 작업 종류입니다: {kind} (가능한 값: {', '.join(JOB_HANDLERS)})")
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            payload = None
+    if not isinstance(payload, dict):
+        raise ValueError('payload는 JSON 객체(또는 JSON 객체 문자열)여야 합니다.')
+    return Job.objects.create(kind=kind, payload=payload)
+
+
+def get_job(job_id):
+    """
+    작업을 조회합니다. 없거나 보관 기한이 지난 작업이면 None을 반환합니다.
+    """
+    job = Job.objects.filter(pk=job_id).first()
+    if job is None or (job.expires_at is not None and job.expires_at <= timezone.now()):
+        return None
+    return job
+
+
+def job_summary(job, include_result=False):
+    """
+    응답에 포함할 작업 정보를 반환합니다. (payload 제외)
+    """
+    summary = {
+        'job_id': str(job.id),
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+    }
+    if job.status == Job.FAILED:
+        summary['error'] = job.error
+    if include_result and job.status == Job.SUCCEEDED:
+        summary['result'] = job.result
+    return summary
+
+
+def wait_for_job(job_id, timeout):
+    """
+    작업이 끝나거나 timeout(초, 최대 JOB_SYNC_WAIT_MAX)이 지날 때까지 기다린 뒤 작업을 반환합니다. (동기 엔드포인트의 짧은 대기)
+    """
+    deadline = time.monotonic() + max(0.0, min(timeout, JOB_SYNC_WAIT_MAX))
+    while True:
+        job = get_job(job_id)
+        if job is None or job.status in Job.FINISHED or time.monotonic() >= deadline:
+            return job
+        time.sleep(JOB_POLL_INTERVAL)
+
+
+def requeue_stale_jobs():
+    """
+    실행 시간이 JOB_LEASE_SECONDS를 넘은 작업(워커가 종료된 작업)을 다시 대기열에 넣습니다.
+    JOB_MAX_ATTEMPTS번 실행한 작업은 실패로 처리합니다.
+
+    Returns:
+        int: 다시 대기열에 넣거나 실패로 처리한 작업 수
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=now - timedelta(seconds=JOB_LEASE_SECONDS))
+    failed = stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED,
+        error='워커가 응답하지 않아 작업을 중단했습니다.',
+        finished_at=now,
+        expires_at=now + timedelta(seconds=JOB_RESULT_TTL),
+    )
+    requeued = stale.update(status=Job.QUEUED, worker='')
+    return failed + requeued
+
+
+def claim_job(worker):
+    """
+    가장 오래된 대기 작업을 실행 중으로 바꾸고 반환합니다. 대기 작업이 없으면 None을 반환합니다.
+    상태가 queued인 경우에만 바꾸는 조건부 UPDATE이므로 여러 워커 프로세스가 같은 작업을 가져가지 않습니다.
+    """
+    while True:
+        job = Job.objects.filter(status=Job.QUEUED).order_by('created_at').first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            worker=worker,
+            started_at=timezone.now(),
+            attempts=job.attempts + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_job(job):
+    """
+    작업을 실행하고 결과 또는 오류를 저장합니다.
+    """
+    handler = JOB_HANDLERS.get(job.kind)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise ValueError(f"알 수 없는 작업 종류입니다: {job.kind}")
+        result, error, status = handler(job.payload), '', Job.SUCCEEDED
+    except Exception as e:
+        print(f"작업 실행 오류 ({job.kind} {job.id}): {e}")
+        result, error, status = None, str(e), Job.FAILED
+
+    now = timezone.now()
+    # 다른 워커가 다시 가져간 작업(리스 만료)의 결과는 덮어쓰지 않음
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+        status=status,
+        result=result,
+        error=error,
+        finished_at=now,
+        expires_at=now + timedelta(seconds=JOB_RESULT_TTL),
+    )
+    job.refresh_from_db()
+    print(f"작업 완료 ({job.kind} {job.id}): {status}, {time.perf_counter() - started:.2f}초")
+    return job
+
+
+def purge_expired_jobs():
+    """
+    보관 기한이 지난 작업을 삭제합니다.
+
+    Returns:
+        int: 삭제한 작업 수
+    """
+    deleted, _ = Job.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(worker=None, poll_interval=None, once=False, should_stop=None):
+    """
+    대기열의 작업을 하나씩 가져와 실행합니다.
+
+    Args:
+        worker (str, optional): 워커 이름. 기본값은 호스트 이름:PID
+        poll_interval (float, optional): 대기 작업이 없을 때 다시 확인하는 간격(초). 기본값은 JOB_POLL_INTERVAL
+        once (bool): True이면 대기 작업을 모두 실행한 뒤 종료
+        should_stop (callable, optional): True를 반환하면 실행 중인 작업을 마친 뒤 종료
+
+    Returns:
+        int: 실행한 작업 수
+    """
+    worker = worker or default_worker_name()
+    poll_interval = JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    processed = 0
+    last_purge = None
+
+    while should_stop is None or not should_stop():
+        # 오래 실행되는 프로세스이므로 끊기거나 오래된 데이터베이스 연결을 정리
+        close_old_connections()
+        if last_purge is None or time.monotonic() - last_purge >= JOB_PURGE_INTERVAL:
+            requeue_stale_jobs()
+            purge_expired_jobs()
+            last_purge = time.monotonic()
+
+        job = claim_job(worker)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+
+    return processed
@@ -0,0 +1,14 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Accept: text/event-stream 요청이 content negotiation을 통과하도록 하는 렌더러
+    실제 본문은 StreamingHttpResponse가 직접 생성합니다.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
@@ -0,0 +1,496 @@
+"""
+LangChain 엔드포인트 오프라인 부하 테스트
+
+실제 Anthropic API 대신 지연 시간과 토큰 생성 속도를 설정할 수 있는 가짜 채팅 모델(LatencyFakeChatModel)을 사용하여
+Django test client(동기 API) 또는 AsyncClient(ASGI, 비동기 API)로 엔드포인트를 동시에 호출하고
+처리량, p50/p95/p99 지연 시간, 모델 시간을 제외한 서버 자체 오버헤드를 측정합니다.
+네트워크나 API 키 없이 서버 쪽 성능 변화를 확인할 수 있습니다.
+
+사용법 (server 디렉터리에서 실행):
+    python -m api.langchain.tests.load_test
+    python -m api.langchain.tests.load_test --endpoint req_ui_component --endpoint async/req_ui_component --requests 200 --concurrency 16
+    python -m api.langchain.tests.load_test --latency 0.5 --tokens-per-second 80 --output-tokens 300 --json
+"""
+import os
+import io
+import re
+import json
+import time
+import base64
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, AsyncIterator, List, Optional
+from unittest import mock
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from utils.llm_replay import ExchangeCorpus, ReplayChatModel
+
+# 사주풀이 프롬프트의 JSON 형식 안내 (이 뒤의 JSON 예시와 같은 형태로 응답)
+FORMAT_INSTRUCTION_PATTERN = re.compile(r'JSON 형식으로[^\n]*응답해주세요:')
+
+# 요청 하나가 실행되는 동안 가짜 모델이 호출된 구간(시작, 종료)을 기록하는 목록
+# 병렬 체인/헤징 스레드에서도 같은 목록에 기록되도록 contextvars로 전달합니다.
+_model_calls = contextvars.ContextVar('load_test_model_calls', default=None)
+
+
+def _collect_messages(value, fields):
+    # JSON 예시에서 message 필드가 있는 항목을 모두 찾음
+    if isinstance(value, dict):
+        if 'message' in value:
+            fields.append(value)
+        for item in value.values():
+            _collect_messages(item, fields)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_messages(item, fields)
+
+
+class LatencyFakeChatModel(BaseChatModel):
+    """
+    설정한 지연 시간과 토큰 생성 속도로 응답하는 가짜 채팅 모델
+
+    응답 시간 = latency(첫 토큰까지) + output_tokens / tokens_per_second
+    """
+    model_name: str = 'fake-chat-model'
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    output_tokens: int = 100
+    response: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return 'latency-fake-chat-model'
+
+    def _content(self, messages):
+        if self.response is not None:
+            return self.response
+        # 엔드포인트가 기대하는 형태의 JSON 응답을 출력 토큰 수(약 4자 = 1토큰)에 맞춰 생성
+        prompt = '\n'.join(str(message.content) for message in messages)
+        text_size = max(1, self.output_tokens * 4 - 40)
+
+        # 사주풀이: 프롬프트의 JSON 예시(요청한 항목 키)와 같은 형태로 message만 채움
+        instruction = FORMAT_INSTRUCTION_PATTERN.search(prompt)
+        if instruction is not None:
+            start = min(index for index in (prompt.find('{', instruction.end()), prompt.find('[', instruction.end())) if index >= 0)
+            template, _ = json.JSONDecoder().raw_decode(prompt[start:])
+            fields = []
+            _collect_messages(template, fields)
+            for item in fields:
+                item['message'] = '가' * max(1, text_size // len(fields))
+            return json.dumps(template, ensure_ascii=False)
+
+        # 이미지 설명 / 이미지 컴포넌트 추출
+        if '"service_purpose"' in prompt:
+            return json.dumps({
+                'service_purpose': 'login page', 'ui_components': ['input', 'button'],
+                'functionality': 'x' * text_size, 'language_elements': ['로그인'],
+            }, ensure_ascii=False)
+        if '"components"' in prompt:
+            return json.dumps({'components': [{'role': 'x' * text_size, 'tag': 'div', 'label': '로그인'}]}, ensure_ascii=False)
+
+        # UI 컴포넌트 (id는 프롬프트의 architecture에서 가져옴)
+        match = re.search(r"'newId': '([^']+)'", prompt)
+        new_id = match.group(1) if match else 'load-test'
+        return json.dumps({'new_id': new_id, 'html': f'<div id="{new_id}">' + 'x' * text_size + '</div>'})
+
+    def _chunks(self, messages):
+        content = self._content(messages)
+        return [content[index:index + 4] for index in range(0, len(content), 4)]
+
+    def _token_delay(self):
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _usage(self, messages):
+        from utils.langchain import estimate_message_tokens
+        input_tokens = estimate_message_tokens(messages)
+        return {'input_tokens': input_tokens, 'output_tokens': self.output_tokens, 'total_tokens': input_tokens + self.output_tokens}
+
+    def _message(self, messages, content):
+        usage = self._usage(messages)
+        return AIMessage(
+            content=content,
+            usage_metadata=usage,
+            response_metadata={'model': self.model_name, 'usage': {'input_tokens': usage['input_tokens'], 'output_tokens': usage['output_tokens']}}
+        )
+
+    def _record(self, start):
+        calls = _model_calls.get()
+        if calls is not None:
+            calls.append((start, time.perf_counter()))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        start = time.perf_counter()
+        time.sleep(self.latency + self.output_tokens * self._token_delay())
+        self._record(start)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, self._content(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        start = time.perf_counter()
+        await asyncio.sleep(self.latency + self.output_tokens * self._token_delay())
+        self._record(start)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, self._content(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        time.sleep(self.latency)
+        chunks = self._chunks(messages)
+        for index, chunk in enumerate(chunks):
+            time.sleep(self.output_tokens * self._token_delay() / len(chunks))
+            # 마지막 청크를 받은 뒤 소비자가 스트림을 닫을 수 있으므로 마지막 청크 전에 기록
+            if index == len(chunks) - 1:
+                self._record(start)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        # 마지막 청크에 토큰 사용량 포함
+        yield ChatGenerationChunk(message=AIMessageChunk(content='', usage_metadata=self._usage(messages), response_metadata={'model': self.model_name}))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        await asyncio.sleep(self.latency)
+        chunks = self._chunks(messages)
+        for index, chunk in enumerate(chunks):
+            await asyncio.sleep(self.output_tokens * self._token_delay() / len(chunks))
+            if index == len(chunks) - 1:
+                self._record(start)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        yield ChatGenerationChunk(message=AIMessageChunk(content='', usage_metadata=self._usage(messages), response_metadata={'model': self.model_name}))
+
+
+class RecordedReplayChatModel(ReplayChatModel):
+    """
+    재생 구간을 부하 테스트의 모델 시간으로 기록하는 ReplayChatModel
+    """
+    def _record(self, start):
+        calls = _model_calls.get()
+        if calls is not None:
+            calls.append((start, time.perf_counter()))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        start = time.perf_counter()
+        result = super()._generate(messages, stop, run_manager, **kwargs)
+        self._record(start)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        start = time.perf_counter()
+        result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+        self._record(start)
+        return result
+
+    def _span(self):
+        # 스트림은 소비자가 중간에 닫을 수 있으므로 청크를 전달할 때마다 구간의 끝을 갱신
+        span = [time.perf_counter(), time.perf_counter()]
+        calls = _model_calls.get()
+        if calls is not None:
+            calls.append(span)
+        return span
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        span = self._span()
+        for chunk in super()._stream(messages, stop, run_manager, **kwargs):
+            span[1] = time.perf_counter()
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        span = self._span()
+        async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+            span[1] = time.perf_counter()
+            yield chunk
+
+
+@contextmanager
+def fake_models(latency=0.0, tokens_per_second=0.0, output_tokens=100, response=None, replay=None, replay_speed=1.0):
+    """
+    모델 풀(get_model)이 ChatAnthropic 대신 LatencyFakeChatModel을 생성하도록 바꿉니다.
+    replay에 코퍼스 경로를 지정하면 기록된 응답과 지연 시간을 재생하는 모델을 사용합니다. (utils.llm_replay)
+    응답 캐시와 이미지 결과 저장소도 임시 파일로 바꿔 실제 캐시를 건드리지 않고, 컴포넌트 라이브러리(데이터베이스)는 사용하지 않습니다.
+    """
+    import utils.langchain as langchain_utils
+    import utils.image_store as image_store
+    import api.langchain.component_library as component_library
+    corpus = ExchangeCorpus(replay) if replay else None
+
+    def create_model(model_name, max_tokens, temperature=None):
+        if corpus is not None:
+            return RecordedReplayChatModel(model_name=model_name, corpus=corpus, speed=replay_speed)
+        return LatencyFakeChatModel(model_name=model_name, latency=latency, tokens_per_second=tokens_per_second, output_tokens=output_tokens, response=response)
+
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            mock.patch.object(langchain_utils, '_create_model', create_model), \
+            mock.patch.dict(langchain_utils._models, clear=True), \
+            mock.patch.object(langchain_utils, '_response_cache', langchain_utils.ResponseCache(path=os.path.join(tmpdir, 'cache.sqlite3'))), \
+            mock.patch.object(image_store, '_image_store', image_store.ImageResultStore(path=os.path.join(tmpdir, 'image_store.sqlite3'))), \
+            mock.patch.object(component_library, 'LIBRARY_ENABLED', False):
+        yield
+
+
+def _architecture(index):
+    return {
+        'newId': f'load-{index}',
+        'type': 'div',
+        'label': f'부하 테스트 {index}',
+        'children': [{'type': 'button', 'label': f'확인 {index}'}, {'type': 'input', 'label': f'이름 {index}'}],
+    }
+
+
+def _image(index):
+    from PIL import Image
+    # 같은 이미지는 단일 호출(single-flight)로 합쳐지므로 요청마다 색을 바꿔 다른 이미지를 만듦
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 600), (index % 256, (index // 256) % 256, 240)).save(buffer, format='PNG')
+    return {'base64Data': 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')}
+
+
+# 엔드포인트별 요청 payload 생성 함수 (index: 요청 번호. 캐시와 단일 호출 병합을 피하기 위해 요청마다 다른 입력을 만듭니다.)
+ENDPOINTS = {
+    'req_ui_component': lambda index: _architecture(index),
+    'req_ui_component_batch': lambda index: {'architectures': [_architecture(f'{index}-{item}') for item in range(4)]},
+    'req_ui_component_stream': lambda index: _architecture(index),
+    'req_parse_image': _image,
+    'req_analyze_image': _image,
+    'req_fortune_telling_parallel': lambda index: {'user_info': f'1990년 5월 15일 오전 8시 30분 출생, 여자 ({index})'},
+    'req_fortune_telling_parallel_by_item': lambda index: {'user_info': f'1990년 5월 15일 오전 8시 30분 출생, 여자 ({index})'},
+    'req_fortune_telling_combined': lambda index: {'user_info': f'1990년 5월 15일 오전 8시 30분 출생, 여자 ({index})'},
+    'async/req_ui_component': lambda index: _architecture(index),
+    'async/req_ui_component_batch': lambda index: {'architectures': [_architecture(f'{index}-{item}') for item in range(4)]},
+    'async/req_ui_component_stream': lambda index: _architecture(index),
+    'async/req_parse_image': _image,
+    'async/req_analyze_image': _image,
+}
+
+URL_PREFIX = '/api/langchain/'
+
+
+def _percentile(values, quantile):
+    from utils.langchain import _percentile as percentile
+    return percentile(values, quantile) if values else 0.0
+
+
+def _busy_time(calls):
+    """
+    모델 호출 구간의 합집합 길이 (병렬 호출은 겹치는 시간을 한 번만 셉니다.)
+    """
+    busy = 0.0
+    end = None
+    for call_start, call_end in sorted(calls):
+        if end is None or call_start > end:
+            busy += call_end - call_start
+            end = call_end
+        elif call_end > end:
+            busy += call_end - end
+            end = call_end
+    return busy
+
+
+def _incomplete(value):
+    """
+    결과 안에 빈 항목(message가 빈 문자열), 오류(error 키), 실패한 항목(status가 Success가 아님)이 있는지 확인합니다.
+    """
+    if isinstance(value, dict):
+        if 'error' in value or value.get('status', 'Success') != 'Success' or value.get('message') == '':
+            return True
+        return any(_incomplete(item) for item in value.values())
+    if isinstance(value, list):
+        return any(_incomplete(item) for item in value)
+    return False
+
+
+def _succeeded(response, body):
+    """
+    HTTP 상태와 status뿐 아니라 결과가 비어 있거나 빈 항목으로 채워진 응답도 실패로 셉니다.
+    """
+    if response.status_code != 200:
+        return False
+    if response.get('Content-Type', '').startswith('text/event-stream'):
+        return b'event: done' in body and b'event: error' not in body
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return False
+    message = data.get('message')
+    return data.get('status') == 'Success' and message not in (None, '', [], {}) and not _incomplete(message)
+
+
+def _run_sync(endpoint, payloads, concurrency):
+    from django.test import Client
+
+    local = threading.local()
+
+    def call(payload):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        calls = []
+        token = _model_calls.set(calls)
+        start = time.perf_counter()
+        try:
+            response = local.client.post(URL_PREFIX + endpoint, payload, content_type='application/json')
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            ok = _succeeded(response, body)
+        except Exception as e:
+            print(f"{endpoint} 요청 오류: {e}")
+            ok = False
+        finally:
+            _model_calls.reset(token)
+        return ok, time.perf_counter() - start, _busy_time(calls)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(call, payloads))
+
+
+async def _run_async(endpoint, payloads, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    queue = list(enumerate(payloads))
+    results = [None] * len(payloads)
+
+    async def call(payload):
+        calls = []
+        token = _model_calls.set(calls)
+        start = time.perf_counter()
+        try:
+            response = await client.post(URL_PREFIX + endpoint, payload, content_type='application/json')
+            if response.streaming:
+                body = b''.join([chunk async for chunk in response.streaming_content])
+            else:
+                body = response.content
+            ok = _succeeded(response, body)
+        except Exception as e:
+            print(f"{endpoint} 요청 오류: {e}")
+            ok = False
+        finally:
+            _model_calls.reset(token)
+        return ok, time.perf_counter() - start, _busy_time(calls)
+
+    async def worker():
+        while queue:
+            index, payload = queue.pop(0)
+            results[index] = await call(payload)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+def run_load_test(endpoint, requests=50, concurrency=8, latency=0.0, tokens_per_second=0.0, output_tokens=100, unique=True, warmup=1, replay=None, replay_speed=1.0):
+    """
+    가짜 모델로 엔드포인트 하나에 부하를 주고 결과를 집계합니다.
+
+    Args:
+        endpoint (str): ENDPOINTS의 엔드포인트 이름 ('async/'로 시작하면 AsyncClient 사용)
+        requests (int): 총 요청 수
+        concurrency (int): 동시 요청 수
+        latency (float): 가짜 모델의 첫 토큰까지 지연 시간(초)
+        tokens_per_second (float): 가짜 모델의 출력 토큰 생성 속도 (0이면 지연 없음)
+        output_tokens (int): 가짜 모델의 출력 토큰 수
+        unique (bool): False이면 모든 요청에 같은 입력을 보냄 (응답 캐시/단일 호출 병합 포함 측정)
+        warmup (int): 측정 전에 보내는 요청 수 (모델/체인 생성, 토크나이저 로딩 등 최초 1회 비용 제외)
+        replay (str, optional): 모델 호출 코퍼스 경로. 지정하면 가짜 모델 대신 기록된 응답과 지연 시간을 재생
+        replay_speed (float): 재생 속도 배율 (1.0 = 기록된 시간 그대로)
+
+    Returns:
+        dict: requests, errors, concurrency, duration, throughput, latency/model_time/overhead(p50, p95, p99, avg)
+    """
+    run = (lambda payloads: asyncio.run(_run_async(endpoint, payloads, concurrency))) if endpoint.startswith('async/') else (lambda payloads: _run_sync(endpoint, payloads, concurrency))
+    # 워밍업 요청은 측정 요청과 다른 입력을 사용 (캐시 적중 방지)
+    warmup_payloads = [ENDPOINTS[endpoint](requests + index) for index in range(warmup)]
+    payloads = [ENDPOINTS[endpoint](index if unique else 0) for index in range(requests)]
+
+    with fake_models(latency=latency, tokens_per_second=tokens_per_second, output_tokens=output_tokens, replay=replay, replay_speed=replay_speed):
+        run(warmup_payloads)
+        start = time.perf_counter()
+        results = run(payloads)
+        duration = time.perf_counter() - start
+
+    def summary(values):
+        return {
+            'p50': _percentile(values, 0.5),
+            'p95': _percentile(values, 0.95),
+            'p99': _percentile(values, 0.99),
+            'avg': sum(values) / len(values) if values else 0.0,
+        }
+
+    succeeded = [(elapsed, busy) for ok, elapsed, busy in results if ok]
+    return {
+        'endpoint': endpoint,
+        'requests': requests,
+        'errors': requests - len(succeeded),
+        'concurrency': concurrency,
+        'duration': duration,
+        'throughput': len(succeeded) / duration if duration else 0.0,
+        'latency': summary([elapsed for elapsed, _ in succeeded]),
+        'model_time': summary([busy for _, busy in succeeded]),
+        # 요청 지연 시간 중 모델이 응답하지 않은 시간 (라우팅, 프롬프트 구성, 파싱, 직렬화, 대기 등)
+        'overhead': summary([elapsed - busy for elapsed, busy in succeeded]),
+    }
+
+
+def print_report(results):
+    """
+    부하 테스트 결과를 표 형식으로 출력합니다.
+    """
+    header = f"{'endpoint':<42}{'req':>6}{'err':>5}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'ovh p50':>9}{'ovh p99':>9}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        latency = result['latency']
+        overhead = result['overhead']
+        print(
+            f"{result['endpoint']:<42}{result['requests']:>6}{result['errors']:>5}{result['throughput']:>9.1f}"
+            f"{latency['p50'] * 1000:>8.0f}m{latency['p95'] * 1000:>8.0f}m{latency['p99'] * 1000:>8.0f}m"
+            f"{overhead['p50'] * 1000:>8.1f}m{overhead['p99'] * 1000:>8.1f}m"
+        )
+    print("(지연 시간 단위: ms, ovh = 요청 지연 시간 - 모델 응답 시간)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='LangChain 엔드포인트 오프라인 부하 테스트 (가짜 채팅 모델 사용)')
+    parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS), help='측정할 엔드포인트 (여러 번 지정 가능, 기본값: 전체)')
+    parser.add_argument('--requests', type=int, default=50, help='엔드포인트별 총 요청 수')
+    parser.add_argument('--concurrency', type=int, default=8, help='동시 요청 수')
+    parser.add_argument('--latency', type=float, default=0.2, help='가짜 모델의 첫 토큰까지 지연 시간(초)')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='가짜 모델의 출력 토큰 생성 속도 (0이면 지연 없음)')
+    parser.add_argument('--output-tokens', type=int, default=100, help='가짜 모델의 출력 토큰 수')
+    parser.add_argument('--replay', help='모델 호출 코퍼스 경로 (LANGCHAIN_LLM_MODE=record로 기록). 지정하면 기록된 응답과 지연 시간을 재생')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='재생 속도 배율 (1.0 = 기록된 시간 그대로)')
+    parser.add_argument('--warmup', type=int, default=1, help='측정 전에 보내는 워밍업 요청 수')
+    parser.add_argument('--same-input', action='store_true', help='모든 요청에 같은 입력 사용 (캐시/단일 호출 병합 포함 측정)')
+    parser.add_argument('--json', action='store_true', help='결과를 JSON으로 출력')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    from django.test.utils import setup_test_environment
+    django.setup()
+    # test client가 사용하는 'testserver' 호스트 허용
+    setup_test_environment()
+
+    results = []
+    for endpoint in args.endpoint or list(ENDPOINTS):
+        print(f"{endpoint} 부하 테스트 중... (요청 {args.requests}개, 동시 {args.concurrency}개)")
+        results.append(run_load_test(
+            endpoint,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            latency=args.latency,
+            tokens_per_second=args.tokens_per_second,
+            output_tokens=args.output_tokens,
+            unique=not args.same_input,
+            warmup=args.warmup,
+            replay=args.replay,
+            replay_speed=args.replay_speed,
+        ))
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,11 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework import permissions
 from rest_framework.response import Response
-from utils.langchain import get_langchain_model, set_chat_prompt, set_prompt, get_token_usage_from_response, estimate_token_cost
+from utils.langchain import get_langchain_model, get_model, route_request, calculate_tokens, pack_items, choose_pack_count, record_packing_result, USAGE_FIELDS, DEFAULT_MAX_TOKENS, set_chat_prompt, set_prompt, set_cached_prompt, get_token_usage_from_response, estimate_token_cost, TokenUsageCallbackHandler, TolerantJsonOutputParser, sum_usage
 
 from langchain_core.runnables import RunnableLambda, RunnableParallel, RunnableSequence
-from langchain_core.output_parsers import JsonOutputParser
 from typing import Dict, Any, Optional
+import os
 import json
 from datetime import datetime
 
@@ -15,8 +15,12 @@ from langchain_core.tools import Tool
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain_core.prompts import PromptTemplate
 
-from prompt.image_parse_prompt import image_text_extract_format_instruction, image_text_extract_prompt, image_description_format_instruction, image_description_prompt, image_construct_format_instruction, image_construct_prompt
+from prompt.image_parse_prompt import image_text_extract_format_instruction, image_text_extract_prompt_prefix, image_text_extract_prompt_suffix, image_description_format_instruction, image_description_prompt_prefix, image_description_prompt_suffix, image_construct_format_instruction, image_construct_prompt_prefix, image_construct_prompt_suffix
 from ..types import RequestImageDict
+from utils.llm_image import prepare_image, image_summary
+from utils.image_upload import read_image_upload, upload_summary, ImageUploadError
+from utils.image_store import cached_image_result
+from utils.pipeline import run_pipeline
 
 from utils.hugging_face import extract_text_from_base64_image
 from utils.webpage_analyzer import WebpageAnalyzer
@@ -25,6 +29,9 @@ from utils.resnet_50_prediction import predict_from_base64
 
 minimum_text_len = 100
 
+# 사주풀이 항목 묶음 수(K) 후보 (req_fortune_telling_parallel_by_item)
+FORTUNE_PACK_CANDIDATES = tuple(int(value) for value in os.getenv('LANGCHAIN_FORTUNE_PACK_CANDIDATES', '2,4,8').split(','))
+
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def req_sample_chat(request, format=None):
@@ -38,7 +45,7 @@ def req_sample_chat(request, format=None):
     print('간단한 채팅을 수행합니다...')
 
     # JSON 출력 파서 정의
-    parser = JsonOutputParser()
+    parser = TolerantJsonOutputParser()
     
     # 응답 형식에 대한 지시사항
     format_instructions = """
@@ -99,6 +106,20 @@ def req_sample_answer(request, format=None):
         'message': response
     })
 
+def analyze_webpage_image(data):
+    """
+    WebpageAnalyzer로 이미지(base64 문자열 또는 바이트)를 분석합니다.
+    같은 이미지의 결과는 이미지 결과 저장소에서 가져오며, 이때는 분석기(ResNet50)도 생성하지 않습니다.
+
+    Returns:
+        tuple: (분석 결과, 저장소 적중 여부)
+    """
+    return cached_image_result(
+        'webpage_analyzer', data,
+        lambda data: WebpageAnalyzer().analyze_webpage(data, isinstance(data, str)),
+        cacheable=lambda results: 'error' not in results['webpage_function']
+    )
+
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def req_sample_analyze_image(request, format=None):
@@ -120,17 +141,45 @@ def req_sample_analyze_image(request, format=None):
     base64_data = architecture.get('base64Data', '')
     # 실제 LangChain 초기화 로직 호출
     # texts = extract_text_from_base64_image(base64_data)
-    analyzer = WebpageAnalyzer()
-    results = analyzer.analyze_webpage(base64_data, True)
+    results, cached = analyze_webpage_image(base64_data)
     
     return Response({
         'status': 'Success',
-        'message': results
+        'message': results,
+        'cached': cached
+    })
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def req_sample_analyze_image_upload(request, format=None):
+    """
+    multipart/form-data('image' 필드) 또는 이미지 바이트 본문으로 받은 Image를 분석 (req_sample_analyze_image와 같은 응답)
+    """
+    try:
+        upload = read_image_upload(request)
+    except ImageUploadError as e:
+        return Response({
+            'status': 'Error',
+            'message': str(e)
+        }, status=e.status)
+
+    # 업로드된 바이트를 base64로 다시 인코딩하지 않고 그대로 전달
+    results, cached = analyze_webpage_image(upload['data'])
+    
+    return Response({
+        'status': 'Success',
+        'message': results,
+        'cached': cached,
+        'upload': upload_summary(upload)
     })
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def req_sample_runnables_sequence(request, format=None):
+    """
+    스크린샷에서 텍스트 추출, 화면 설명, 컴포넌트 구성의 3단계 파이프라인을 실행
+    단계별 결과, 상태, 시간을 함께 반환합니다.
+    """
 
     try:
         # request.body는 바이트 문자열이므로 디코딩 후 JSON으로 파싱
@@ -143,54 +192,62 @@ def req_sample_runnables_sequence(request, format=None):
         print(f"원본 문자열 사용: {architecture}")
 
     model = get_langchain_model()
+    parser = TolerantJsonOutputParser()
 
     # 딕셔너리에서 id 값 안전하게 추출
     base64_data = architecture.get('base64Data', '')
-    
-    # 클로저를 사용하여 base64_data를 캡처
-    def create_response_handler(base64_data):
-        print("data:image/png;base64," + base64_data)
-        def response_handler(result):
-            print("========= RESPONSE : ", result)
-            # AIMessage 객체에서 content를 추출
-            content = result.content if hasattr(result, 'content') else result
-            
-            # JSON 파싱을 시도하지 않고 content 문자열을 그대로 service_purpose로 사용
-            return {
-                "image_url": "data:image/png;base64," + base64_data,
-                "service_purpose": content
-            }
-        return response_handler
-    
-    # 클로저를 사용하여 response_handler 생성
-    response_handler = create_response_handler(base64_data)
-
-    prompt_0 = set_prompt(image_text_extract_prompt, ["image_url"], {"format_instructions": image_text_extract_format_instruction })
-    prompt_1 = set_prompt(image_description_prompt, ["image_url"], {"format_instructions": image_description_format_instruction })
-    prompt_2 = set_prompt(image_construct_prompt, ["image_url", "service_purpose"], {"format_instructions": image_construct_format_instruction })
-    
-    # 체인 구성 수정: model의 출력을 response_handler로 처리하고 종료
-    chain = (
-        RunnableLambda(lambda x: {"image_url": x["image_url"]})
-        .pipe(prompt_0)
-        .pipe(model)
-        .pipe(response_handler)
-    )
     try:
-        response = chain.invoke({
-            "image_url": "data:image/png;base64," + base64_data,
-        })
-        print(response)
-        return Response({
-            'status': 'Success',
-            'message': response
-        })
+        # 이미지를 한 번만 디코딩하여 축소/재압축
+        image = prepare_image(base64_data)
     except Exception as e:
-        print(f"req_sample_runnables 에서 에러 발생: {e}")
+        print(f"이미지 처리 오류: {e}")
         return Response({
             'status': 'Error',
-            'message': str(e)
-        }, status=500)
+            'message': f'이미지를 읽을 수 없습니다: {e}'
+        }, status=400)
+
+    # 이미지는 image content block으로 전달
+    prompt_0 = set_cached_prompt(image_text_extract_prompt_prefix, image_text_extract_prompt_suffix, [], {"format_instructions": image_text_extract_format_instruction }, image_variable="image_url")
+    prompt_1 = set_cached_prompt(image_description_prompt_prefix, image_description_prompt_suffix, [], {"format_instructions": image_description_format_instruction }, image_variable="image_url")
+    prompt_2 = set_cached_prompt(image_construct_prompt_prefix, image_construct_prompt_suffix, ["service_purpose", "extracted_text"], {"format_instructions": image_construct_format_instruction }, image_variable="image_url")
+
+    handler = TokenUsageCallbackHandler('req_sample_runnables_sequence')
+    config = {'callbacks': [handler]}
+    text_chain = prompt_0.pipe(model).pipe(parser)
+    description_chain = prompt_1.pipe(model).pipe(parser)
+    construct_chain = prompt_2.pipe(model).pipe(parser)
+
+    def construct(inputs):
+        description = inputs['description']
+        service_purpose = description.get('service_purpose', '') if isinstance(description, dict) else description
+        # 텍스트 추출이 실패하면 추출된 텍스트 없이 구성
+        texts = inputs['text_extraction']
+        extracted_text = texts.get('extracted_text', []) if isinstance(texts, dict) else []
+        return construct_chain.invoke({
+            "image_url": inputs["image_url"],
+            "service_purpose": service_purpose,
+            "extracted_text": json.dumps(extracted_text, ensure_ascii=False),
+        }, config=config)
+
+    # 텍스트 추출(0)과 화면 설명(1)은 서로 독립적이므로 동시에 실행하고,
+    # 컴포넌트 구성(2)은 화면 설명이 끝나는 즉시 시작 (텍스트 추출은 기다리지 않고, 이미 끝났으면 그 결과를 사용)
+    pipeline = run_pipeline({
+        'text_extraction': {'run': lambda inputs: text_chain.invoke({"image_url": inputs["image_url"]}, config=config)},
+        'description': {'run': lambda inputs: description_chain.invoke({"image_url": inputs["image_url"]}, config=config)},
+        'construct': {'run': construct, 'requires': ['description'], 'optional': ['text_extraction']},
+    }, {"image_url": image["data_url"]})
+
+    stages = pipeline['stages']
+    print(f"req_sample_runnables_sequence 단계별 시간: { {name: round(stage['latency'], 3) for name, stage in stages.items()} }, 전체: {pipeline['elapsed']:.3f}초")
+    # 실패한 단계가 있어도 완료된 단계의 결과는 함께 반환
+    return Response({
+        'status': 'Success' if all(stage['status'] == 'Success' for stage in stages.values()) else 'Error',
+        'message': {name: stage.get('result') for name, stage in stages.items()},
+        'stages': {name: {key: value for key, value in stage.items() if key != 'result'} for name, stage in stages.items()},
+        'timings': {key: pipeline[key] for key in ('elapsed', 'sequential', 'speedup')},
+        'image': image_summary(image),
+        'usage': handler.summary()
+    }, status=200 if any(stage['status'] == 'Success' for stage in stages.values()) else 500)
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -268,6 +325,27 @@ def req_sample_resnet_50_predict(request, format=None):
         'message' : response
     })
 
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def req_sample_resnet_50_predict_upload(request, format=None):
+    """
+    multipart/form-data('image' 필드) 또는 이미지 바이트 본문으로 받은 Image를 ResNet50으로 예측
+    """
+    try:
+        upload = read_image_upload(request)
+    except ImageUploadError as e:
+        return Response({
+            'status': 'Error',
+            'message': str(e)
+        }, status=e.status)
+
+    response = predict_from_base64(upload['data'])
+    return Response({
+        'status' : 'success',
+        'message' : response,
+        'upload': upload_summary(upload)
+    })
+
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def req_sample_tools_with_agent(request, format=None):
@@ -465,7 +543,8 @@ def req_sample_tools_simple(request, format=None):
 def req_fortune_telling_parallel_by_item(request, format=None):
     """
     LangChain을 통해 일일, 주간, 월간, 년간 사주풀이를 항목별로 병렬 처리하는 API
-    각 기간(일간, 주간, 월간, 년간)의 개별 항목(대인관계, 일과학업, 금전운 등)별로 요청해서 합치는 방식
+    각 기간(일간, 주간, 월간, 년간)의 개별 항목(대인관계, 일과학업, 금전운 등)을 K개의 묶음으로 나눠 병렬로 요청해서 합치는 방식
+    K는 측정한 지연 시간과 비용으로 선택하며(choose_pack_count), 요청의 pack_count로 지정할 수도 있습니다.
     JSON 형식으로 응답을 반환합니다.
     토큰 사용량 및 비용 정보도 함께 제공합니다.
     """
@@ -474,12 +553,16 @@ def req_fortune_telling_parallel_by_item(request, format=None):
         user_data = json.loads(request.body.decode('utf-8'))
         user_info = user_data.get('user_info', '')
         
+        # 항목별 요청은 라우팅 정책(fortune_item)에 따라 모델 선택
         print("LangChain Model을 가져옵니다...")
-        model = get_langchain_model()
-        model_name = model.model_name if hasattr(model, 'model_name') else "claude-3-5-sonnet-20240620"
+        route = route_request('fortune_item', prompt_tokens=calculate_tokens(str(user_info)))
+        model_name = route['model']
         
         # JSON 출력 파서 정의
-        parser = JsonOutputParser()
+        parser = TolerantJsonOutputParser()
+
+        # 하위 체인별 실제 토큰 사용량 수집
+        usage_handler = TokenUsageCallbackHandler('req_fortune_telling_parallel_by_item', route)
         
         # 항목 정의
         items = {
@@ -523,145 +606,159 @@ def req_fortune_telling_parallel_by_item(request, format=None):
             "yearly": "올해"
         }
         
-        # 프롬프트 및 체인 생성 함수
-        def create_item_prompt(period, item):
-            period_text = {"daily": "오늘", "weekly": "이번 주", "monthly": "이번 달", "yearly": "올해"}[period]
+        # 모든 (기간, 항목) 목록
+        all_items = [(period, item) for period, period_items in items.items() for item in period_items]
+
+        # 묶음 하나의 최대 출력 토큰(DEFAULT_MAX_TOKENS) 안에서 항목마다 항목별 최대 출력 토큰(route['max_tokens'])을 줄 수 있도록
+        # 묶음 크기를 제한 (최대 출력 토큰을 줄이면 항목별 응답이 잘림)
+        max_pack_size = max(1, DEFAULT_MAX_TOKENS // route['max_tokens'])
+        min_pack_count = -(-len(all_items) // max_pack_size)
+
+        # 묶음 수(K) 선택: 요청에 지정된 값 또는 측정 결과로 선택 (최소 묶음 수 이상)
+        candidates = sorted({max(count, min_pack_count) for count in FORTUNE_PACK_CANDIDATES})
+        pack_count = max(int(user_data.get('pack_count') or choose_pack_count('req_fortune_telling_parallel_by_item', candidates)), min_pack_count)
+        packs = pack_items(all_items, pack_count)
+        print(f"사주풀이 {len(all_items)}개 항목을 {len(packs)}개 묶음으로 요청합니다.")
+
+        # 프롬프트 및 체인 생성 함수 (묶음 하나 = 호출 하나)
+        def create_pack_prompt(pack):
+            period_text = {"daily": "오늘", "weekly": "이번 주", "monthly": "이번 달", "yearly": "올해"}
+            item_lines = "\n".join(
+                f"- {period}_{item['key']}: {period_text[period]}의 {item['label']}"
+                for period, item in pack
+            )
+            item_formats = ",\n".join(
+                f'''"{period}_{item['key']}": {{ "label": "{item['label']}", "message": "{period_prefixes[period]} {item['label']}에 대한 사주풀이 내용", "key": "{item['key']}" }}'''
+                for period, item in pack
+            )
             format_instructions = f"""
             RETURN ONLY JSON!
             NO DESCRIPTION ABOUT CREATED MESSAGE!
-            다음 JSON 형식으로 응답해주세요:
+            다음 JSON 형식으로 모든 항목에 대해 응답해주세요:
             {{
-                "label": "{item['label']}",
-                "message": "{period_prefixes[period]} {item['label']}에 대한 사주풀이 내용",
-                "key": "{item['key']}"
+                {item_formats}
             }}
             """
             
-            prompt_text = f"다음 정보를 바탕으로 {period_text}의 {item['label']}에 대한 사주풀이를 해주세요. {{format_instructions}} 사용자 정보: {{user_info}}"
+            prompt_text = f"다음 정보를 바탕으로 아래 항목들에 대한 사주풀이를 각각 해주세요.\n{item_lines}\n{{format_instructions}} 사용자 정보: {{user_info}}"
             prompt = set_prompt(prompt_text, ["user_info"], {"format_instructions": format_instructions})
-            return prompt.pipe(model).pipe(parser)
-        
-        # 모든 항목에 대한 병렬 체인 구성
-        parallel_chains = {}
-        
-        # 각 기간의 각 항목에 대한 체인 생성
-        for period, period_items in items.items():
-            for item in period_items:
-                chain_key = f"{period}_{item['key']}"
-                parallel_chains[chain_key] = create_item_prompt(period, item)
-        
-        # 후처리 함수 정의
-        def post_process(result):
-            try:
-                # 결과 정리
-                processed_results = {
-                    "daily": [],
-                    "weekly": [],
-                    "monthly": [],
-                    "yearly": []
-                }
-                
-                # 토큰 사용량 계산을 위한 구조
-                token_usage = {
-                    "daily": {},
-                    "weekly": {},
-                    "monthly": {},
-                    "yearly": {}
-                }
-                
-                # 각 결과 처리
-                for key, value in result.items():
-                    period, item_key = key.split('_', 1)
-                    
-                    # 결과 추출
-                    content = value.content if hasattr(value, "content") else value
-                    
-                    # 결과가 문자열인 경우 JSON으로 파싱
-                    if isinstance(content, str):
-                        try:
-                            content = json.loads(content)
-                        except:
-                            # JSON 파싱 실패 시 원본 유지
-                            pass
-                    
-                    # 결과 추가
-                    processed_results[period].append(content)
-                    
-                    # 토큰 사용량 계산
-                    token_usage[period][item_key] = get_token_usage_from_response(value)
-                
-                # 현재 시간 포맷팅
-                current_time = datetime.now().isoformat()
+            # 항목 수에 비례해 최대 출력 토큰 설정 (묶음 크기 제한으로 DEFAULT_MAX_TOKENS를 넘지 않음)
+            pack_model = get_model(route['model'], route['max_tokens'] * len(pack))
+            return prompt.pipe(pack_model).pipe(parser)
+
+        def run_packs(packs, prefix):
+            """
+            묶음들을 병렬로 요청하고 항목 키별 (결과, 항목별 토큰 사용량)을 반환 (결과가 없거나 비어 있으면 None)
+            """
+            parallel_chains = {f"{prefix}_{index}": create_pack_prompt(pack) for index, pack in enumerate(packs)}
+            result = RunnableParallel(**parallel_chains).invoke({
+                "user_info": user_info,
+            }, config={'callbacks': [usage_handler]})
+
+            # 하위 체인별 실제 토큰 사용량
+            usage_by_chain = usage_handler.by_chain()
+            items_by_key = {}
+            for pack_key, pack in zip(parallel_chains, packs):
+                value = result[pack_key]
                 
-                # 토큰 사용량 합계 계산
-                period_totals = {}
-                for period, usage in token_usage.items():
-                    period_input_tokens = sum(item_usage.get('input_tokens', 0) for item_usage in usage.values())
-                    period_output_tokens = sum(item_usage.get('output_tokens', 0) for item_usage in usage.values())
-                    period_totals[period] = {
-                        'input_tokens': period_input_tokens,
-                        'output_tokens': period_output_tokens,
-                        'total_tokens': period_input_tokens + period_output_tokens
-                    }
+                # 결과 추출
+                content = value.content if hasattr(value, "content") else value
                 
-                # 총 토큰 사용량 계산
-                total_input_tokens = sum(period_total.get('input_tokens', 0) for period_total in period_totals.values())
-                total_output_tokens = sum(period_total.get('output_tokens', 0) for period_total in period_totals.values())
-                total_tokens = total_input_tokens + total_output_tokens
+                # 결과가 문자열인 경우 JSON으로 파싱
+                if isinstance(content, str):
+                    try:
+                        content = json.loads(content)
+                    except:
+                        # JSON 파싱 실패 시 모든 항목의 결과가 없는 것으로 처리
+                        content = {}
                 
-                # 비용 계산
-                cost = estimate_token_cost({
-                    'input_tokens': total_input_tokens,
-                    'output_tokens': total_output_tokens
-                }, model_name)
+                # 묶음의 토큰 사용량을 항목 수로 나눠 항목별 사용량으로 기록 (사용량 정보가 없으면 추정)
+                pack_usage = usage_by_chain.get(pack_key) or get_token_usage_from_response(value)
+                item_usage = {field: (pack_usage.get(field, 0) or 0) / len(pack) for field in USAGE_FIELDS}
                 
-                # 결과를 통합된 형식으로 변환
-                return {
-                    "fortune_telling": {
-                        "user_info": user_info,
-                        "results": {
-                            "daily": processed_results["daily"],
-                            "weekly": processed_results["weekly"],
-                            "monthly": processed_results["monthly"],
-                            "yearly": processed_results["yearly"]
-                        },
-                        "timestamp": current_time,
-                        "token_usage": {
-                            "by_item": token_usage,
-                            "by_period": period_totals,
-                            "total": {
-                                "input_tokens": total_input_tokens,
-                                "output_tokens": total_output_tokens,
-                                "total_tokens": total_tokens
-                            },
-                            "cost": cost
-                        }
-                    }
-                }
-            except Exception as e:
-                print(f"결과 처리 중 오류 발생: {e}")
-                return {
-                    "error": f"결과 처리 중 오류 발생: {str(e)}"
-                }
-        
-        # 병렬 처리 체인 구성
-        chain = RunnableParallel(**parallel_chains).pipe(RunnableLambda(post_process))
-        
+                for period, item in pack:
+                    chain_key = f"{period}_{item['key']}"
+                    item_content = content.get(chain_key) if isinstance(content, dict) else None
+                    if not isinstance(item_content, dict) or not item_content.get('message'):
+                        item_content = None
+                    items_by_key[chain_key] = (item_content, item_usage)
+            return items_by_key
+
         # 체인 실행
         print(f"사주풀이 항목별 병렬 처리를 시작합니다. 사용자 정보: {user_info}")
         start_time = datetime.now()
-        response = chain.invoke({
-            "user_info": user_info,
-        })
+        item_results = run_packs(packs, "pack")
+
+        # 결과가 없는 항목은 한 번 더 요청 (같은 묶음 크기 제한)
+        missing = [(period, item) for period, item in all_items if item_results[f"{period}_{item['key']}"][0] is None]
+        retried_count = len(missing)
+        if missing:
+            print(f"결과가 없는 {len(missing)}개 항목을 다시 요청합니다.")
+            retried = run_packs(pack_items(missing, -(-len(missing) // max_pack_size)), "retry")
+            for chain_key, (item_content, item_usage) in retried.items():
+                item_results[chain_key] = (item_content, sum_usage([item_results[chain_key][1], item_usage]))
+            missing = [(period, item) for period, item in missing if item_results[f"{period}_{item['key']}"][0] is None]
         end_time = datetime.now()
         execution_time = (end_time - start_time).total_seconds()
+
+        # 다시 요청해도 결과가 없는 항목은 빈 결과로 채우지 않고 오류로 반환 (묶음 수 측정에도 기록하지 않음)
+        if missing:
+            missing_keys = [f"{period}_{item['key']}" for period, item in missing]
+            print(f"결과가 없는 항목: {missing_keys}")
+            return Response({
+                'status': 'Error',
+                'message': f"{len(missing_keys)}개 항목의 사주풀이 결과를 받지 못했습니다: {', '.join(missing_keys)}"
+            }, status=502)
+
+        # 결과 정리 (기간/항목 순서 유지)
+        processed_results = {period: [] for period in items}
+        # 토큰 사용량 계산을 위한 구조
+        token_usage = {period: {} for period in items}
+        for period, item in all_items:
+            item_content, item_usage = item_results[f"{period}_{item['key']}"]
+            processed_results[period].append(item_content)
+            token_usage[period][item['key']] = item_usage
+
+        # 현재 시간 포맷팅
+        current_time = datetime.now().isoformat()
         
-        # 실행 시간 정보 추가
-        if "fortune_telling" in response:
-            response["fortune_telling"]["execution_time"] = {
-                "seconds": execution_time,
-                "formatted": f"{execution_time:.2f}초"
+        # 토큰 사용량 합계 계산
+        period_totals = {}
+        for period, usage in token_usage.items():
+            period_totals[period] = sum_usage(usage.values())
+        
+        # 총 토큰 사용량 계산
+        total_usage = sum_usage(period_totals.values())
+        
+        # 비용 계산
+        cost = estimate_token_cost(total_usage, model_name)
+
+        # 묶음 수(K)별 지연 시간과 비용을 기록하여 다음 요청의 K 선택에 사용 (다시 요청한 시간과 비용 포함)
+        record_packing_result('req_fortune_telling_parallel_by_item', len(packs), execution_time, cost["total_cost"])
+        
+        # 결과를 통합된 형식으로 변환
+        response = {
+            "fortune_telling": {
+                "user_info": user_info,
+                "results": processed_results,
+                "timestamp": current_time,
+                "token_usage": {
+                    "by_item": token_usage,
+                    "by_period": period_totals,
+                    "total": total_usage,
+                    "cost": cost
+                },
+                "packing": {
+                    "pack_count": len(packs),
+                    "packs": [[f"{period}_{item['key']}" for period, item in pack] for pack in packs],
+                    "retried": retried_count
+                },
+                "execution_time": {
+                    "seconds": execution_time,
+                    "formatted": f"{execution_time:.2f}초"
+                }
             }
+        }
         
         return Response({
             'status': 'Success',
@@ -692,7 +789,7 @@ def req_fortune_telling_combined(request, format=None):
         model_name = model.model_name if hasattr(model, 'model_name') else "claude-3-5-sonnet-20240620"
         
         # JSON 출력 파서 정의
-        parser = JsonOutputParser()
+        parser = TolerantJsonOutputParser()
         
         # 통합 사주풀이 프롬프트 (JSON 형식 지정)
         combined_format_instructions = """
@@ -833,24 +930,24 @@ def req_fortune_telling_combined(request, format=None):
         # 체인 구성
         chain = combined_prompt.pipe(model).pipe(parser)
         
+        # 실제 토큰 사용량 수집
+        usage_handler = TokenUsageCallbackHandler('req_fortune_telling_combined')
+        
         # 체인 실행
         print(f"통합 사주풀이를 시작합니다. 사용자 정보: {user_info}")
         start_time = datetime.now()
         response_content = chain.invoke({
             "user_info": user_info,
             "minimum_text_len" : minimum_text_len
-        })
+        }, config={'callbacks': [usage_handler]})
         end_time = datetime.now()
         execution_time = (end_time - start_time).total_seconds()
         
-        # 토큰 사용량 계산
-        token_usage = get_token_usage_from_response(response_content)
+        # 토큰 사용량 계산 (사용량 정보가 없으면 추정)
+        token_usage = usage_handler.total if usage_handler.calls else get_token_usage_from_response(response_content)
         
         # 비용 계산
-        cost = estimate_token_cost({
-            'input_tokens': token_usage.get('input_tokens', 0),
-            'output_tokens': token_usage.get('output_tokens', 0)
-        }, model_name)
+        cost = estimate_token_cost(token_usage, model_name)
         
         # 결과 구성
         result = {
@@ -898,7 +995,7 @@ def req_fortune_telling_parallel(request, format=None):
         model_name = model.model_name if hasattr(model, 'model_name') else "claude-3-5-sonnet-20240620"
         
         # JSON 출력 파서 정의
-        parser = JsonOutputParser()
+        parser = TolerantJsonOutputParser()
         
         # 일일 사주풀이 프롬프트 (JSON 형식 지정)
         daily_format_instructions = """
@@ -1038,6 +1135,9 @@ def req_fortune_telling_parallel(request, format=None):
         ]
         """
         
+        # 하위 체인별 실제 토큰 사용량 수집
+        usage_handler = TokenUsageCallbackHandler('req_fortune_telling_parallel')
+        
         # 각 사주풀이 유형별 프롬프트 정의
         daily_prompt = set_prompt("다음 정보를 바탕으로 오늘의 사주풀이를 해주세요. {format_instructions} 사용자 정보: {user_info}", 
                                 ["user_info"], {"format_instructions": daily_format_instructions})
@@ -1064,24 +1164,18 @@ def req_fortune_telling_parallel(request, format=None):
                 # 현재 시간 포맷팅
                 current_time = datetime.now().isoformat()
                 
-                # 토큰 사용량 계산
+                # 토큰 사용량 계산 (사용량 정보가 없으면 추정)
+                usage_by_chain = usage_handler.by_chain()
                 token_usage = {
-                    "daily": get_token_usage_from_response(result["daily"]),
-                    "weekly": get_token_usage_from_response(result["weekly"]),
-                    "monthly": get_token_usage_from_response(result["monthly"]),
-                    "yearly": get_token_usage_from_response(result["yearly"])
+                    period: usage_by_chain.get(period) or get_token_usage_from_response(result[period])
+                    for period in ("daily", "weekly", "monthly", "yearly")
                 }
                 
                 # 총 토큰 사용량 계산
-                total_input_tokens = sum(usage.get('input_tokens', 0) for usage in token_usage.values())
-                total_output_tokens = sum(usage.get('output_tokens', 0) for usage in token_usage.values())
-                total_tokens = total_input_tokens + total_output_tokens
+                total_usage = sum_usage(token_usage.values())
                 
                 # 비용 계산
-                cost = estimate_token_cost({
-                    'input_tokens': total_input_tokens,
-                    'output_tokens': total_output_tokens
-                }, model_name)
+                cost = estimate_token_cost(total_usage, model_name)
                 
                 # 결과를 통합된 형식으로 변환
                 return {
@@ -1096,11 +1190,7 @@ def req_fortune_telling_parallel(request, format=None):
                         "timestamp": current_time,
                         "token_usage": {
                             "by_request": token_usage,
-                            "total": {
-                                "input_tokens": total_input_tokens,
-                                "output_tokens": total_output_tokens,
-                                "total_tokens": total_tokens
-                            },
+                            "total": total_usage,
                             "cost": cost
                         }
                     }
@@ -1124,7 +1214,7 @@ def req_fortune_telling_parallel(request, format=None):
         start_time = datetime.now()
         response = chain.invoke({
             "user_info": user_info,
-        })
+        }, config={'callbacks': [usage_handler]})
         end_time = datetime.now()
         execution_time = (end_time - start_time).total_seconds()
         
@@ -1,6 +1,6 @@
 from django.urls import path, include
-from . import apis
-from .tests.test_apis import req_sample_chat, req_sample_answer, req_sample_analyze_image, req_sample_runnables_parallel, req_sample_runnables_sequence, req_sample_resnet_50_predict, req_fortune_telling_parallel, req_fortune_telling_parallel_by_item, req_fortune_telling_combined, req_sample_tools_with_agent, req_sample_tools_simple
+from . import apis, async_apis
+from .tests.test_apis import req_sample_chat, req_sample_answer, req_sample_analyze_image, req_sample_runnables_parallel, req_sample_runnables_sequence, req_sample_resnet_50_predict, req_sample_analyze_image_upload, req_sample_resnet_50_predict_upload, req_fortune_telling_parallel, req_fortune_telling_parallel_by_item, req_fortune_telling_combined, req_sample_tools_with_agent, req_sample_tools_simple
 
 urlpatterns = [
     # 테스트 API
@@ -10,6 +10,8 @@ urlpatterns = [
     path('req_sample_runnables_parallel', req_sample_runnables_parallel),
     path('req_sample_analyze_image', req_sample_analyze_image),
     path('req_sample_resnet_50_predict', req_sample_resnet_50_predict),
+    path('req_sample_analyze_image_upload', req_sample_analyze_image_upload),
+    path('req_sample_resnet_50_predict_upload', req_sample_resnet_50_predict_upload),
     path('req_fortune_telling_parallel', req_fortune_telling_parallel),
     path('req_fortune_telling_parallel_by_item', req_fortune_telling_parallel_by_item),
     path('req_fortune_telling_combined', req_fortune_telling_combined),
@@ -19,6 +21,27 @@ urlpatterns = [
     # 실제 API
     path('init_langchain', apis.init_langchain),
     path('req_ui_component', apis.req_ui_component),
+    path('req_ui_component_batch', apis.req_ui_component_batch),
+    path('req_ui_component_stream', apis.req_ui_component_stream),
     path('req_parse_image', apis.req_parse_image),
     path('req_analyze_image', apis.req_analyze_image),
+    path('req_parse_image_upload', apis.req_parse_image_upload),
+    path('req_analyze_image_upload', apis.req_analyze_image_upload),
+    path('req_job_submit', apis.req_job_submit),
+    path('req_job_status/<uuid:job_id>', apis.req_job_status),
+    path('req_job_result/<uuid:job_id>', apis.req_job_result),
+    path('req_cache_stats', apis.req_cache_stats),
+    path('req_usage_stats', apis.req_usage_stats),
+
+    # 비동기 API (ASGI)
+    path('async/init_langchain', async_apis.init_langchain),
+    path('async/req_ui_component', async_apis.req_ui_component),
+    path('async/req_ui_component_batch', async_apis.req_ui_component_batch),
+    path('async/req_ui_component_stream', async_apis.req_ui_component_stream),
+    path('async/req_parse_image', async_apis.req_parse_image),
+    path('async/req_analyze_image', async_apis.req_analyze_image),
+    path('async/req_parse_image_upload', async_apis.req_parse_image_upload),
+    path('async/req_analyze_image_upload', async_apis.req_analyze_image_upload),
+    path('async/req_job_status/<uuid:job_id>', async_apis.req_job_status),
+    path('async/req_job_events/<uuid:job_id>', async_apis.req_job_events),
 ]
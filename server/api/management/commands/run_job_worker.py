@@ -0,0 +1,57 @@
+import sys
+import signal
+import subprocess
+from django.core.management.base import BaseCommand
+
+from api.langchain.jobs import run_worker, default_worker_name, JOB_POLL_INTERVAL
+
+
+class Command(BaseCommand):
+    """
+    백그라운드 작업 워커 실행 (api.langchain.jobs)
+
+        python manage.py run_job_worker --processes 4
+    """
+    help = '데이터베이스 작업 큐의 작업을 실행하는 워커 프로세스를 시작합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='워커 프로세스 수 (기본값 1)')
+        parser.add_argument('--poll-interval', type=float, default=JOB_POLL_INTERVAL, help='대기 작업 확인 간격(초)')
+        parser.add_argument('--once', action='store_true', help='대기 중인 작업을 모두 실행한 뒤 종료')
+
+    def handle(self, *args, **options):
+        if options['processes'] > 1:
+            self.run_processes(options)
+            return
+
+        stopping = []
+
+        def stop(signum, frame):
+            # 실행 중인 작업은 마친 뒤 종료
+            print(f"워커 종료 요청 (signal {signum}), 실행 중인 작업을 마친 뒤 종료합니다.")
+            stopping.append(signum)
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        worker = default_worker_name()
+        print(f"작업 워커 시작: {worker}")
+        processed = run_worker(worker, options['poll_interval'], options['once'], should_stop=lambda: bool(stopping))
+        print(f"작업 워커 종료: {worker} (실행한 작업 {processed}개)")
+
+    def run_processes(self, options):
+        # 각 워커는 별도 프로세스로 실행 (모델 호출과 이미지 처리가 GIL을 나눠 쓰지 않도록)
+        command = [sys.executable, sys.argv[0], 'run_job_worker', '--poll-interval', str(options['poll_interval'])]
+        if options['once']:
+            command.append('--once')
+        processes = [subprocess.Popen(command) for _ in range(options['processes'])]
+
+        def stop(signum, frame):
+            for process in processes:
+                if process.poll() is None:
+                    process.send_signal(signal.SIGTERM)
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        for process in processes:
+            process.wait()
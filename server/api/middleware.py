@@ -0,0 +1,63 @@
+import time
+from asgiref.sync import iscoroutinefunction
+from django.urls import resolve, Resolver404
+from django.utils.decorators import sync_and_async_middleware
+
+from utils.metrics import REQUEST_LATENCY, METRICS_ENABLED, set_current_endpoint, reset_current_endpoint
+
+# 엔드포인트 레이블에서 제외할 경로 앞부분
+ENDPOINT_PREFIXES = ('api/langchain/', 'api/')
+
+
+def request_endpoint(request):
+    """
+    요청의 엔드포인트 레이블을 반환합니다. 경로 변수는 URL 패턴 그대로 두어 레이블 수가 늘어나지 않도록 합니다.
+    (예: async/req_job_events/<uuid:job_id>)
+    """
+    try:
+        route = resolve(request.path_info).route
+    except Resolver404:
+        return 'unmatched'
+    for prefix in ENDPOINT_PREFIXES:
+        if route.startswith(prefix):
+            return route[len(prefix):] or 'root'
+    return route or 'root'
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    요청별 지연 시간을 기록하고, 요청 처리 중의 단계 지표에 사용할 엔드포인트를 설정하는 미들웨어 (utils.metrics)
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not METRICS_ENABLED:
+                return await get_response(request)
+            endpoint = request_endpoint(request)
+            token = set_current_endpoint(endpoint)
+            start = time.perf_counter()
+            status = 500
+            try:
+                response = await get_response(request)
+                status = response.status_code
+                return response
+            finally:
+                REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method, status=status)
+                reset_current_endpoint(token)
+        return middleware
+
+    def middleware(request):
+        if not METRICS_ENABLED:
+            return get_response(request)
+        endpoint = request_endpoint(request)
+        token = set_current_endpoint(endpoint)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method, status=status)
+            reset_current_endpoint(token)
+    return middleware
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComponentTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('architecture_hash', models.CharField(max_length=64, unique=True)),
+                ('structure_hash', models.CharField(db_index=True, max_length=64)),
+                ('chain_version', models.CharField(max_length=20)),
+                ('architecture', models.JSONField()),
+                ('component', models.JSONField()),
+                ('shingles', models.JSONField()),
+                ('signature', models.JSONField()),
+                ('labels', models.JSONField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ComponentBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.CharField(max_length=16)),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='api.componenttemplate')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'bucket'], name='api_compone_band_72d966_idx')],
+            },
+        ),
+    ]
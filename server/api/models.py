@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 
 
@@ -12,3 +13,82 @@ class Item(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class Job(models.Model):
+    """
+    백그라운드 작업 모델 (api.langchain.jobs)
+    요청은 작업을 등록하고 바로 응답하며, run_job_worker 명령으로 실행한 워커가 작업을 가져가 실행합니다.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    FINISHED = (SUCCEEDED, FAILED)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    payload = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # 완료된 작업의 결과 보관 기한 (지나면 조회되지 않고 워커가 삭제)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} ({self.status})"
+
+
+class ComponentTemplate(models.Model):
+    """
+    생성된 컴포넌트 라이브러리 (api.langchain.component_library)
+    architecture의 구조 지문(MinHash 서명)과 함께 저장하여, 구조가 비슷한 요청은 라벨 치환이나 짧은 수정 요청으로 재사용합니다.
+    """
+    # 정규화된 architecture(id 제외)의 해시 (응답 캐시 키와 같음)
+    architecture_hash = models.CharField(max_length=64, unique=True)
+    # 텍스트 필드를 제외한 구조의 해시 (같으면 라벨 치환 대상)
+    structure_hash = models.CharField(max_length=64, db_index=True)
+    # 생성에 사용한 ui_component 체인 버전 (프롬프트가 바뀌면 이전 컴포넌트는 사용하지 않음)
+    chain_version = models.CharField(max_length=20)
+    architecture = models.JSONField()
+    component = models.JSONField()
+    shingles = models.JSONField()
+    signature = models.JSONField()
+    labels = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.architecture.get('type', '')} ({self.architecture_hash[:12]})"
+
+
+class ComponentBand(models.Model):
+    """
+    ComponentTemplate의 LSH 밴드별 버킷 (밴드와 버킷이 같은 템플릿이 유사 구조 후보)
+    """
+    template = models.ForeignKey(ComponentTemplate, on_delete=models.CASCADE, related_name='bands')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.CharField(max_length=16)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'bucket']),
+        ]
@@ -1,8 +1,40 @@
-from django.test import TestCase
+import os
+import io
+import re
+import json
+import base64
+import asyncio
+import threading
+import time
+import pickle
+import sqlite3
+import tempfile
+from unittest import mock
+from django.test import TestCase, TransactionTestCase, AsyncClient
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from .models import Item
+from .models import Item, Job, ComponentTemplate
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from utils.langchain import ResponseCache, canonicalize_architecture, hash_canonical, strip_volatile_ids, restore_volatile_ids, stream_json_fields, astream_json_fields, JsonFieldScanner, get_async_limiter, register_chain, validate_chains, get_chain, extract_usage, estimate_token_cost, TokenUsageCallbackHandler, get_endpoint_usage, set_cached_prompt, route_request, get_route_stats, MODEL_TIERS, SingleFlight, RateGovernor, RateLimitExceeded, estimate_message_tokens, get_model, get_http_client, record_route_usage, hedged_invoke, ahedged_invoke, get_hedge_stats, pack_items, record_packing_result, choose_pack_count, get_packing_stats, TolerantJsonOutputParser, get_json_repair_stats
+from langchain_core.runnables import RunnableParallel, RunnableLambda
+from langchain_core.prompts import PromptTemplate
+import numpy as np
+from PIL import Image
+from utils.llm_image import prepare_image, estimate_image_tokens
+from utils.llm_replay import ExchangeCorpus, RecordingChatModel, ReplayChatModel
+from utils.ui_tree import stitch_components, validate_stitched, merge_imports, plan_architecture, split_token_budget
+from utils.json_repair import repair_json
+from django.core.files.uploadedfile import SimpleUploadedFile
+from utils.image_store import ImageResultStore, cached_image_result, image_metadata, KIND_FEATURES
+from utils.pipeline import run_pipeline
+from utils.ui_fingerprint import architecture_shingles, architecture_labels, minhash_signature, estimate_similarity, jaccard_similarity, substitute_labels
+from langchain_core.exceptions import OutputParserException
+from api.langchain.tests.load_test import run_load_test, LatencyFakeChatModel
+from api.langchain.jobs import run_worker, requeue_stale_jobs, purge_expired_jobs, JOB_MAX_ATTEMPTS
+from datetime import timedelta
+from django.utils import timezone
 
 
 class ItemModelTests(TestCase):
@@ -55,3 +87,1357 @@ class ItemAPITests(TestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Item.objects.count(), 2)
+
+
+class ResponseCacheTests(TestCase):
+    """
+    LLM 응답 캐시 테스트
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_canonical_key_ignores_volatile_ids(self):
+        """
+        id 값만 다른 architecture는 같은 캐시 키를 가져야 함
+        """
+        first, _ = canonicalize_architecture({'newId': 'a1', 'type': 'button', 'label': '확인'})
+        second, volatile = canonicalize_architecture({'label': '확인', 'type': 'button', 'newId': 'b2'})
+        self.assertEqual(hash_canonical('ui', first), hash_canonical('ui', second))
+        self.assertEqual(volatile, {'newId': 'b2'})
+
+    def test_restore_volatile_ids(self):
+        """
+        캐시된 응답의 id가 현재 요청의 id로 치환되어야 함
+        """
+        stored = strip_volatile_ids({'new_id': 'a1', 'html': '<div id=a1></div>'}, {'newId': 'a1'})
+        restored = restore_volatile_ids(stored, {'newId': 'b2'})
+        self.assertEqual(restored, {'new_id': 'b2', 'html': '<div id=b2></div>'})
+
+    def test_disk_tier_shared_between_instances(self):
+        """
+        다른 인스턴스(워커)에서 저장한 값을 디스크 캐시에서 조회할 수 있어야 함
+        """
+        ResponseCache(path=self.path).set('key', {'html': '<div />'})
+        cache = ResponseCache(path=self.path)
+        self.assertEqual(cache.get('key'), {'html': '<div />'})
+        self.assertEqual(cache.get('key'), {'html': '<div />'})
+        self.assertIsNone(cache.get('missing'))
+        stats = cache.stats()
+        self.assertEqual((stats['disk_hits'], stats['memory_hits'], stats['misses']), (1, 1, 1))
+
+    def test_eviction_and_ttl(self):
+        """
+        크기 제한과 TTL을 넘은 항목은 제거되어야 함
+        """
+        cache = ResponseCache(path=self.path, memory_size=1, disk_size=1)
+        cache.set('old', 1)
+        cache.set('new', 2)
+        self.assertIsNone(cache.get('old'))
+        self.assertEqual(cache.get('new'), 2)
+
+        expired = ResponseCache(path=self.path, ttl=-1)
+        self.assertIsNone(expired.get('new'))
+
+
+class ChainRegistryTests(TestCase):
+    """
+    체인 레지스트리 테스트
+    """
+    def test_chain_built_once_per_model(self):
+        """
+        같은 모델에 대해서는 같은 체인 객체를 재사용해야 함
+        """
+        register_chain('test_registry', 'Hello {name} {suffix}', ['name'], {'suffix': '!'})
+        first_model = GenericFakeChatModel(messages=iter([]))
+        second_model = GenericFakeChatModel(messages=iter([]))
+        self.assertIs(get_chain('test_registry', first_model), get_chain('test_registry', first_model))
+        self.assertIsNot(get_chain('test_registry', first_model), get_chain('test_registry', second_model))
+
+    def test_cached_prompt_prefix(self):
+        """
+        앞부분은 system 블록으로 고정되고 뒷부분만 입력 변수를 받아야 하며, 최소 길이보다 짧은 앞부분에는 cache_control을 지정하지 않아야 함
+        """
+        with mock.patch('utils.langchain.PROMPT_CACHE_MIN_TOKENS', 0):
+            prompt = set_cached_prompt('규칙: {rules}', '입력: {value}', ['value'], {'rules': '{JSON}만 반환'})
+        messages = prompt.invoke({'value': '버튼'}).to_messages()
+        self.assertEqual(messages[0].content[0]['text'], '규칙: {JSON}만 반환')
+        self.assertEqual(messages[0].content[0]['cache_control'], {'type': 'ephemeral'})
+        self.assertEqual(messages[1].content, '입력: 버튼')
+
+        short = set_cached_prompt('규칙: {rules}', '입력: {value}', ['value'], {'rules': '{JSON}만 반환'})
+        self.assertNotIn('cache_control', short.invoke({'value': '버튼'}).to_messages()[0].content[0])
+        with self.assertRaises(ValueError):
+            set_cached_prompt('규칙: {value}', '입력: {value}', ['value'])
+
+    def test_cached_prompt_image_block(self):
+        """
+        image_variable로 지정한 입력은 텍스트가 아닌 image content block으로 전달되어야 함
+        """
+        prompt = set_cached_prompt('규칙', '설명해 주세요.', [], image_variable='image_url')
+        messages = prompt.invoke({'image_url': 'data:image/jpeg;base64,AAAA'}).to_messages()
+        self.assertEqual(messages[1].content[0], {'type': 'image_url', 'image_url': {'url': 'data:image/jpeg;base64,AAAA'}})
+        self.assertEqual(messages[1].content[1]['text'], '설명해 주세요.')
+
+    def test_validate_missing_variable(self):
+        """
+        템플릿 변수가 채워지지 않으면 검증에서 실패해야 함
+        """
+        register_chain('test_invalid', 'Hello {name} {missing}', ['name'])
+        try:
+            with self.assertRaises(ValueError):
+                validate_chains()
+        finally:
+            register_chain('test_invalid', 'Hello {name}', ['name'])
+
+
+class TokenUsageTests(TestCase):
+    """
+    실제 토큰 사용량 집계 테스트
+    """
+    def test_extract_usage_with_cache_tokens(self):
+        """
+        Anthropic usage의 캐시 토큰을 분리해서 추출하고 비용에 반영해야 함
+        """
+        message = AIMessage(content='{}', response_metadata={
+            'model': 'claude-3-haiku-20240307',
+            'usage': {'input_tokens': 100, 'output_tokens': 20, 'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 1000},
+        })
+        usage = extract_usage(message)
+        self.assertEqual((usage['input_tokens'], usage['cache_read_input_tokens'], usage['total_tokens']), (100, 1000, 1120))
+        self.assertFalse(usage['is_estimated'])
+        cost = estimate_token_cost(usage, usage['model_name'])
+        self.assertAlmostEqual(cost['cache_read_cost'], 1000 * 0.25 / 1000 * 0.1)
+
+    def test_handler_rolls_up_by_sub_chain(self):
+        """
+        RunnableParallel의 하위 체인별, 요청별, 엔드포인트별로 사용량을 집계해야 함
+        """
+        def model_with_usage(tokens):
+            return GenericFakeChatModel(messages=iter([AIMessage(content='{"a": 1}', usage_metadata={
+                'input_tokens': tokens, 'output_tokens': 5, 'total_tokens': tokens + 5,
+            })]))
+
+        prompt = PromptTemplate.from_template('{x}')
+        chain = RunnableParallel(
+            first=prompt.pipe(model_with_usage(10)),
+            second=prompt.pipe(model_with_usage(30)),
+        )
+        handler = TokenUsageCallbackHandler('test_usage_endpoint')
+        chain.invoke({'x': 'hi'}, config={'callbacks': [handler]})
+
+        summary = handler.summary()
+        self.assertEqual(summary['by_chain']['first']['input_tokens'], 10)
+        self.assertEqual(summary['by_chain']['second']['input_tokens'], 30)
+        self.assertEqual(summary['total']['total_tokens'], 50)
+        self.assertEqual(get_endpoint_usage()['test_usage_endpoint']['calls'], 2)
+
+
+class ModelRouterTests(TestCase):
+    """
+    모델 라우터 테스트
+    """
+    def test_route_by_size(self):
+        """
+        작은 단일 컴포넌트는 Haiku, 큰 architecture는 Sonnet으로 라우팅되어야 함
+        """
+        small = route_request('req_ui_component', {'newId': 'n1', 'type': 'button', 'label': '확인'})
+        large = route_request('req_ui_component', {'type': 'form', 'children': [{'type': 'input'}, {'type': 'button'}]})
+        self.assertEqual(small['tier'], 'haiku')
+        self.assertEqual(small['model'], MODEL_TIERS['haiku']['model'])
+        self.assertEqual(large['tier'], 'sonnet')
+        self.assertEqual(large['nodes'], 3)
+
+    def test_policy_and_override(self):
+        """
+        엔드포인트 정책의 기본 등급과 최대 토큰을 따르고 환경 변수로 등급을 고정할 수 있어야 함
+        """
+        self.assertEqual(route_request('fortune_item', prompt_tokens=5000)['tier'], 'haiku')
+        self.assertEqual(route_request('fortune_item')['max_tokens'], 1000)
+        with mock.patch.dict(os.environ, {'LANGCHAIN_ROUTE_REQ_UI_COMPONENT': 'opus'}):
+            self.assertEqual(route_request('req_ui_component', {'type': 'div'})['tier'], 'opus')
+
+    def test_route_stats(self):
+        """
+        라우트별 호출 수, 비용, 지연 시간이 기록되어야 함
+        """
+        message = AIMessage(content='{}', usage_metadata={'input_tokens': 100, 'output_tokens': 20, 'total_tokens': 120}, response_metadata={'model_name': 'claude-3-haiku-20240307'})
+        model = GenericFakeChatModel(messages=iter([message]))
+        route = {**route_request('req_ui_component', {'type': 'div'}), 'name': 'test_route:haiku'}
+        PromptTemplate.from_template('{x}').pipe(model).invoke({'x': 'hi'}, config={'callbacks': [TokenUsageCallbackHandler(None, route)]})
+
+        stats = get_route_stats()['test_route:haiku']
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['input_tokens'], 100)
+        self.assertGreater(stats['avg_cost'], 0)
+        self.assertIsNotNone(stats['p90_latency'])
+
+
+class SingleFlightTests(TestCase):
+    """
+    동일한 요청 합치기(single-flight) 테스트
+    """
+    def test_sync_coalescing(self):
+        """
+        동시에 들어온 같은 키의 동기 호출은 한 번만 실행되어야 함
+        """
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return {'html': '<div />'}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', fn))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while flight.stats()['coalesced'] < 4:
+            release.wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'html': '<div />'}] * 5)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    def test_sync_error_propagates(self):
+        """
+        실패한 호출은 다음 요청에서 다시 실행되어야 함
+        """
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do('key', lambda: (_ for _ in ()).throw(ValueError('실패')))
+        self.assertEqual(flight.do('key', lambda: 'ok'), 'ok')
+
+    async def test_async_coalescing(self):
+        """
+        같은 키의 비동기 호출은 한 번만 실행되고, 한 요청이 취소되어도 나머지는 결과를 받아야 함
+        """
+        flight = SingleFlight()
+        calls = []
+
+        async def afn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'ok'
+
+        tasks = [asyncio.ensure_future(flight.ado('key', afn)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        tasks[0].cancel()
+        results = await asyncio.gather(*tasks[1:])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['ok'] * 4)
+
+
+class RateGovernorTests(TestCase):
+    """
+    Anthropic 호출 속도 제한기 테스트
+    """
+    def test_token_bucket_limits(self):
+        """
+        RPM/TPM 버킷을 모두 통과해야 하며, 제한 시간 안에 통과할 수 없으면 바로 실패해야 함
+        """
+        governor = RateGovernor(rpm=2, tpm=1000, max_queue=10, max_wait=0.1)
+        governor.acquire(400)
+        governor.acquire(400)
+        with self.assertRaises(RateLimitExceeded):
+            governor.acquire(100)
+
+        governor = RateGovernor(rpm=100, tpm=1000, max_queue=10, max_wait=0.1)
+        governor.acquire(900)
+        with self.assertRaises(RateLimitExceeded):
+            governor.acquire(900)
+        # 실제 사용량이 추정치보다 적으면 남은 토큰을 돌려받음
+        governor.settle(900, 100)
+        governor.acquire(900)
+
+        stats = governor.stats()
+        self.assertEqual(stats['acquired'], 2)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['queue_depth'], 0)
+
+    def test_queue_full(self):
+        """
+        대기열이 가득 차면 바로 거절해야 함
+        """
+        governor = RateGovernor(rpm=60, tpm=0, max_queue=0)
+        with self.assertRaises(RateLimitExceeded):
+            governor.acquire()
+        self.assertEqual(governor.stats()['rejected'], 1)
+
+    async def test_async_fifo(self):
+        """
+        비동기 요청은 도착 순서대로 통과해야 함
+        """
+        governor = RateGovernor(rpm=600, tpm=0, max_queue=10, max_wait=5)
+        governor.requests.available = 0
+        order = []
+
+        async def call(index):
+            await governor.aacquire()
+            order.append(index)
+
+        await asyncio.gather(*(call(index) for index in range(3)))
+        self.assertEqual(order, [0, 1, 2])
+        self.assertGreater(governor.stats()['avg_wait'], 0)
+
+    def test_estimate_message_tokens(self):
+        """
+        이미지 block은 고정 추정치로 계산해야 함
+        """
+        message = HumanMessage(content=[{'type': 'image_url', 'image_url': {'url': 'data:image/jpeg;base64,' + 'A' * 30000}}, {'type': 'text', 'text': 'abcdef'}])
+        self.assertEqual(estimate_message_tokens([message]), 1600 + 2)
+
+
+class ModelPoolTests(TestCase):
+    """
+    모델 풀과 공유 HTTP 클라이언트 테스트
+    """
+    def test_pool_is_thread_safe(self):
+        """
+        여러 스레드가 동시에 요청해도 설정별로 모델은 하나만 생성되어야 함
+        """
+        created = []
+
+        def create(model_name, max_tokens, temperature=None):
+            created.append((model_name, max_tokens, temperature))
+            return object()
+
+        models = []
+        with mock.patch('utils.langchain._create_model', side_effect=create), \
+                mock.patch.dict('utils.langchain._models', clear=True):
+            threads = [threading.Thread(target=lambda: models.append(get_model('test-model', 100, 0.5))) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            other = get_model('test-model', 100, 0.0)
+        self.assertEqual(created, [('test-model', 100, 0.5), ('test-model', 100, 0.0)])
+        self.assertTrue(all(model is models[0] for model in models))
+        self.assertIsNot(other, models[0])
+
+    def test_models_share_http_client(self):
+        """
+        설정이 다른 모델도 같은 keep-alive HTTP 클라이언트를 사용해야 함
+        """
+        with mock.patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'test-key'}), \
+                mock.patch.dict('utils.langchain._models', clear=True):
+            sonnet = get_model()
+            haiku = get_model('claude-3-haiku-20240307', 1000)
+            self.assertIs(sonnet._client, haiku._client)
+            self.assertIs(sonnet._client._client, get_http_client())
+
+
+class HedgingTests(TestCase):
+    """
+    헤징 요청 테스트
+    """
+    def setUp(self):
+        self.route = {'name': f'test_hedge:{self._testMethodName}', 'policy': 'test_hedge'}
+        for _ in range(20):
+            record_route_usage(self.route['name'], {'model_name': 'claude-3-haiku-20240307'}, latency=0.02)
+        self.patches = [
+            mock.patch.dict('utils.langchain.ROUTE_POLICIES', {'test_hedge': {'hedge': True}}),
+            mock.patch('utils.langchain.HEDGE_MIN_DELAY', 0.01),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def slow_then_fast(self):
+        calls = []
+
+        def run(inputs):
+            calls.append(1)
+            if len(calls) == 1:
+                threading.Event().wait(0.5)
+                return 'slow'
+            return 'fast'
+        return RunnableLambda(run)
+
+    def test_hedge_wins(self):
+        """
+        p90 안에 응답이 없으면 헤징 요청을 보내고 먼저 끝난 결과를 사용해야 함
+        """
+        with mock.patch('utils.langchain.HEDGE_BUDGET', 1.0):
+            self.assertEqual(hedged_invoke(self.slow_then_fast(), {}, self.route), 'fast')
+        stats = get_hedge_stats()[self.route['name']]
+        self.assertEqual((stats['calls'], stats['hedged'], stats['hedge_wins']), (1, 1, 1))
+
+    def test_budget_cap(self):
+        """
+        헤징 예산을 넘으면 원래 요청만 기다려야 함
+        """
+        with mock.patch('utils.langchain.HEDGE_BUDGET', 0.0):
+            self.assertEqual(hedged_invoke(self.slow_then_fast(), {}, self.route), 'slow')
+        self.assertEqual(get_hedge_stats()[self.route['name']]['budget_skips'], 1)
+
+    async def test_async_loser_cancelled(self):
+        """
+        비동기 헤징에서는 늦은 요청을 취소해야 함
+        """
+        cancelled = []
+        calls = []
+
+        async def arun(inputs):
+            calls.append(1)
+            if len(calls) == 1:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(1)
+                    raise
+                return 'slow'
+            return 'fast'
+
+        with mock.patch('utils.langchain.HEDGE_BUDGET', 1.0):
+            result = await ahedged_invoke(RunnableLambda(lambda inputs: None, afunc=arun), {}, self.route)
+            await asyncio.sleep(0)
+        self.assertEqual(result, 'fast')
+        self.assertEqual(cancelled, [1])
+
+
+class StreamingTests(TestCase):
+    """
+    req_ui_component 스트리밍 테스트
+    """
+    def test_stream_json_fields(self):
+        """
+        필드 이벤트와 html 조각을 순서대로 전달하고 객체가 닫히면 즉시 종료해야 함
+        """
+        consumed = []
+
+        def chunks():
+            for chunk in ['{"component_name": "Login", "ht', 'ml": "<div>', '</div>", "imports": ["a"]}', ' 설명', ' 더 많은 설명']:
+                consumed.append(chunk)
+                yield chunk
+
+        events = list(stream_json_fields(chunks()))
+        self.assertEqual(events[0], ('field', {'field': 'component_name', 'value': 'Login'}))
+        self.assertEqual(''.join(data['delta'] for event, data in events if event == 'delta'), '<div></div>')
+        self.assertIn(('field', {'field': 'imports', 'value': ['a']}), events)
+        self.assertEqual(events[-1], ('done', {'component_name': 'Login', 'html': '<div></div>', 'imports': ['a']}))
+        self.assertEqual(len(consumed), 3)
+
+    async def test_stream_defers_model_fix(self):
+        """
+        스트리밍 중에는 모델 복구를 호출하지 않고, 로컬 복구로 파싱할 수 없으면 스트림이 끝난 뒤에 복구해야 함
+        """
+        consumed = []
+
+        async def chunks():
+            for chunk in ['{"new_id": "a", "html": <div />', '}', ' 설명']:
+                consumed.append(chunk)
+                yield chunk
+
+        fix_model = GenericFakeChatModel(messages=iter([AIMessage(content='{"new_id": "a", "html": "<div />"}')]))
+        with mock.patch('utils.langchain.get_model', return_value=fix_model) as get_model_mock:
+            scanner = JsonFieldScanner()
+            self.assertEqual(scanner.feed('{"new_id": "a", "html": <div />}'), [])
+            self.assertEqual(scanner.unparsed, '{"new_id": "a", "html": <div />}')
+            self.assertEqual(get_model_mock.call_count, 0)
+
+            events = [event async for event in astream_json_fields(chunks())]
+        self.assertEqual(events[-1], ('done', {'new_id': 'a', 'html': '<div />'}))
+        self.assertEqual(get_model_mock.call_count, 1)
+        self.assertEqual(len(consumed), 2)
+
+    def test_stream_endpoint(self):
+        """
+        SSE 응답으로 done 이벤트를 전달해야 함
+        """
+        model = GenericFakeChatModel(messages=iter([AIMessage(content='{"component_name": "Box", "html": "<div id=n1 />"}')]))
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.langchain.get_model', return_value=model), \
+                mock.patch('api.langchain.apis.get_response_cache', return_value=ResponseCache(path=os.path.join(tmpdir, 'cache.sqlite3'))):
+            response = APIClient().post('/api/langchain/req_ui_component_stream', {'newId': 'n1', 'type': 'div'}, format='json', HTTP_ACCEPT='text/event-stream')
+            body = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: done', body)
+        self.assertIn('"component_name": "Box"', body)
+
+
+class BatchTests(TestCase):
+    """
+    req_ui_component_batch 테스트
+    """
+    def test_batch_keeps_order_and_reports_errors(self):
+        """
+        결과는 입력 순서를 유지하고 실패한 항목만 Error로 표시되어야 함
+        """
+        model = GenericFakeChatModel(messages=iter([
+            AIMessage(content='{"new_id": "a", "html": "<div id=a />"}'),
+            AIMessage(content='JSON이 아닌 응답'),
+        ]))
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.langchain.get_model', return_value=model), \
+                mock.patch('api.langchain.apis.get_response_cache', return_value=ResponseCache(path=os.path.join(tmpdir, 'cache.sqlite3'))):
+            response = APIClient().post('/api/langchain/req_ui_component_batch', {
+                'architectures': [{'newId': 'a', 'type': 'div'}, 'invalid', {'newId': 'b', 'type': 'span'}],
+                'max_concurrency': 1,
+            }, format='json')
+        results = response.data['message']
+        self.assertEqual([result['status'] for result in results], ['Success', 'Error', 'Error'])
+        self.assertEqual(results[0]['message'], {'new_id': 'a', 'html': '<div id=a />'})
+        self.assertTrue(all('latency' in result for result in results))
+
+    def test_mixed_tier_batch_runs_concurrently(self):
+        """
+        항목마다 다른 모델로 라우팅되어도 모든 항목을 함께 실행하여 가장 느린 그룹의 시간에 가깝게 끝나야 함
+        """
+        delays = {MODEL_TIERS['haiku']['model']: 0.1, MODEL_TIERS['sonnet']['model']: 0.3}
+
+        def tier_model(model_name=None, max_tokens=None, temperature=None):
+            def answer(prompt):
+                time.sleep(delays[model_name])
+                new_id = re.search(r"'newId': '([^']+)'", prompt.to_string()).group(1)
+                return AIMessage(content=json.dumps({'new_id': new_id, 'html': f'<div id="{new_id}" />'}))
+            return RunnableLambda(answer)
+
+        small = [{'newId': f's{index}', 'type': 'button', 'label': f'확인 {index}'} for index in range(2)]
+        large = [{'newId': f'l{index}', 'type': 'form', 'children': [{'type': 'input'}, {'type': 'button', 'label': str(index)}]} for index in range(3)]
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.langchain.get_model', side_effect=tier_model), \
+                mock.patch('api.langchain.apis.get_response_cache', return_value=ResponseCache(path=os.path.join(tmpdir, 'cache.sqlite3'))):
+            start = time.perf_counter()
+            response = APIClient().post('/api/langchain/req_ui_component_batch', {'architectures': small + large, 'max_concurrency': 5}, format='json')
+            elapsed = time.perf_counter() - start
+
+        results = response.data['message']
+        self.assertEqual([result['model'] for result in results], [MODEL_TIERS['haiku']['model']] * 2 + [MODEL_TIERS['sonnet']['model']] * 3)
+        self.assertEqual([result['message']['new_id'] for result in results], ['s0', 's1', 'l0', 'l1', 'l2'])
+        # 그룹별로 차례로 실행하면 0.1 + 0.3초 이상 걸림
+        self.assertLess(elapsed, 0.38)
+
+
+class AsyncAPITests(TestCase):
+    """
+    비동기 LangChain 엔드포인트 테스트
+    """
+    async def test_async_ui_component(self):
+        """
+        ainvoke 결과를 반환하고 두 번째 요청은 캐시에서 응답해야 함
+        """
+        model = GenericFakeChatModel(messages=iter([AIMessage(content='{"new_id": "n1", "html": "<div id=n1 />"}')]))
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.langchain.get_model', return_value=model), \
+                mock.patch('api.langchain.async_apis.get_response_cache', return_value=ResponseCache(path=os.path.join(tmpdir, 'cache.sqlite3'))):
+            client = AsyncClient()
+            first = await client.post('/api/langchain/async/req_ui_component', {'newId': 'n1', 'type': 'div'}, content_type='application/json')
+            second = await client.post('/api/langchain/async/req_ui_component', {'newId': 'n2', 'type': 'div'}, content_type='application/json')
+        self.assertEqual(first.json()['message'], {'new_id': 'n1', 'html': '<div id=n1 />'})
+        self.assertEqual(second.json()['message'], {'new_id': 'n2', 'html': '<div id=n2 />'})
+
+    async def test_async_limiter(self):
+        """
+        엔드포인트별 동시 실행 수가 설정값을 넘지 않아야 함
+        """
+        running = 0
+        peak = 0
+
+        async def task():
+            nonlocal running, peak
+            async with get_async_limiter('limited'):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        with mock.patch.dict(os.environ, {'LANGCHAIN_ASYNC_CONCURRENCY_LIMITED': '2'}):
+            await asyncio.gather(*(task() for _ in range(6)))
+        self.assertEqual(peak, 2)
+
+
+class LLMImageTests(TestCase):
+    """
+    모델 입력용 이미지 전처리 테스트
+    """
+    def encode_png(self, size, mode='RGBA'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, (255, 0, 0, 128) if mode == 'RGBA' else (255, 0, 0)).save(buffer, format='PNG')
+        return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+    def test_downscale_and_recompress(self):
+        """
+        큰 이미지는 최대 크기로 축소되고 JPEG로 재압축되어야 함
+        """
+        prepared = prepare_image('data:image/png;base64,' + self.encode_png((3000, 2000)))
+        self.assertEqual(prepared['media_type'], 'image/jpeg')
+        self.assertLessEqual(max(prepared['width'], prepared['height']), 1568)
+        self.assertLessEqual(prepared['width'] * prepared['height'], 1150000)
+        self.assertTrue(prepared['data_url'].startswith('data:image/jpeg;base64,'))
+        self.assertEqual(prepared['estimated_tokens'], estimate_image_tokens(prepared['width'], prepared['height']))
+
+    def test_small_image_keeps_size(self):
+        """
+        작은 이미지는 크기를 유지해야 함
+        """
+        prepared = prepare_image(self.encode_png((200, 100), 'RGB'))
+        self.assertEqual((prepared['width'], prepared['height']), (200, 100))
+
+
+class PackingTests(TestCase):
+    """
+    사주풀이 항목 묶음(packing) 테스트
+    """
+    def test_pack_items(self):
+        """
+        항목 순서를 유지한 채 크기가 거의 같은 묶음으로 나눠야 함
+        """
+        packs = pack_items(list(range(22)), 4)
+        self.assertEqual([len(pack) for pack in packs], [6, 6, 5, 5])
+        self.assertEqual(sum(packs, []), list(range(22)))
+        self.assertEqual(len(pack_items([1, 2], 8)), 2)
+
+    def test_choose_pack_count(self):
+        """
+        표본이 부족한 후보를 먼저 측정하고, 이후 점수가 가장 낮은 K를 선택해야 함
+        """
+        name = f'test_packing:{self._testMethodName}'
+        with mock.patch('utils.langchain.PACKING_MIN_SAMPLES', 1):
+            self.assertEqual(choose_pack_count(name, (2, 4)), 2)
+            record_packing_result(name, 2, latency=3.0, cost=0.01)
+            self.assertEqual(choose_pack_count(name, (2, 4)), 4)
+            record_packing_result(name, 4, latency=1.0, cost=0.012)
+            self.assertEqual(choose_pack_count(name, (2, 4)), 4)
+        self.assertAlmostEqual(get_packing_stats(name)[4]['score'], 1.0 + 0.012 * 100)
+
+    def test_fortune_by_item_packed(self):
+        """
+        묶음 응답을 기간/항목별 결과로 다시 나눠 기존 응답 형식을 유지해야 함
+        """
+        def answer_pack(prompt):
+            # 프롬프트에 나열된 항목 키마다 결과를 채워 응답
+            keys = [line[2:].split(':')[0] for line in prompt.to_string().splitlines() if line.startswith('- ')]
+            return AIMessage(content=json.dumps({key: {'label': key, 'message': 'ok', 'key': key.split('_', 1)[1]} for key in keys}))
+
+        max_tokens = []
+
+        def pack_model(model_name=None, tokens=None, *args, **kwargs):
+            max_tokens.append(tokens)
+            return RunnableLambda(answer_pack)
+
+        with mock.patch('api.langchain.tests.test_apis.get_model', side_effect=pack_model):
+            response = APIClient().post('/api/langchain/req_fortune_telling_parallel_by_item', {'user_info': {'name': 'test'}, 'pack_count': 3}, format='json')
+
+        fortune = response.data['message']['fortune_telling']
+        # 항목별 최대 출력 토큰(1000)을 줄이지 않도록 묶음 하나에 4개 항목까지만 넣음 (22개 항목 -> 최소 6개 묶음)
+        self.assertEqual(fortune['packing']['pack_count'], 6)
+        self.assertEqual(max(len(pack) for pack in fortune['packing']['packs']), 4)
+        self.assertEqual(max(max_tokens), 4000)
+        self.assertEqual([len(fortune['results'][period]) for period in ('daily', 'weekly', 'monthly', 'yearly')], [7, 5, 5, 5])
+        self.assertEqual(fortune['results']['daily'][0]['message'], 'ok')
+
+    def test_fortune_missing_items_retried_or_reported(self):
+        """
+        묶음 응답에 빠진 항목은 다시 요청하고, 그래도 없으면 빈 결과 대신 오류를 반환하며 측정에 기록하지 않아야 함
+        """
+        requested = []
+
+        def answer_pack(prompt, drop=()):
+            keys = [line[2:].split(':')[0] for line in prompt.to_string().splitlines() if line.startswith('- ')]
+            requested.append(keys)
+            return AIMessage(content=json.dumps({key: {'label': key, 'message': 'ok', 'key': key.split('_', 1)[1]} for key in keys if key not in drop}))
+
+        # 첫 요청에서 빠진 항목은 다시 요청해서 채움
+        dropped = {'daily_money'}
+
+        def flaky(prompt):
+            if any('daily_money' in keys for keys in requested):
+                return answer_pack(prompt)
+            return answer_pack(prompt, drop=dropped)
+
+        name = 'req_fortune_telling_parallel_by_item'
+        before = get_packing_stats(name)
+        with mock.patch('api.langchain.tests.test_apis.get_model', side_effect=lambda *args, **kwargs: RunnableLambda(flaky)):
+            response = APIClient().post('/api/langchain/req_fortune_telling_parallel_by_item', {'user_info': {'name': 'test'}, 'pack_count': 6}, format='json')
+        fortune = response.data['message']['fortune_telling']
+        self.assertEqual(fortune['packing']['retried'], 1)
+        self.assertEqual(requested[-1], ['daily_money'])
+        self.assertEqual(fortune['results']['daily'][2]['message'], 'ok')
+        self.assertEqual(get_packing_stats(name)[6]['samples'], before.get(6, {}).get('samples', 0) + 1)
+
+        # 다시 요청해도 빠진 항목은 오류로 반환
+        with mock.patch('api.langchain.tests.test_apis.get_model', side_effect=lambda *args, **kwargs: RunnableLambda(lambda prompt: answer_pack(prompt, drop=dropped))):
+            response = APIClient().post('/api/langchain/req_fortune_telling_parallel_by_item', {'user_info': {'name': 'test'}, 'pack_count': 6}, format='json')
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.data['status'], 'Error')
+        self.assertIn('daily_money', response.data['message'])
+        self.assertEqual(get_packing_stats(name)[6]['samples'], before.get(6, {}).get('samples', 0) + 1)
+
+
+class LoadTestHarnessTests(TestCase):
+    """
+    오프라인 부하 테스트(가짜 채팅 모델) 테스트
+    """
+    def test_sync_endpoint(self):
+        """
+        모든 요청이 성공하고 모델 시간과 서버 오버헤드를 나눠 집계해야 함
+        """
+        result = run_load_test('req_ui_component', requests=6, concurrency=3, latency=0.02)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreaterEqual(result['model_time']['p50'], 0.02)
+        self.assertAlmostEqual(result['latency']['p50'], result['model_time']['p50'] + result['overhead']['p50'], delta=0.05)
+        self.assertGreater(result['throughput'], 0)
+
+    def test_async_stream_endpoint(self):
+        """
+        ASGI 스트리밍 엔드포인트도 AsyncClient로 측정해야 함
+        """
+        result = run_load_test('async/req_ui_component_stream', requests=4, concurrency=2, latency=0.01, tokens_per_second=1000)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreaterEqual(result['model_time']['p50'], 0.01)
+
+    def test_fortune_results_are_checked(self):
+        """
+        사주풀이는 요청한 항목 키로 응답을 만들고, 빈 항목으로 채워진 응답은 오류로 세야 함
+        """
+        result = run_load_test('req_fortune_telling_parallel_by_item', requests=2, concurrency=2)
+        self.assertEqual(result['errors'], 0)
+        result = run_load_test('req_fortune_telling_parallel', requests=2, concurrency=2)
+        self.assertEqual(result['errors'], 0)
+
+        # 빈 항목으로 채워진 응답은 Success 응답이라도 오류
+        with mock.patch.object(LatencyFakeChatModel, '_content', lambda self, messages: '[{"label": "대인관계", "message": "", "key": "relationship"}]'):
+            result = run_load_test('req_fortune_telling_parallel', requests=2, concurrency=2)
+        self.assertEqual(result['errors'], 2)
+
+
+class RecordReplayTests(TestCase):
+    """
+    모델 호출 기록/재생 테스트
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.corpus = ExchangeCorpus(path=os.path.join(self.tmpdir.name, 'corpus.sqlite3'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def record(self, *contents):
+        model = GenericFakeChatModel(messages=iter([
+            AIMessage(content=content, usage_metadata={'input_tokens': 10, 'output_tokens': 5, 'total_tokens': 15}) for content in contents
+        ]))
+        return RecordingChatModel(chat_model=model, corpus=self.corpus)
+
+    def test_replay_same_prompt(self):
+        """
+        같은 프롬프트는 기록된 응답과 토큰 사용량으로 재생되어야 함
+        """
+        recorder = self.record('{"answer": 1}', '{"answer": 2}')
+        recorder.invoke([HumanMessage(content='첫 번째')])
+        recorder.invoke([HumanMessage(content='두 번째')])
+
+        replay = ReplayChatModel(model_name='', corpus=self.corpus, speed=0)
+        message = replay.invoke([HumanMessage(content='두 번째')])
+        self.assertEqual(message.content, '{"answer": 2}')
+        self.assertEqual(message.usage_metadata['output_tokens'], 5)
+
+    def test_replay_unknown_prompt_is_deterministic(self):
+        """
+        기록이 없는 프롬프트도 기록 중 하나를 항상 같게 골라 재생해야 함
+        """
+        recorder = self.record('a', 'b', 'c')
+        for index in range(3):
+            recorder.invoke([HumanMessage(content=f'요청 {index}')])
+
+        replay = ReplayChatModel(model_name='', corpus=self.corpus, speed=0)
+        first = replay.invoke([HumanMessage(content='새 요청')]).content
+        self.assertIn(first, ('a', 'b', 'c'))
+        self.assertEqual(replay.invoke([HumanMessage(content='새 요청')]).content, first)
+
+    def test_stream_record_and_replay(self):
+        """
+        스트리밍 호출도 기록되고 재생 시 같은 텍스트로 나눠 전달되어야 함
+        """
+        recorder = self.record('스트리밍 응답 텍스트')
+        self.assertEqual(''.join(chunk.content for chunk in recorder.stream([HumanMessage(content='스트림')])), '스트리밍 응답 텍스트')
+        self.assertIsNotNone(self.corpus.entries()[0]['first_token_latency'])
+
+        replay = ReplayChatModel(model_name='', corpus=self.corpus, speed=0)
+        self.assertEqual(''.join(chunk.content for chunk in replay.stream([HumanMessage(content='스트림')])), '스트리밍 응답 텍스트')
+
+    def test_repeated_prompt_replays_all_records(self):
+        """
+        같은 프롬프트의 기록이 여러 개면 반복 호출할 때 모든 기록(지연 시간 분포)을 차례로 재생해야 함
+        """
+        recorder = self.record('a', 'b', 'c')
+        for _ in range(3):
+            recorder.invoke([HumanMessage(content='같은 요청')])
+
+        replay = ReplayChatModel(model_name='', corpus=self.corpus, speed=0)
+        contents = [replay.invoke([HumanMessage(content='같은 요청')]).content for _ in range(6)]
+        self.assertEqual(sorted(contents[:3]), ['a', 'b', 'c'])
+        self.assertEqual(contents[3:], contents[:3])
+
+    def test_closed_stream_is_not_recorded(self):
+        """
+        소비자가 중간에 닫은 스트림은 일부 응답이 완료된 호출로 재생되지 않도록 기록하지 않아야 함
+        """
+        recorder = self.record('스트리밍 응답 텍스트')
+        stream = recorder.stream([HumanMessage(content='스트림')])
+        next(stream)
+        stream.close()
+        self.assertEqual(self.corpus.entries(), [])
+
+    def test_image_data_is_hashed(self):
+        """
+        이미지 데이터는 코퍼스에 해시로만 저장되어야 함
+        """
+        recorder = self.record('ok')
+        recorder.invoke([HumanMessage(content=[{'type': 'image_url', 'image_url': {'url': 'data:image/png;base64,' + 'A' * 1000}}, {'type': 'text', 'text': '설명'}])])
+        with self.corpus._connect() as conn:
+            size = conn.execute('SELECT length(prompt) FROM exchanges').fetchone()[0]
+        self.assertLess(size, 200)
+
+
+class IncrementalGenerationTests(TransactionTestCase):
+    """
+    하위 트리 증분 생성 테스트
+    (하위 트리를 작업 스레드에서 생성하며 컴포넌트 라이브러리에 저장하므로, 테스트 트랜잭션이 테이블을 잠그지 않도록 TransactionTestCase 사용)
+    """
+    def test_stitch_keeps_fragments_scoped(self):
+        """
+        하위 트리는 하위 컴포넌트로 선언하여 같은 이름의 상태, 같은 이름의 속성과 텍스트를 바꾸지 않고 import는 모듈별로 합쳐야 함
+        """
+        fragment = {
+            'html': '<label id="ID">value <input value={value} onChange={(e) => setValue(e.target.value)} /></label>',
+            'functions': ["const [value, setValue] = useState('');"],
+            'imports': ["import React, { useState } from 'react';"],
+            'styles': {'input': {'width': '100%'}},
+        }
+        fragments = [{**fragment, 'new_id': new_id, 'html': fragment['html'].replace('ID', new_id)} for new_id in ('a', 'b')]
+        component = stitch_components({'type': 'login form'}, 'root', fragments)
+        self.assertEqual(validate_stitched(component, fragments), [])
+        self.assertEqual(component['component_name'], 'LoginForm')
+        self.assertEqual(component['html'], '<div id="root">\n  <LoginFormPart1 />\n  <LoginFormPart2 />\n</div>')
+        for name, fragment in zip(('LoginFormPart1', 'LoginFormPart2'), fragments):
+            definition = next(code for code in component['functions'] if code.startswith(f'const {name} = () => {{'))
+            self.assertIn(fragment['html'], definition)
+            self.assertIn("const [value, setValue] = useState('');", definition)
+            self.assertIn('const styles = {"input": {"width": "100%"}};', definition)
+        self.assertNotIn('value_1', json.dumps(component))
+        self.assertEqual(component['imports'], ["import React, { useState } from 'react';"])
+        self.assertEqual(merge_imports(["import React, { useState } from 'react';", "import { useEffect } from 'react';"]), ["import React, { useState, useEffect } from 'react';"])
+
+    def test_edit_regenerates_changed_subtree(self):
+        """
+        하위 노드 하나만 수정하면 그 하위 트리만 다시 생성해야 함
+        """
+        calls = []
+
+        def answer(prompt):
+            new_id = re.search(r"'newId': '([^']+)'", prompt.to_string()).group(1)
+            calls.append(new_id)
+            return AIMessage(content=json.dumps({'new_id': new_id, 'html': f'<div id="{new_id}" />', 'functions': [], 'imports': []}))
+
+        children = [{'type': 'button', 'label': '확인'}, {'type': 'input', 'label': '이름'}, {'type': 'span', 'label': '안내'}]
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.ui_tree.INCREMENTAL_ENABLED', True), \
+                mock.patch('api.langchain.component_library.LIBRARY_ENABLED', False), \
+                mock.patch('utils.langchain.get_model', return_value=RunnableLambda(answer)), \
+                mock.patch('api.langchain.apis.get_response_cache', return_value=ResponseCache(path=os.path.join(tmpdir, 'cache.sqlite3'))):
+            client = APIClient()
+            first = client.post('/api/langchain/req_ui_component', {'id': 'page', 'newId': 'p1', 'type': 'div', 'child': children}, format='json')
+            edited = [children[0], {'type': 'input', 'label': '이메일'}, children[2]]
+            second = client.post('/api/langchain/req_ui_component', {'id': 'page', 'newId': 'p2', 'type': 'div', 'child': edited}, format='json')
+            # 트리 id가 없으면(newId만 있으면) 나누지 않고 한 번에 생성
+            whole = client.post('/api/langchain/req_ui_component', {'newId': 'p3', 'type': 'div', 'child': children}, format='json')
+
+        self.assertEqual(sorted(calls[:3]) + calls[3:], ['p1-0', 'p1-1', 'p1-2', 'p2-1', 'p3'])
+        self.assertEqual(second.data['incremental'], {'units': 3, 'regenerated': 1, 'reused': 2, 'added': 1, 'removed': 1, 'unchanged': 2})
+        message = second.data['message']
+        self.assertEqual(message['html'], '<div id="p2">\n  <DivPart1 />\n  <DivPart2 />\n  <DivPart3 />\n</div>')
+        self.assertEqual([f'id="p2-{index}"' in code for index, code in enumerate(message['functions'])], [True, True, True])
+        self.assertEqual(first.data['incremental']['regenerated'], 3)
+        self.assertNotIn('incremental', whole.data)
+
+    def test_split_budget_follows_model(self):
+        """
+        토큰 예산은 모델의 최대 출력 토큰 수로 정하고, 예산 안의 페이지는 나누지 않아야 함
+        """
+        self.assertEqual(split_token_budget(MODEL_TIERS['sonnet']['max_tokens']), MODEL_TIERS['sonnet']['max_tokens'] // 2)
+        page = {'newId': 'page', 'type': 'page', 'child': [{'type': 'input', 'label': f'항목 {index}', 'description': '설명 ' * 20} for index in range(10)]}
+        self.assertEqual(plan_architecture(page, split_token_budget(MODEL_TIERS['sonnet']['max_tokens'])), {'unit': page})
+        self.assertIn('children', plan_architecture(page, 100))
+
+    def test_large_architecture_split_in_parallel(self):
+        """
+        토큰 예산을 넘는 하위 트리는 다시 나누고 모든 하위 트리를 동시에 생성해야 함
+        """
+        running = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def answer(prompt):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            threading.Event().wait(0.05)
+            with lock:
+                running -= 1
+            new_id = re.search(r"'newId': '([^']+)'", prompt.to_string()).group(1)
+            return AIMessage(content=json.dumps({'new_id': new_id, 'html': f'<p id="{new_id}" />', 'functions': ["const [value, setValue] = useState('');"], 'imports': ["import React, { useState } from 'react';"]}))
+
+        section = {'type': 'section', 'tag': 'section', 'child': [{'type': 'input', 'label': f'항목 {index}', 'description': '설명 ' * 20} for index in range(3)]}
+        architecture = {'newId': 'page', 'type': 'page', 'child': [section, {'type': 'button', 'label': '저장'}]}
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.ui_tree.SPLIT_TOKEN_BUDGET', 100), \
+                mock.patch('utils.langchain.get_model', return_value=RunnableLambda(answer)), \
+                mock.patch('api.langchain.apis.get_response_cache', return_value=ResponseCache(path=os.path.join(tmpdir, 'cache.sqlite3'))):
+            response = APIClient().post('/api/langchain/req_ui_component', architecture, format='json')
+
+        message = response.data['message']
+        self.assertEqual(response.data['incremental']['units'], 4)
+        self.assertGreater(peak, 1)
+        code = '\n'.join(message['functions'])
+        self.assertIn('<section id="page-0">', code)
+        self.assertEqual([f'page-0-{index}' in code for index in range(3)] + ['page-1' in code], [True] * 4)
+        self.assertEqual(message['imports'], ["import React, { useState } from 'react';"])
+        self.assertEqual(code.count("const [value, setValue] = useState('');"), 4)
+
+
+class JsonRepairTests(TestCase):
+    """
+    JSON 복구 파서 테스트
+    """
+    def test_repair_common_errors(self):
+        """
+        문자열 안의 줄바꿈/따옴표, 앞뒤 설명 문장, 작은따옴표 키, 마지막 쉼표를 한 번에 고쳐야 함
+        """
+        text = "Here is the component:\n{'new_id': 'a', \"html\": \"<div id=\"a\">\n  hi\n</div>\",}\nLet me know!"
+        value, categories = repair_json(text)
+        self.assertEqual(value, {'new_id': 'a', 'html': '<div id="a">\n  hi\n</div>'})
+        self.assertEqual(
+            set(categories),
+            {'leading_text', 'single_quote', 'unescaped_quote', 'control_character', 'trailing_comma', 'trailing_text'}
+        )
+        with self.assertRaises(ValueError):
+            repair_json('JSON이 아닌 응답')
+
+    def test_parser_falls_back_to_fix_request(self):
+        """
+        고칠 수 없는 응답만 작은 모델에 JSON 고치기를 요청하고, JSON이 없는 응답은 요청 없이 실패해야 함
+        """
+        parser = TolerantJsonOutputParser()
+        before = get_json_repair_stats()
+        self.assertEqual(parser.parse('{"new_id": "a",\n"html": "<p>\n</p>"}'), {'new_id': 'a', 'html': '<p>\n</p>'})
+
+        fix_model = GenericFakeChatModel(messages=iter([AIMessage(content='{"new_id": "a", "html": "<div />"}')]))
+        with mock.patch('utils.langchain.get_model', return_value=fix_model) as get_model_mock:
+            self.assertEqual(parser.parse('{"new_id": "a", "html": <div />}'), {'new_id': 'a', 'html': '<div />'})
+            with self.assertRaises(OutputParserException):
+                parser.parse('JSON이 아닌 응답')
+        self.assertEqual(get_model_mock.call_count, 1)
+
+        after = get_json_repair_stats()
+        self.assertEqual(after['repaired'] - before['repaired'], 1)
+        self.assertEqual(after['categories']['control_character'] - before['categories'].get('control_character', 0), 1)
+        self.assertEqual(after['fixed_by_model'] - before['fixed_by_model'], 1)
+        self.assertEqual(after['failed'] - before['failed'], 1)
+
+
+class ImageUploadTests(TestCase):
+    """
+    바이너리/multipart 이미지 업로드 엔드포인트 테스트
+    """
+    def png_bytes(self, size=(200, 100)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (0, 128, 255)).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def test_raw_and_multipart_upload(self):
+        """
+        이미지 바이트 본문과 multipart 업로드 모두 JSON 경로와 같은 응답을 반환해야 함
+        """
+        data = self.png_bytes()
+        model = GenericFakeChatModel(messages=iter([
+            AIMessage(content='{"components": ["raw"]}'),
+            AIMessage(content='{"components": ["multipart"]}'),
+        ]))
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.langchain.get_model', return_value=model), \
+                mock.patch('utils.image_upload.IMAGE_UPLOAD_CHUNK_BYTES', 256), \
+                mock.patch('api.langchain.apis.get_image_store', return_value=ImageResultStore(path=os.path.join(tmpdir, 'store.sqlite3'))):
+            # 여러 조각으로 나눠 읽은 본문도 같은 이미지여야 함
+            raw = APIClient().post('/api/langchain/req_parse_image_upload', data, content_type='image/png', HTTP_X_FILENAME='raw.png')
+            multipart = APIClient().post('/api/langchain/req_analyze_image_upload', {
+                'image': SimpleUploadedFile('page.png', data, content_type='image/png'),
+            }, format='multipart')
+
+        self.assertEqual(raw.status_code, 200)
+        self.assertEqual(raw.data['message'], {'components': ['raw']})
+        self.assertEqual(raw.data['upload'], {'filename': 'raw.png', 'content_type': 'image/png', 'size': len(data)})
+        self.assertEqual((raw.data['image']['width'], raw.data['image']['height']), (200, 100))
+        self.assertEqual(multipart.status_code, 200)
+        self.assertEqual(multipart.data['message'], {'components': ['multipart']})
+        self.assertEqual(multipart.data['upload']['filename'], 'page.png')
+
+    def test_upload_errors(self):
+        """
+        지원하지 않는 Content-Type은 415, 최대 크기를 넘는 본문은 413을 반환해야 함
+        """
+        response = APIClient().post('/api/langchain/req_parse_image_upload', b'hello', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+        with mock.patch('utils.image_upload.IMAGE_UPLOAD_MAX_BYTES', 10), \
+                mock.patch('utils.image_upload.IMAGE_UPLOAD_CHUNK_BYTES', 4):
+            response = APIClient().post('/api/langchain/req_parse_image_upload', self.png_bytes(), content_type='image/png')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.data['status'], 'Error')
+
+
+class ImageStoreTests(TestCase):
+    """
+    이미지 결과 저장소 테스트
+    """
+    def png_bytes(self, color=(0, 128, 255)):
+        buffer = io.BytesIO()
+        Image.new('RGB', (120, 80), color).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def test_tiers_and_size_eviction(self):
+        """
+        메모리/디스크 모두 크기 기준으로 오래된 항목부터 제거하고, 다른 워커(인스턴스)는 디스크에서 찾아야 함
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'store.sqlite3')
+            store = ImageResultStore(path=path, memory_bytes=2500, disk_bytes=2500)
+            for index in range(3):
+                store.set(f'digest-{index}', 'pipeline', 'x' * 1000)
+            stats = store.stats()
+            self.assertEqual(stats['memory_entries'], 2)
+            self.assertEqual(stats['disk']['pipeline']['entries'], 2)
+            self.assertIsNone(store.get('digest-0', 'pipeline'))
+
+            other = ImageResultStore(path=path)
+            self.assertEqual(other.get('digest-2', 'pipeline'), 'x' * 1000)
+            self.assertIsNone(other.get('digest-2', 'pipeline', version='2'))
+            self.assertEqual(other.stats()['disk_hits'], 1)
+
+    def test_values_stored_without_pickle(self):
+        """
+        특징 배열은 np.save 형식, 결과는 JSON으로 저장하고 pickle로 저장된 값은 읽지 않아야 함
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'store.sqlite3')
+            store = ImageResultStore(path=path)
+            features = np.arange(12, dtype=np.float32).reshape(1, 2, 2, 3)
+            store.set('digest', 'resnet50_backbone', features, kind=KIND_FEATURES)
+            store.set('digest', 'resnet50_predict', [('n1', 'button', np.float32(0.5))])
+
+            other = ImageResultStore(path=path)
+            loaded = other.get('digest', 'resnet50_backbone', kind=KIND_FEATURES)
+            self.assertEqual((loaded.dtype, loaded.shape), (features.dtype, features.shape))
+            self.assertTrue(np.array_equal(loaded, features))
+            self.assertEqual(other.get('digest', 'resnet50_predict'), [['n1', 'button', 0.5]])
+
+            with sqlite3.connect(path) as conn:
+                conn.execute('UPDATE image_store SET value = ?', (pickle.dumps({'unsafe': True}),))
+            self.assertIsNone(ImageResultStore(path=path).get('digest', 'resnet50_predict'))
+
+    def test_base64_and_bytes_share_results(self):
+        """
+        같은 이미지는 base64로 받든 바이트로 받든 같은 결과를 사용하고, 저장하지 않을 결과는 다시 계산해야 함
+        """
+        data = self.png_bytes()
+        calls = []
+
+        def compute(image):
+            calls.append(image)
+            return {'size': len(calls)}
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.image_store._image_store', ImageResultStore(path=os.path.join(tmpdir, 'store.sqlite3'))):
+            first = cached_image_result('pipeline', 'data:image/png;base64,' + base64.b64encode(data).decode('ascii'), compute)
+            second = cached_image_result('pipeline', data, compute)
+            self.assertEqual((first, second), (({'size': 1}, False), ({'size': 1}, True)))
+
+            cached_image_result('errors', data, compute, cacheable=lambda result: False)
+            self.assertFalse(cached_image_result('errors', data, compute, cacheable=lambda result: False)[1])
+            self.assertEqual(len(calls), 3)
+            self.assertEqual(image_metadata(data), {'width': 120, 'height': 80, 'format': 'PNG', 'mode': 'RGB', 'bytes': len(data)})
+
+    def test_image_endpoint_reuses_result(self):
+        """
+        JSON으로 분석한 이미지를 다시 업로드하면 모델을 호출하지 않고 저장된 결과를 반환해야 함
+        """
+        data = self.png_bytes((10, 20, 30))
+        model = GenericFakeChatModel(messages=iter([AIMessage(content='{"purpose": "login"}')]))
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.langchain.get_model', return_value=model), \
+                mock.patch('api.langchain.apis.get_image_store', return_value=ImageResultStore(path=os.path.join(tmpdir, 'store.sqlite3'))):
+            first = APIClient().post('/api/langchain/req_analyze_image', {
+                'base64Data': 'data:image/png;base64,' + base64.b64encode(data).decode('ascii'),
+            }, format='json')
+            second = APIClient().post('/api/langchain/req_analyze_image_upload', data, content_type='image/png')
+
+        self.assertEqual((first.data['cached'], second.data['cached']), (False, True))
+        self.assertEqual(second.data['message'], {'purpose': 'login'})
+        self.assertEqual(second.data['image'], first.data['image'])
+
+
+class ScreenshotPipelineTests(TestCase):
+    """
+    스크린샷 3단계 파이프라인(DAG) 테스트
+    """
+    def stage_model(self, delay, fail=None, text_delay=None):
+        def answer(prompt):
+            text = prompt.to_string()
+            if 'OCR' in text:
+                time.sleep(delay if text_delay is None else text_delay)
+                if fail == 'text':
+                    raise RuntimeError('텍스트 추출 실패')
+                return AIMessage(content='{"extracted_text": ["로그인", "비밀번호"]}')
+            time.sleep(delay)
+            if 'Service Purpose' in text:
+                return AIMessage(content=json.dumps({'components': [{'role': 'login', 'tag': 'form', 'label': text.count('로그인')}]}))
+            return AIMessage(content='{"service_purpose": "login page"}')
+        return RunnableLambda(answer)
+
+    def post(self, model):
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 60), (255, 255, 255)).save(buffer, format='PNG')
+        with mock.patch('api.langchain.tests.test_apis.get_langchain_model', return_value=model):
+            return APIClient().post('/api/langchain/req_sample_runnables_sequence', {
+                'base64Data': 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii'),
+            }, format='json')
+
+    def test_independent_stages_run_in_parallel(self):
+        """
+        텍스트 추출과 화면 설명은 동시에 실행되고, 구성 단계는 먼저 끝난 텍스트 추출 결과를 받아야 함
+        """
+        response = self.post(self.stage_model(0.2, text_delay=0.1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'Success')
+        self.assertEqual(response.data['message']['construct']['components'][0]['label'], 1)
+        stages = response.data['stages']
+        self.assertLess(stages['description']['started'], stages['text_extraction']['finished'])
+        self.assertGreaterEqual(stages['construct']['started'], stages['description']['finished'])
+        timings = response.data['timings']
+        self.assertLess(timings['elapsed'], timings['sequential'] * 0.8)
+
+    def test_construct_does_not_wait_for_text_extraction(self):
+        """
+        구성 단계는 화면 설명이 끝나면 바로 시작하고, 아직 끝나지 않은 텍스트 추출 결과는 None으로 받아야 함
+        """
+        response = self.post(self.stage_model(0.1, text_delay=0.5))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'Success')
+        self.assertEqual(response.data['message']['construct']['components'][0]['label'], 0)
+        stages = response.data['stages']
+        self.assertLess(stages['construct']['started'], stages['text_extraction']['finished'])
+
+        result = run_pipeline({
+            'slow': {'run': lambda inputs: time.sleep(0.2) or 'slow'},
+            'a': {'run': lambda inputs: 'a'},
+            'b': {'run': lambda inputs: (inputs['a'], inputs['slow']), 'requires': ['a'], 'optional': ['slow']},
+        })
+        self.assertEqual(result['stages']['b']['result'], ('a', None))
+        self.assertLess(result['stages']['b']['started'], result['stages']['slow']['finished'])
+
+    def test_failed_stage_keeps_other_results(self):
+        """
+        선택 선행 단계가 실패해도 나머지 단계는 실행되고, 필수 선행 단계가 실패한 단계만 건너뛰어야 함
+        """
+        response = self.post(self.stage_model(0.0, fail='text'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'Error')
+        self.assertEqual(response.data['stages']['text_extraction']['status'], 'Error')
+        self.assertEqual(response.data['message']['description'], {'service_purpose': 'login page'})
+        self.assertEqual(response.data['message']['construct']['components'][0]['label'], 0)
+
+        result = run_pipeline({
+            'a': {'run': lambda inputs: 1 / 0},
+            'b': {'run': lambda inputs: inputs['a'], 'requires': ['a']},
+            'c': {'run': lambda inputs: inputs['value'] + 1},
+        }, {'value': 1})
+        self.assertEqual([result['stages'][name]['status'] for name in 'abc'], ['Error', 'Skipped', 'Success'])
+        self.assertEqual(result['stages']['c']['result'], 2)
+        with self.assertRaises(ValueError):
+            run_pipeline({'a': {'run': len, 'requires': ['b']}, 'b': {'run': len, 'requires': ['a']}})
+
+
+class JobQueueTests(TestCase):
+    """
+    백그라운드 작업 큐 테스트
+    """
+    def run_worker_once(self):
+        # TestCase 트랜잭션 안에서는 연결을 닫지 않도록 close_old_connections 제외
+        with mock.patch('api.langchain.jobs.close_old_connections'):
+            return run_worker('test-worker', once=True)
+
+    def test_submit_and_fetch_result(self):
+        """
+        등록한 작업은 워커가 실행하기 전까지 202, 실행 후에는 결과를 반환하고 실패한 작업은 오류를 반환해야 함
+        """
+        model = GenericFakeChatModel(messages=iter([AIMessage(content='{"new_id": "n1", "html": "<div id=n1 />"}')]))
+        client = APIClient()
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.langchain.get_model', return_value=model), \
+                mock.patch('api.langchain.apis.get_response_cache', return_value=ResponseCache(path=os.path.join(tmpdir, 'cache.sqlite3'))), \
+                mock.patch('api.langchain.apis.get_image_store', return_value=ImageResultStore(path=os.path.join(tmpdir, 'store.sqlite3'))):
+            submitted = client.post('/api/langchain/req_job_submit', {'kind': 'ui_component', 'payload': {'newId': 'n1', 'type': 'div'}}, format='json')
+            broken = client.post('/api/langchain/req_job_submit', {'kind': 'parse_image', 'payload': {'base64Data': 'not-an-image'}}, format='json')
+            job_id = submitted.data['message']['job_id']
+            pending = client.get(f'/api/langchain/req_job_result/{job_id}')
+            # 동기 엔드포인트는 wait를 짧게 제한하여 WSGI 워커를 오래 점유하지 않아야 함
+            with mock.patch('api.langchain.jobs.JOB_SYNC_WAIT_MAX', 0.1), mock.patch('api.langchain.jobs.JOB_POLL_INTERVAL', 0.02):
+                started = time.monotonic()
+                waited = client.get(f'/api/langchain/req_job_status/{job_id}?wait=30')
+            self.assertLess(time.monotonic() - started, 5)
+            self.assertEqual(waited.data['message']['status'], Job.QUEUED)
+            self.assertEqual(self.run_worker_once(), 2)
+
+        self.assertEqual(submitted.status_code, 202)
+        self.assertEqual(pending.status_code, 202)
+        self.assertEqual(client.post('/api/langchain/req_job_submit', {'kind': 'unknown', 'payload': {}}, format='json').status_code, 400)
+        self.assertEqual(client.post('/api/langchain/req_job_submit', {'kind': 'ui_component', 'payload': 'not json'}, format='json').status_code, 400)
+        self.assertEqual(client.post('/api/langchain/req_job_submit', {'kind': 'ui_component', 'payload': '[1, 2]'}, format='json').status_code, 400)
+        stringified = client.post('/api/langchain/req_job_submit', {'kind': 'ui_component', 'payload': json.dumps({'newId': 'n2', 'type': 'div'})}, format='json')
+        self.assertEqual(stringified.status_code, 202)
+        self.assertEqual(Job.objects.get(pk=stringified.data['message']['job_id']).payload, {'newId': 'n2', 'type': 'div'})
+
+        status_response = client.get(f'/api/langchain/req_job_status/{job_id}?wait=1')
+        self.assertEqual(status_response.data['message']['status'], Job.SUCCEEDED)
+        result = client.get(f'/api/langchain/req_job_result/{job_id}')
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.data['message']['result']['message'], {'new_id': 'n1', 'html': '<div id=n1 />'})
+
+        failed = client.get(f"/api/langchain/req_job_result/{broken.data['message']['job_id']}")
+        self.assertEqual(failed.status_code, 500)
+        self.assertIn('이미지', failed.data['message']['error'])
+
+    def test_expired_and_stale_jobs(self):
+        """
+        보관 기한이 지난 작업은 조회되지 않고 삭제되어야 하며, 리스가 만료된 작업은 다시 대기열에 들어가야 함
+        """
+        now = timezone.now()
+        expired = Job.objects.create(kind='ui_component', status=Job.SUCCEEDED, result={}, finished_at=now, expires_at=now - timedelta(seconds=1))
+        stale = Job.objects.create(kind='ui_component', status=Job.RUNNING, attempts=1, worker='gone', started_at=now - timedelta(days=1))
+        exhausted = Job.objects.create(kind='ui_component', status=Job.RUNNING, attempts=JOB_MAX_ATTEMPTS, worker='gone', started_at=now - timedelta(days=1))
+
+        self.assertEqual(APIClient().get(f'/api/langchain/req_job_result/{expired.id}').status_code, 404)
+        self.assertEqual(purge_expired_jobs(), 1)
+        self.assertEqual(requeue_stale_jobs(), 2)
+        stale.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual((stale.status, stale.worker), (Job.QUEUED, ''))
+        self.assertEqual(exhausted.status, Job.FAILED)
+
+    async def test_job_events(self):
+        """
+        SSE는 완료된 작업의 결과를 done 이벤트로 전달하고 종료해야 함
+        """
+        job = await Job.objects.acreate(kind='ui_component', status=Job.SUCCEEDED, result={'message': 'ok'}, finished_at=timezone.now())
+        response = await AsyncClient().get(f'/api/langchain/async/req_job_events/{job.id}')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        self.assertTrue(body.startswith('event: done\n'))
+        self.assertIn('"result": {"message": "ok"}', body)
+
+
+class ComponentLibraryTests(TestCase):
+    """
+    컴포넌트 라이브러리(구조 지문 조회) 테스트
+    """
+    def test_fingerprint_and_substitution(self):
+        """
+        라벨만 다른 구조는 같은 지문이 되고, 라벨은 컴포넌트에 그대로 들어 있을 때만 치환해야 함
+        """
+        form = {'type': 'form', 'child': [{'type': 'input', 'label': '이름'}, {'type': 'button', 'label': '저장'}]}
+        relabeled = {'type': 'form', 'child': [{'type': 'input', 'label': '이메일'}, {'type': 'button', 'label': '전송'}]}
+        extended = {'type': 'form', 'child': [{'type': 'input', 'label': '이름'}, {'type': 'input', 'label': '전화'}, {'type': 'button', 'label': '저장'}]}
+
+        self.assertEqual(architecture_shingles(form), architecture_shingles(relabeled))
+        self.assertEqual(estimate_similarity(minhash_signature(architecture_shingles(form)), minhash_signature(architecture_shingles(relabeled))), 1.0)
+        self.assertLess(jaccard_similarity(architecture_shingles(form), architecture_shingles(extended)), 1.0)
+        self.assertGreater(jaccard_similarity(architecture_shingles(form), architecture_shingles(extended)), 0.5)
+
+        component = {'html': '<form><label>이름</label><input /><button>저장</button></form>', 'functions': []}
+        substituted = substitute_labels(component, architecture_labels(form), architecture_labels(relabeled))
+        self.assertEqual(substituted['html'], '<form><label>이메일</label><input /><button>전송</button></form>')
+        self.assertIsNone(substitute_labels({'html': '<form />'}, architecture_labels(form), architecture_labels(relabeled)))
+
+        # 식별자, 속성 이름, id/className 값은 그대로 두고 텍스트와 문자열 속성 값만 치환
+        email = {'type': 'form', 'child': [{'type': 'input', 'label': 'Email'}]}
+        phone = {'type': 'form', 'child': [{'type': 'input', 'label': 'Phone'}]}
+        component = {
+            'html': '<form><input id="Email" className="Email" placeholder="Email" value={Email} onChange={(e) => setEmail(e.target.value)} /><span>Email</span></form>',
+            'functions': ["const [Email, setEmail] = useState('');"],
+        }
+        substituted = substitute_labels(component, architecture_labels(email), architecture_labels(phone))
+        self.assertIsNone(substituted)
+        component['html'] = component['html'].replace('value={Email}', 'value={email}')
+        substituted = substitute_labels(component, architecture_labels(email), architecture_labels(phone))
+        self.assertEqual(substituted['html'], '<form><input id="Email" className="Email" placeholder="Phone" value={email} onChange={(e) => setEmail(e.target.value)} /><span>Phone</span></form>')
+        self.assertEqual(substituted['functions'], component['functions'])
+
+    def test_reuse_library_component(self):
+        """
+        라벨만 다른 요청은 모델 호출 없이 치환하고, 구조가 비슷한 요청은 수정 체인으로 생성해야 함
+        """
+        calls = []
+
+        def answer(prompt):
+            text = prompt.to_string()
+            new_id = re.search(r"'newId': '([^']+)'", text).group(1)
+            label = re.findall(r"'label': '([^']+)'", text)[-1]
+            calls.append('edit' if 'Reference Component' in text else 'generate')
+            return AIMessage(content=json.dumps({'new_id': new_id, 'html': f'<button id="{new_id}">{label}</button>', 'functions': [], 'imports': []}, ensure_ascii=False))
+
+        def button(new_id, label, color='red'):
+            return {'newId': new_id, 'type': 'button', 'label': label, 'attributes': {'type': 'submit', 'disabled': False},
+                    'style': {'color': color, 'width': '100%', 'height': '40px'}}
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.langchain.get_model', return_value=RunnableLambda(answer)), \
+                mock.patch('api.langchain.apis.get_response_cache', return_value=ResponseCache(path=os.path.join(tmpdir, 'cache.sqlite3'))):
+            client = APIClient()
+            client.post('/api/langchain/req_ui_component', button('b1', '저장'), format='json')
+            relabeled = client.post('/api/langchain/req_ui_component', button('b2', '취소'), format='json')
+            edited = client.post('/api/langchain/req_ui_component', button('b3', '삭제', color='blue'), format='json')
+
+        self.assertEqual(calls, ['generate', 'edit'])
+        self.assertEqual(relabeled.data['message']['html'], '<button id="b2">취소</button>')
+        self.assertEqual(edited.data['message']['html'], '<button id="b3">삭제</button>')
+        self.assertEqual(ComponentTemplate.objects.count(), 2)
+
+
+
+class MetricsTests(TestCase):
+    """
+    단계별 지연 시간 지표(/metrics) 테스트
+    """
+    def test_stage_metrics_exposed(self):
+        """
+        요청 처리 단계의 지연 시간이 엔드포인트 레이블과 함께 Prometheus 텍스트 형식으로 노출되어야 함
+        """
+        model = GenericFakeChatModel(messages=iter([AIMessage(content='{"component_name": "Box", "html": "<div id=n1 />"}')]))
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('utils.langchain.get_model', return_value=model), \
+                mock.patch('api.langchain.component_library.LIBRARY_ENABLED', False), \
+                mock.patch('api.langchain.apis.get_response_cache', return_value=ResponseCache(path=os.path.join(tmpdir, 'cache.sqlite3'))):
+            client = APIClient()
+            response = client.post('/api/langchain/req_ui_component_stream', {'newId': 'n1', 'type': 'div'}, format='json', HTTP_ACCEPT='text/event-stream')
+            b''.join(response.streaming_content)
+            metrics = client.get('/metrics')
+
+        self.assertEqual(metrics.status_code, 200)
+        self.assertTrue(metrics['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = metrics.content.decode('utf-8')
+        self.assertIn('# TYPE langchain_stage_duration_seconds histogram', body)
+        for stage in ('body_parse', 'prompt_build', 'llm_first_token', 'llm_total'):
+            self.assertRegex(body, rf'langchain_stage_duration_seconds_count\{{endpoint="req_ui_component_stream",model="[^"]*",stage="{stage}"\}} [1-9]')
+        self.assertIn('http_request_duration_seconds_count{endpoint="req_ui_component_stream",method="POST",status="200"}', body)
+        # 응답이 완성되어 남은 생성을 중단한 호출은 오류가 아닌 취소로 기록
+        self.assertRegex(body, r'langchain_llm_calls_total\{endpoint="req_ui_component_stream",model="[^"]*",status="cancelled"\} 1')
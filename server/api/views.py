@@ -2,9 +2,11 @@ from rest_framework import viewsets, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from django.http import HttpResponse
 from .models import Item
 from .serializers import ItemSerializer
 from utils.langchain import initialize_langchain
+from utils.metrics import render_metrics
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
@@ -17,6 +19,12 @@ def api_root(request, format=None):
         'status': 'API is running',
     })
 
+def metrics(request):
+    """
+    Prometheus 텍스트 형식의 지표 엔드포인트 (요청/단계별 지연 시간, 모델 호출 수, 토큰 수)
+    """
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 class ItemViewSet(viewsets.ModelViewSet):
     """
     Item 모델에 대한 CRUD 작업을 위한 ViewSet
@@ -38,6 +38,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 요청/단계별 지연 시간 지표 (/metrics)
+    'api.middleware.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -73,6 +75,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # 작업 워커(run_job_worker) 프로세스와 웹 서버가 함께 쓰므로 잠금 대기 시간을 늘림
+        'OPTIONS': {
+            'timeout': 20,
+        },
     }
 }
 
@@ -4,9 +4,11 @@ URL Configuration for config project.
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import RedirectView
+from api.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics),
     path('', RedirectView.as_view(url='/api/', permanent=False)),
 ]
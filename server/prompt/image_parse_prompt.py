@@ -4,13 +4,12 @@ image_text_extract_format_instruction = '''
 }}
 '''
 
-image_text_extract_prompt = '''
+# 이미지는 프롬프트 텍스트가 아닌 image content block으로 전달됩니다. (utils.langchain.set_cached_prompt 참고)
+image_text_extract_prompt_prefix = '''
 You are a specialized OCR (Optical Character Recognition) system that ONLY extracts visible text from images.
 
 TASK: Extract ALL text visible in the provided image. Include EVERY text element exactly as it appears.
 
-Image URL (base64): {image_url}
-
 CRITICAL INSTRUCTIONS:
 1. ONLY extract text that is clearly visible in the image
 2. Include ALL text elements - buttons, labels, headings, paragraphs, placeholders, etc.
@@ -24,6 +23,10 @@ Respond with ONLY a JSON object following this structure without any additional
 {format_instructions}
 '''
 
+image_text_extract_prompt_suffix = '''
+Extract the text from the attached image.
+'''
+
 image_description_format_instruction = '''
 {{
   "service_purpose": "Clear description of the exact type of page/screen shown (login, signup, dashboard, etc.)",
@@ -33,13 +36,12 @@ image_description_format_instruction = '''
 }}
 '''
 
-image_description_prompt = """
+# 요청마다 동일한 앞부분 (Anthropic 프롬프트 캐시 대상)
+image_description_prompt_prefix = """
 You are a specialized UI analyst with expertise in identifying exact page types and functionality from screenshots.
 
 TASK: Analyze the provided screenshot and determine EXACTLY what type of page or interface is shown.
 
-Image URL (base64): {image_url}
-
 IMPORTANT INSTRUCTIONS:
 1. FIRST identify the fundamental page type (login page, product page, dashboard, settings screen, etc.)
 2. Look carefully at ALL text labels, button text, and form fields
@@ -53,18 +55,43 @@ Respond with ONLY a JSON object following this structure without any additional
 {format_instructions}
 """
 
+# 요청마다 바뀌는 뒷부분
+image_description_prompt_suffix = """
+Analyze the attached screenshot.
+"""
+
 image_construct_format_instruction = '{{ "components" : [{"role" : "Role of the component", "tag" : "Tag of the component (main, div, p, input, button, etc)", "label"?: "Text in the component" }]}}'
-image_construct_prompt = """
+image_construct_prompt_prefix = """
 You are an expert in analyzing the service/UI shown in the image. 
 Please describe in detail the functions, purpose, and key features shown on the screen.
 
-Image URL (base64) : {image_url}
-
-Service Purpose : {service_purpose}
-
 1. Temperature = 0
 2. No "\n" (line break) in RESPONSE.
 3. Return a Only JSON response (without description of response) with the following structure:
 {format_instructions}
 
-"""
\ No newline at end of file
+"""
+
+image_construct_prompt_suffix = """
+Service Purpose : {service_purpose}
+Extracted Text : {extracted_text}
+"""
+
+image_parse_format_instruction = '{{ "components" : [{"role" : "해당 컴포넌트의 역할", "tag" : "컴포넌트 종류", "label"?: "컴포넌트에 있는 텍스트나 아이콘" }] }}'
+image_parse_example = """
+    "components" : [ { "role" : "Wrapper 컴포넌트 하위 컴포넌트를 수평 배열", "tag" : "div" }, { "role" : "이메일 입력 Input 컴포넌트 ", "tag" : "input", "label": "placeholder 이메일 입력" }]
+"""
+# 요청마다 동일한 앞부분 (Anthropic 프롬프트 캐시 대상)
+image_parse_prompt_prefix = """
+You are an expert web developer. Analyze the attached image and Extract the components in the image.
+
+Example : {example}
+
+1. Return a Only JSON response (without description of response) with the following structure:
+{format_instructions}
+"""
+
+# 요청마다 바뀌는 뒷부분
+image_parse_prompt_suffix = """
+Extract the components in the attached image.
+"""
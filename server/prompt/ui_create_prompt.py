@@ -22,14 +22,34 @@ ui_component_example = example = """
       "attributes"?: {"onChange" : (data) => onChange(data) }
     """
 
-ui_component_prompt = """
+# 요청마다 동일한 앞부분 (Anthropic 프롬프트 캐시 대상)
+ui_component_prompt_prefix = """
     You are an expert web developer. Create JSX code based on the given architecture.
 
     Example : {example}
 
+    1. No "\n" (line break) in styles.
+    2. Return a Only JSON response (without description of response) with the following structure:
+    {format_instructions}
+    """
+
+# 요청마다 바뀌는 뒷부분
+ui_component_prompt_suffix = """
     Architecture: {architecture}
-    
+    """
+# 컴포넌트 라이브러리의 비슷한 컴포넌트를 새 architecture에 맞게 수정 (요청마다 동일한 앞부분)
+ui_component_edit_prompt_prefix = """
+    You are an expert web developer. Update the reference JSX component so that it matches the new architecture.
+    Keep the code, styles and names of the reference component and change only what differs between the reference architecture and the new architecture.
+
     1. No "\n" (line break) in styles.
     2. Return a Only JSON response (without description of response) with the following structure:
     {format_instructions}
-    """
\ No newline at end of file
+    """
+
+# 요청마다 바뀌는 뒷부분
+ui_component_edit_prompt_suffix = """
+    Reference Architecture: {reference_architecture}
+    Reference Component: {reference_component}
+    Architecture: {architecture}
+    """
@@ -0,0 +1,329 @@
+import os
+import io
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from PIL import Image
+from utils.llm_image import decode_base64_image
+
+# 이미지 결과 저장소 설정
+# 같은 스크린샷이 여러 엔드포인트(WebpageAnalyzer, detect_ui_components, ResNet50 예측, Claude 이미지 분석)를 거쳐도
+# 이미지 바이트의 해시 + 파이프라인 이름 + 버전으로 결과를 찾아 다시 계산하지 않습니다.
+# 프로세스 내부 LRU(메모리)와 워커 간에 공유되는 SQLite(디스크) 2단계이며, 둘 다 저장된 크기(bytes) 기준으로 오래된 항목부터 제거합니다.
+IMAGE_STORE_ENABLED = os.getenv('IMAGE_STORE', 'True') == 'True'
+IMAGE_STORE_MEMORY_BYTES = int(os.getenv('IMAGE_STORE_MEMORY_BYTES', 64 * 1024 * 1024))
+IMAGE_STORE_DISK_BYTES = int(os.getenv('IMAGE_STORE_DISK_BYTES', 1024 * 1024 * 1024))
+IMAGE_STORE_PATH = os.getenv(
+    'IMAGE_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'image_store.sqlite3')
+)
+
+# 파이프라인별 버전. 모델이나 후처리가 바뀌면 버전을 올려 이전 결과를 사용하지 않도록 합니다.
+PIPELINE_VERSIONS = {
+    'image': '1',                   # 디코딩한 이미지 메타데이터 (크기, 형식)
+    'resnet50_backbone': '1',       # WebpageAnalyzer의 ResNet50 특징 (conv5_block3_out)
+    'webpage_analyzer': '1',
+    'ui_component_detector': '1',
+    'resnet50_predict': '1',
+    'image_parse': '1',             # Claude 이미지 체인 (체인 버전이 함께 키에 포함됨)
+    'image_description': '1',
+}
+
+# 저장된 값의 종류
+KIND_META = 'meta'
+KIND_FEATURES = 'features'
+KIND_RESULT = 'result'
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
+# np.save 형식의 시작 바이트 (특징 배열과 JSON 결과를 구분)
+NPY_MAGIC = b'\x93NUMPY'
+
+
+def _json_default(value):
+    # 결과에 섞인 numpy 값(예측 확률, 좌표 등)은 파이썬 값으로 변환
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"JSON으로 저장할 수 없는 값입니다: {type(value).__name__}")
+
+
+def serialize_value(value):
+    """
+    저장소 값을 바이트로 직렬화합니다. numpy 배열(특징)은 np.save 형식, 그 외 결과는 JSON으로 저장합니다.
+    (디스크의 값은 다른 워커도 읽으므로 역직렬화할 때 코드를 실행할 수 있는 pickle은 사용하지 않음)
+    """
+    if isinstance(value, np.ndarray):
+        buffer = io.BytesIO()
+        np.save(buffer, value, allow_pickle=False)
+        return buffer.getvalue()
+    return json.dumps(value, ensure_ascii=False, default=_json_default).encode('utf-8')
+
+
+def deserialize_value(blob):
+    """
+    serialize_value로 직렬화한 바이트를 값으로 되돌립니다. 형식이 맞지 않으면 ValueError를 발생시킵니다.
+    """
+    blob = bytes(blob)
+    if blob.startswith(NPY_MAGIC):
+        return np.load(io.BytesIO(blob), allow_pickle=False)
+    return json.loads(blob.decode('utf-8'))
+
+
+def image_digest(data):
+    """
+    이미지 바이트의 SHA-256 해시를 반환합니다. base64 문자열(data URL 포함)은 디코딩한 바이트로 계산합니다.
+    같은 이미지는 JSON(base64)으로 받든 업로드로 받든 같은 해시가 됩니다.
+    """
+    return hashlib.sha256(decode_base64_image(data)).hexdigest()
+
+
+def stored_image_digest(data):
+    """
+    저장소 키로 사용할 이미지 해시를 반환합니다.
+    IMAGE_STORE=False이거나 해시를 계산할 수 없는 입력(파일 경로, 잘못된 base64 등)이면 None을 반환합니다.
+    """
+    if not IMAGE_STORE_ENABLED or not data:
+        return None
+    try:
+        return image_digest(data)
+    except Exception:
+        return None
+
+
+class ImageResultStore:
+    """
+    이미지 해시로 찾는 결과 저장소
+    키는 (이미지 해시, 파이프라인 이름, 버전, 종류)이며 값은 numpy 특징이면 np.save 형식, 그 외에는 JSON으로 저장합니다.
+    """
+
+    def __init__(self, path=IMAGE_STORE_PATH, memory_bytes=IMAGE_STORE_MEMORY_BYTES, disk_bytes=IMAGE_STORE_DISK_BYTES):
+        self.path = path
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+        self._init_disk()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_disk(self):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS image_store ('
+                    'key TEXT PRIMARY KEY, pipeline TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                    'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS image_store_accessed ON image_store (accessed_at)')
+        except sqlite3.Error as e:
+            # 디스크 저장소를 사용할 수 없으면 메모리만 사용
+            print(f"이미지 저장소 초기화 실패: {e}")
+            self.path = None
+
+    @staticmethod
+    def key(digest, pipeline, version=None, kind=KIND_RESULT):
+        """
+        저장소 키를 반환합니다. version을 지정하지 않으면 PIPELINE_VERSIONS의 값을 사용합니다.
+        """
+        version = version if version is not None else PIPELINE_VERSIONS.get(pipeline, '1')
+        return f"{pipeline}:{version}:{kind}:{digest}"
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _remember(self, key, value, size):
+        # 메모리 한도보다 큰 값은 디스크에만 저장
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= previous[1]
+            self._memory[key] = (value, size)
+            self._memory_size += size
+            while self._memory_size > self.memory_bytes:
+                _, (_, evicted_size) = self._memory.popitem(last=False)
+                self._memory_size -= evicted_size
+                self._stats['evictions'] += 1
+
+    def get(self, digest, pipeline, version=None, kind=KIND_RESULT):
+        """
+        저장된 값을 조회합니다. 없으면 None을 반환합니다.
+        """
+        key = self.key(digest, pipeline, version, kind)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return entry[0]
+
+        if self.path is not None:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute('SELECT value FROM image_store WHERE key = ?', (key,)).fetchone()
+                    if row is not None:
+                        conn.execute('UPDATE image_store SET accessed_at = ? WHERE key = ?', (time.time(), key))
+                if row is not None:
+                    value = deserialize_value(row[0])
+                    self._remember(key, value, len(row[0]))
+                    self._count('disk_hits')
+                    return value
+            except (sqlite3.Error, ValueError) as e:
+                print(f"이미지 저장소 조회 실패: {e}")
+
+        self._count('misses')
+        return None
+
+    def set(self, digest, pipeline, value, version=None, kind=KIND_RESULT):
+        """
+        값을 저장하고 크기 제한을 넘으면 최근에 사용하지 않은 항목부터 제거합니다.
+        """
+        key = self.key(digest, pipeline, version, kind)
+        try:
+            blob = serialize_value(value)
+        except (TypeError, ValueError) as e:
+            # 직렬화할 수 없는 결과는 저장하지 않음
+            print(f"이미지 저장소 저장 실패: {e}")
+            return
+        self._remember(key, value, len(blob))
+        self._count('sets')
+
+        if self.path is None:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO image_store (key, pipeline, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, pipeline, blob, len(blob), now, now)
+                )
+                evicted = conn.execute(
+                    'DELETE FROM image_store WHERE key IN ('
+                    'SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS used FROM image_store) '
+                    'WHERE used > ?)',
+                    (self.disk_bytes,)
+                ).rowcount
+            if evicted > 0:
+                self._count('evictions', evicted)
+        except sqlite3.Error as e:
+            print(f"이미지 저장소 저장 실패: {e}")
+
+    def get_or_compute(self, digest, pipeline, compute, version=None, kind=KIND_RESULT, cacheable=None):
+        """
+        저장된 값이 있으면 반환하고, 없으면 compute()를 실행하여 저장합니다.
+
+        Args:
+            cacheable (callable, optional): False를 반환하는 결과(오류 결과 등)는 저장하지 않음
+
+        Returns:
+            tuple: (값, 저장소 적중 여부)
+        """
+        value = self.get(digest, pipeline, version, kind)
+        if value is not None:
+            return value, True
+        value = compute()
+        if value is not None and (cacheable is None or cacheable(value)):
+            self.set(digest, pipeline, value, version, kind)
+        return value, False
+
+    def clear(self):
+        """
+        메모리와 디스크 저장소를 모두 비웁니다.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        if self.path is not None:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM image_store')
+
+    def stats(self):
+        """
+        적중/실패 횟수와 현재 크기(메모리, 디스크 파이프라인별)를 반환합니다.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_size
+        hits = stats['memory_hits'] + stats['disk_hits']
+        total = hits + stats['misses']
+        stats['hit_rate'] = hits / total if total else 0.0
+        stats['disk'] = {}
+        if self.path is not None:
+            try:
+                with self._connect() as conn:
+                    rows = conn.execute('SELECT pipeline, COUNT(*), SUM(size) FROM image_store GROUP BY pipeline').fetchall()
+                stats['disk'] = {pipeline: {'entries': count, 'bytes': size} for pipeline, count, size in rows}
+            except sqlite3.Error as e:
+                print(f"이미지 저장소 조회 실패: {e}")
+        return stats
+
+
+def get_chain_image_version(chain_name, chain_version):
+    """
+    이미지 체인 결과의 저장소 버전을 반환합니다. (파이프라인 버전 + 체인 프롬프트 버전)
+    """
+    return f"{PIPELINE_VERSIONS.get(chain_name, '1')}-{chain_version}"
+
+
+def get_image_store():
+    """
+    프로세스 전역 이미지 결과 저장소를 반환합니다.
+    아직 생성되지 않은 경우 생성합니다.
+    """
+    global _image_store
+    if _image_store is None:
+        with _image_store_lock:
+            if _image_store is None:
+                _image_store = ImageResultStore()
+    return _image_store
+
+
+def cached_image_result(pipeline, data, compute, version=None, kind=KIND_RESULT, cacheable=None):
+    """
+    이미지(base64 문자열 또는 바이트)에 대한 파이프라인 결과를 저장소에서 찾고, 없으면 compute(data)로 계산합니다.
+    해시를 계산할 수 없는 입력(파일 경로, 잘못된 base64 등)이나 IMAGE_STORE=False이면 저장소 없이 계산합니다.
+
+    Returns:
+        tuple: (결과, 저장소 적중 여부)
+    """
+    digest = stored_image_digest(data)
+    if digest is None:
+        return compute(data), False
+    return get_image_store().get_or_compute(digest, pipeline, lambda: compute(data), version, kind, cacheable)
+
+
+def image_metadata(data):
+    """
+    이미지 크기와 형식을 반환합니다. 헤더만 읽고 전체 디코딩은 하지 않으며, 결과는 모든 파이프라인이 공유합니다.
+
+    Returns:
+        dict: width, height, format, mode, bytes
+    """
+    def read(data):
+        raw = decode_base64_image(data)
+        with Image.open(io.BytesIO(raw)) as image:
+            return {'width': image.width, 'height': image.height, 'format': image.format, 'mode': image.mode, 'bytes': len(raw)}
+
+    metadata, _ = cached_image_result('image', data, read, kind=KIND_META)
+    return metadata
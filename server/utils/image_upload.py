@@ -0,0 +1,106 @@
+import os
+
+# 이미지 업로드 설정
+# JSON 본문의 base64Data 대신 multipart/form-data 또는 이미지 바이트 본문(image/*, application/octet-stream)으로 받습니다.
+# 본문을 문자열로 디코딩하고 JSON/base64를 다시 파싱하는 복사가 없어집니다.
+# 이미지 해시, 디코딩, 모델 요청 모두 전체 바이트가 필요하므로 본문은 임시 파일 없이 메모리에 한 번만 모아 둡니다.
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv('IMAGE_UPLOAD_MAX_BYTES', 20 * 1024 * 1024))
+IMAGE_UPLOAD_CHUNK_BYTES = int(os.getenv('IMAGE_UPLOAD_CHUNK_BYTES', 64 * 1024))
+# multipart/form-data의 이미지 필드 이름 (없으면 첫 번째 파일 사용)
+IMAGE_UPLOAD_FIELD = 'image'
+
+RAW_CONTENT_TYPES = ('application/octet-stream',)
+
+
+class ImageUploadError(Exception):
+    """
+    업로드된 이미지를 읽을 수 없을 때 발생하는 예외 (status: 응답 HTTP 상태 코드)
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _content_type(request):
+    return request.META.get('CONTENT_TYPE', '').split(';', 1)[0].strip().lower()
+
+
+def _read_multipart(request):
+    files = request.FILES
+    upload = files.get(IMAGE_UPLOAD_FIELD) or next(iter(files.values()), None)
+    if upload is None:
+        raise ImageUploadError(f"'{IMAGE_UPLOAD_FIELD}' 파일이 없습니다.")
+    if upload.size > IMAGE_UPLOAD_MAX_BYTES:
+        raise ImageUploadError(f"이미지가 너무 큽니다. (최대 {IMAGE_UPLOAD_MAX_BYTES} bytes)", status=413)
+    try:
+        data = upload.read()
+    finally:
+        upload.close()
+    return {
+        'data': data,
+        'filename': upload.name,
+        'content_type': upload.content_type,
+        'size': len(data),
+    }
+
+
+def _read_raw(request, content_type):
+    # request.body는 DATA_UPLOAD_MAX_MEMORY_SIZE 제한이 있고 본문 전체를 한 번 더 복사하므로 스트림에서 직접 읽음
+    # 조각을 모아 마지막에 한 번만 합침 (크기 제한을 넘으면 더 읽지 않음)
+    chunks = []
+    size = 0
+    while True:
+        chunk = request.read(IMAGE_UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > IMAGE_UPLOAD_MAX_BYTES:
+            raise ImageUploadError(f"이미지가 너무 큽니다. (최대 {IMAGE_UPLOAD_MAX_BYTES} bytes)", status=413)
+        chunks.append(chunk)
+    if size == 0:
+        raise ImageUploadError("이미지 본문이 비어 있습니다.")
+    data = chunks[0] if len(chunks) == 1 else b''.join(chunks)
+    return {
+        'data': data,
+        'filename': request.headers.get('X-Filename', ''),
+        'content_type': content_type,
+        'size': size,
+    }
+
+
+def read_image_upload(request):
+    """
+    요청에서 업로드된 이미지 바이트를 읽습니다.
+
+    - multipart/form-data: 'image' 필드(없으면 첫 번째 파일). 파일 저장은 Django 업로드 핸들러가 처리
+    - image/*, application/octet-stream: 본문 전체가 이미지. 파일 이름은 X-Filename 헤더
+
+    Args:
+        request: Django HttpRequest 또는 DRF Request
+
+    Returns:
+        dict: data(bytes), filename, content_type, size
+
+    Raises:
+        ImageUploadError: 지원하지 않는 Content-Type(415), 크기 초과(413), 이미지 없음(400)
+    """
+    # DRF Request는 파서를 거치지 않도록 원본 HttpRequest에서 읽음
+    request = getattr(request, '_request', request)
+    content_length = request.META.get('CONTENT_LENGTH')
+    if content_length and content_length.isdigit() and int(content_length) > IMAGE_UPLOAD_MAX_BYTES + IMAGE_UPLOAD_CHUNK_BYTES:
+        raise ImageUploadError(f"이미지가 너무 큽니다. (최대 {IMAGE_UPLOAD_MAX_BYTES} bytes)", status=413)
+
+    content_type = _content_type(request)
+    if content_type == 'multipart/form-data':
+        return _read_multipart(request)
+    if content_type.startswith('image/') or content_type in RAW_CONTENT_TYPES:
+        return _read_raw(request, content_type)
+    raise ImageUploadError(f"지원하지 않는 Content-Type입니다: {content_type or '(없음)'}", status=415)
+
+
+def upload_summary(upload):
+    """
+    응답에 포함할 업로드 정보를 반환합니다. (이미지 데이터 제외)
+    """
+    return {key: value for key, value in upload.items() if key != 'data'}
@@ -0,0 +1,173 @@
+import re
+import json
+
+# 모델 응답에서 자주 보이는 JSON 오류를 한 번의 순회로 고칩니다.
+# 고친 항목은 아래 분류(category)로 기록합니다.
+#   code_fence: ```json 코드 블록으로 감싼 응답
+#   leading_text / trailing_text: JSON 앞뒤의 설명 문장
+#   control_character: 문자열 안의 줄바꿈, 탭 등 이스케이프되지 않은 제어 문자 (html 값에 자주 발생)
+#   unescaped_quote: 문자열 안의 이스케이프되지 않은 큰따옴표 (예: "html": "<div id="a">")
+#   invalid_escape: JSON에서 허용하지 않는 이스케이프 (예: \')
+#   single_quote: 작은따옴표로 감싼 키/문자열 (ui_component_format_instructions 예시를 그대로 따라 한 경우)
+#   unquoted_key: 따옴표 없는 키
+#   python_literal: True/False/None
+#   trailing_comma: 닫는 괄호 앞의 쉼표
+#   truncated: 닫히지 않은 문자열/괄호 (max_tokens에서 잘린 응답)
+REPAIR_CATEGORIES = (
+    'code_fence', 'leading_text', 'trailing_text', 'control_character', 'unescaped_quote', 'invalid_escape',
+    'single_quote', 'unquoted_key', 'python_literal', 'trailing_comma', 'truncated',
+)
+
+_FENCE = re.compile(r'```[A-Za-z]*\s*(.*?)(?:```|$)', re.DOTALL)
+_WORD = re.compile(r'[A-Za-z_$][\w$-]*')
+_PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t', '\b': '\\b', '\f': '\\f'}
+
+
+def _next_significant(text, index):
+    while index < len(text) and text[index].isspace():
+        index += 1
+    return text[index] if index < len(text) else ''
+
+
+def _drop_trailing_comma(out):
+    index = len(out) - 1
+    while index >= 0 and out[index].isspace():
+        index -= 1
+    if index >= 0 and out[index] == ',':
+        del out[index]
+        return True
+    return False
+
+
+def repair_json(text):
+    """
+    형식이 조금 잘못된 JSON 문자열을 고쳐서 파싱합니다.
+
+    Args:
+        text (str): 모델 응답
+
+    Returns:
+        tuple: (파싱 결과, 고친 항목 분류 목록)
+
+    Raises:
+        ValueError: JSON 객체/배열을 찾을 수 없거나 고친 뒤에도 파싱할 수 없는 경우
+    """
+    categories = []
+
+    def mark(category):
+        if category not in categories:
+            categories.append(category)
+
+    source = text.strip()
+    if not source.startswith(('{', '[')):
+        fence = _FENCE.search(source)
+        if fence and fence.group(1).lstrip().startswith(('{', '[')):
+            source = fence.group(1)
+            mark('code_fence')
+
+    starts = [index for index in (source.find('{'), source.find('[')) if index >= 0]
+    if not starts:
+        raise ValueError("JSON 객체를 찾을 수 없습니다.")
+    start = min(starts)
+    if source[:start].strip():
+        mark('leading_text')
+
+    out = []
+    stack = []
+    quote = None
+    index = start
+    length = len(source)
+    while index < length:
+        char = source[index]
+
+        # 문자열 내부
+        if quote:
+            if char == '\\':
+                following = source[index + 1:index + 2]
+                if following and following in '"\\/bfnrtu':
+                    out.append(char + following)
+                    index += 2
+                elif following == "'":
+                    out.append("'")
+                    if quote == '"':
+                        mark('invalid_escape')
+                    index += 2
+                else:
+                    out.append('\\\\')
+                    mark('invalid_escape')
+                    index += 1
+                continue
+            if char == quote:
+                # 뒤에 구분자가 오면 닫는 따옴표, 아니면 문자열 안의 따옴표
+                if _next_significant(source, index + 1) in ('', ',', '}', ']', ':'):
+                    out.append('"')
+                    quote = None
+                elif quote == '"':
+                    out.append('\\"')
+                    mark('unescaped_quote')
+                else:
+                    out.append("'")
+                index += 1
+                continue
+            if char == '"':
+                out.append('\\"')
+            elif char in _CONTROL_ESCAPES or ord(char) < 0x20:
+                out.append(_CONTROL_ESCAPES.get(char, f'\\u{ord(char):04x}'))
+                mark('control_character')
+            else:
+                out.append(char)
+            index += 1
+            continue
+
+        # 문자열 외부
+        if char == '"' or char == "'":
+            if char == "'":
+                mark('single_quote')
+            quote = char
+            out.append('"')
+        elif char in '{[':
+            stack.append(char)
+            out.append(char)
+        elif char in '}]':
+            if _drop_trailing_comma(out):
+                mark('trailing_comma')
+            if stack:
+                stack.pop()
+            out.append(char)
+            if not stack:
+                rest = source[index + 1:].strip()
+                if rest and rest != '```':
+                    mark('trailing_text')
+                break
+        elif char.isalpha() or char in '_$':
+            word = _WORD.match(source, index).group(0)
+            if word in ('true', 'false', 'null'):
+                out.append(word)
+            elif word in _PYTHON_LITERALS:
+                out.append(_PYTHON_LITERALS[word])
+                mark('python_literal')
+            elif _next_significant(source, index + len(word)) == ':':
+                out.append(json.dumps(word))
+                mark('unquoted_key')
+            else:
+                # 고칠 수 없는 값은 그대로 두어 파싱 오류로 처리
+                out.append(word)
+            index += len(word)
+            continue
+        else:
+            out.append(char)
+        index += 1
+
+    if quote:
+        out.append('"')
+        mark('truncated')
+    if stack:
+        _drop_trailing_comma(out)
+        out.extend('}' if opener == '{' else ']' for opener in reversed(stack))
+        mark('truncated')
+
+    try:
+        return json.loads(''.join(out)), categories
+    except json.JSONDecodeError as error:
+        raise ValueError(f"JSON을 고칠 수 없습니다: {error}") from error
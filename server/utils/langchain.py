@@ -1,53 +1,253 @@
 import os
+import json
+import asyncio
+import weakref
+import contextvars
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from langchain_anthropic import ChatAnthropic
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
-from anthropic import Anthropic
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.exceptions import OutputParserException
+from langchain_core.utils.json import parse_partial_json
+from langchain_core.runnables import RunnableLambda
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import SystemMessage, HumanMessage
+import httpx
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from anthropic import Anthropic, AsyncAnthropic, DefaultHttpxClient, DefaultAsyncHttpxClient
+from utils.llm_replay import LLM_MODE, RecordingChatModel, ReplayChatModel
+from utils.json_repair import repair_json
+from utils.metrics import observe_stage, get_current_endpoint, LLM_CALLS, LLM_TOKENS
 
 # settings.py에서 이미 load_dotenv()가 호출되므로 여기서는 생략
 
-# 전역 변수로 모델 인스턴스 저장
-_langchain_model = None
+# 기본 모델 설정
+DEFAULT_MODEL_NAME = "claude-3-5-sonnet-20240620"
+DEFAULT_MAX_TOKENS = 4000
 
-def initialize_langchain():
+# 모델 풀
+# (모델, temperature, 최대 토큰)별 모델 인스턴스를 한 번만 생성하여 모든 스레드가 공유합니다.
+_models = {}
+_models_lock = threading.Lock()
+
+# 공유 HTTP 클라이언트 설정
+# 모든 모델이 같은 keep-alive 연결 풀을 사용하여 요청마다 TLS handshake를 하지 않도록 합니다.
+ANTHROPIC_API_URL = os.getenv('ANTHROPIC_API_URL', 'https://api.anthropic.com')
+HTTP_MAX_CONNECTIONS = int(os.getenv('LANGCHAIN_HTTP_MAX_CONNECTIONS', 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LANGCHAIN_HTTP_MAX_KEEPALIVE_CONNECTIONS', 20))
+# httpx 기본값(5초)은 요청 간격보다 짧아 연결이 자주 끊기므로 길게 유지
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('LANGCHAIN_HTTP_KEEPALIVE_EXPIRY', 120))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('LANGCHAIN_HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('LANGCHAIN_HTTP_READ_TIMEOUT', 600))
+# init_langchain에서 미리 맺어 둘 연결 수
+HTTP_PREWARM_CONNECTIONS = int(os.getenv('LANGCHAIN_HTTP_PREWARM_CONNECTIONS', 4))
+
+_http_client = None
+_http_client_lock = threading.Lock()
+_anthropic_clients = {}
+# 이벤트 루프별 비동기 HTTP 클라이언트 (httpx.AsyncClient의 연결은 생성된 루프에서만 사용 가능)
+_async_http_clients = weakref.WeakKeyDictionary()
+
+
+def _http_options():
+    return {
+        'limits': httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        'timeout': httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    }
+
+
+def get_http_client():
     """
-    Anthropic API를 사용하기 위한 LangChain 초기화 함수
-    .env 파일에서 ANTHROPIC_API_KEY를 로드하여 ChatAnthropic 모델을 초기화합니다.
-    이미 초기화된 경우 기존 인스턴스를 반환합니다.
+    프로세스 전역 keep-alive HTTP 클라이언트를 반환합니다. (스레드 간 공유)
     """
-    print('Langchain Model 초기화를 수행합니다...')
-    global _langchain_model
-    
-    # 이미 초기화된 경우 기존 인스턴스 반환
-    if _langchain_model is not None:
-        return _langchain_model
-    
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = DefaultHttpxClient(**_http_options())
+    return _http_client
+
+
+def get_async_http_client():
+    """
+    현재 이벤트 루프의 keep-alive 비동기 HTTP 클라이언트를 반환합니다.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_http_clients.get(loop)
+    if entry is None:
+        entry = {'http': DefaultAsyncHttpxClient(**_http_options()), 'clients': {}}
+        _async_http_clients[loop] = entry
+    return entry['http']
+
+
+def _client_key(params):
+    return tuple(sorted((key, repr(value)) for key, value in params.items()))
+
+
+def get_anthropic_client(params):
+    """
+    같은 설정(API 키, URL, 재시도 등)의 모델이 공유하는 Anthropic 클라이언트를 반환합니다.
+    """
+    key = _client_key(params)
+    client = _anthropic_clients.get(key)
+    if client is None:
+        http_client = get_http_client()
+        with _http_client_lock:
+            client = _anthropic_clients.get(key)
+            if client is None:
+                client = Anthropic(**params, http_client=http_client)
+                _anthropic_clients[key] = client
+    return client
+
+
+def get_async_anthropic_client(params):
+    """
+    현재 이벤트 루프에서 같은 설정의 모델이 공유하는 비동기 Anthropic 클라이언트를 반환합니다.
+    """
+    http_client = get_async_http_client()
+    clients = _async_http_clients[asyncio.get_running_loop()]['clients']
+    key = _client_key(params)
+    if key not in clients:
+        clients[key] = AsyncAnthropic(**params, http_client=http_client)
+    return clients[key]
+
+
+class PooledChatAnthropic(ChatAnthropic):
+    """
+    모델별로 HTTP 연결 풀을 만들지 않고 공유 keep-alive 클라이언트를 사용하는 ChatAnthropic
+    """
+
+    @property
+    def _client(self):
+        return get_anthropic_client(self._client_params)
+
+    @property
+    def _async_client(self):
+        return get_async_anthropic_client(self._client_params)
+
+
+def prewarm_connections(count=HTTP_PREWARM_CONNECTIONS):
+    """
+    Anthropic API와 TLS 연결을 미리 맺어 연결 풀에 넣어 둡니다.
+    동시에 요청해야 서로 다른 연결이 생성되므로 스레드에서 병렬로 실행합니다.
+
+    Returns:
+        int: 연결에 성공한 수
+    """
+    # 재생 모드에서는 Anthropic API를 호출하지 않음
+    if LLM_MODE == 'replay':
+        return 0
+    client = get_http_client()
+
+    def ping(_):
+        try:
+            client.head(ANTHROPIC_API_URL, timeout=HTTP_CONNECT_TIMEOUT)
+            return True
+        except httpx.HTTPError as e:
+            print(f"Anthropic 연결 예열 실패: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, count)) as executor:
+        return sum(executor.map(ping, range(count)))
+
+
+async def aprewarm_connections(count=HTTP_PREWARM_CONNECTIONS):
+    """
+    prewarm_connections의 비동기 버전 (현재 이벤트 루프의 연결 풀을 예열)
+    """
+    if LLM_MODE == 'replay':
+        return 0
+    client = get_async_http_client()
+
+    async def ping():
+        try:
+            await client.head(ANTHROPIC_API_URL, timeout=HTTP_CONNECT_TIMEOUT)
+            return True
+        except httpx.HTTPError as e:
+            print(f"Anthropic 연결 예열 실패: {e}")
+            return False
+
+    return sum(await asyncio.gather(*(ping() for _ in range(count))))
+
+
+def _create_model(model_name, max_tokens, temperature=None):
+    """
+    ChatAnthropic 모델 인스턴스를 생성합니다.
+    LANGCHAIN_LLM_MODE가 replay이면 기록된 응답을 재생하는 모델을, record이면 호출을 기록하는 모델을 반환합니다. (utils.llm_replay)
+    """
+    # 기록된 응답 재생 (API 호출 없음)
+    if LLM_MODE == 'replay':
+        return ReplayChatModel(model_name=model_name)
+
     # Anthropic API 키 확인
     api_key = os.getenv("ANTHROPIC_API_KEY")
     if not api_key or api_key == "your-api-key-here":
         raise ValueError("ANTHROPIC_API_KEY가 설정되지 않았습니다. .env 파일에 유효한 API 키를 설정해주세요.")
-    
-    # ChatAnthropic 모델 초기화
+
+    # ChatAnthropic 모델 초기화 (속도 제한기를 통과하도록 GovernedChatAnthropic 사용)
     # https://python.langchain.com/docs/concepts/chat_models/
-    _langchain_model = ChatAnthropic(
-            model="claude-3-5-sonnet-20240620", 
+    model_class = GovernedChatAnthropic if GOVERNOR_ENABLED else PooledChatAnthropic
+    model = model_class(
+            model=model_name, 
             api_key=api_key,
-            # temperature=0,
-            max_tokens=4000
+            temperature=temperature,
+            max_tokens=max_tokens
             # timeout=None,
             # max_retries=2,
         )
-    
-    return _langchain_model
+
+    # 실제 호출의 프롬프트, 응답, 지연 시간을 코퍼스에 기록
+    if LLM_MODE == 'record':
+        return RecordingChatModel(chat_model=model)
+    return model
+
+def initialize_langchain():
+    """
+    Anthropic API를 사용하기 위한 LangChain 초기화 함수
+    .env 파일에서 ANTHROPIC_API_KEY를 로드하여 기본 ChatAnthropic 모델을 모델 풀에 생성합니다.
+    이미 초기화된 경우 기존 인스턴스를 반환합니다.
+    """
+    print('Langchain Model 초기화를 수행합니다...')
+    return get_model()
 
 def get_langchain_model():
     """
     초기화된 LangChain 모델을 반환합니다.
     아직 초기화되지 않은 경우 초기화합니다.
     """
-    global _langchain_model
-    if _langchain_model is None:
-        return initialize_langchain()
-    return _langchain_model
+    return get_model()
+
+
+def get_model(model_name=None, max_tokens=None, temperature=None):
+    """
+    모델 풀에서 (모델 이름, temperature, 최대 토큰 수)에 해당하는 모델을 반환합니다.
+    처음 요청된 설정은 잠금 안에서 한 번만 생성하므로 여러 스레드가 동시에 호출해도 안전합니다.
+
+    Args:
+        model_name (str, optional): 모델 이름. 기본값은 DEFAULT_MODEL_NAME
+        max_tokens (int, optional): 최대 출력 토큰 수. 기본값은 DEFAULT_MAX_TOKENS
+        temperature (float, optional): temperature. 기본값은 모델 기본값
+    """
+    key = (model_name or DEFAULT_MODEL_NAME, temperature, max_tokens or DEFAULT_MAX_TOKENS)
+    model = _models.get(key)
+    if model is None:
+        with _models_lock:
+            model = _models.get(key)
+            if model is None:
+                print(f'Langchain Model({key[0]}, temperature={key[1]}, max_tokens={key[2]})을 생성합니다...')
+                model = _create_model(key[0], key[2], key[1])
+                _models[key] = model
+    return model
 
 def set_prompt(template, input_variables=None, partial_variables=None) :
     """
@@ -77,6 +277,334 @@ def set_prompt(template, input_variables=None, partial_variables=None) :
     )
 
 
+# 체인 레지스트리
+# 이름별 프롬프트는 등록 시 한 번만 생성하고, (이름, 모델, 파서 여부)별 체인은 최초 사용 시 한 번만 구성합니다.
+_chain_specs = {}
+_chains = {}
+_chains_lock = threading.Lock()
+
+
+# JSON 복구 설정
+# 모델 응답이 JSON으로 바로 파싱되지 않으면 repair_json으로 한 번에 고치고, 그래도 실패하면
+# 작은 모델(JSON_FIX_TIER)에 잘못된 JSON만 보내 고치도록 요청합니다. 전체 요청을 다시 보내지 않습니다.
+JSON_FIX_ENABLED = os.getenv('LANGCHAIN_JSON_FIX', 'True') == 'True'
+JSON_FIX_TIER = os.getenv('LANGCHAIN_JSON_FIX_TIER', 'haiku')
+JSON_FIX_PROMPT = """The following text was meant to be a single JSON object but it is not valid JSON.
+Fix it so that it is valid JSON. Keep every key and value as it is, escape characters inside strings where needed,
+and return only the JSON object without any explanation or code block.
+
+{text}"""
+
+_json_repair_stats = {'parsed': 0, 'repaired': 0, 'fixed_by_model': 0, 'failed': 0, 'categories': {}}
+_json_repair_lock = threading.Lock()
+
+
+def record_json_repair(outcome, categories=()):
+    """
+    JSON 파싱 결과(parsed, repaired, fixed_by_model, failed)와 고친 항목 분류별 횟수를 기록합니다.
+    """
+    with _json_repair_lock:
+        _json_repair_stats[outcome] += 1
+        for category in categories:
+            _json_repair_stats['categories'][category] = _json_repair_stats['categories'].get(category, 0) + 1
+
+
+def get_json_repair_stats():
+    """
+    JSON 파싱/복구 통계를 반환합니다. (repair_rate: 바로 파싱되지 않은 응답 중 복구한 비율)
+    """
+    with _json_repair_lock:
+        stats = {**_json_repair_stats, 'categories': dict(_json_repair_stats['categories'])}
+    broken = stats['repaired'] + stats['fixed_by_model'] + stats['failed']
+    stats['repair_rate'] = (stats['repaired'] + stats['fixed_by_model']) / broken if broken else 0.0
+    return stats
+
+
+class TolerantJsonOutputParser(JsonOutputParser):
+    """
+    형식이 조금 잘못된 JSON 응답(문자열 안의 줄바꿈, 앞뒤 설명 문장, 작은따옴표 키 등)을 고쳐서 파싱하는 JsonOutputParser
+
+    1. json.loads로 바로 파싱
+    2. 실패하면 repair_json으로 고쳐서 파싱 (고친 항목 분류별로 기록)
+    3. 그래도 실패하면 JSON_FIX_TIER 모델에 JSON 고치기만 요청 (응답에 JSON 객체가 없으면 요청하지 않음)
+
+    스트리밍 중의 부분 파싱(partial=True)은 JsonOutputParser와 같습니다.
+    """
+
+    def _parse_or_repair(self, text):
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            pass
+        else:
+            record_json_repair('parsed')
+            return value, True
+        start = time.perf_counter()
+        try:
+            value, categories = repair_json(text)
+        except ValueError:
+            return None, False
+        finally:
+            observe_stage('json_repair', time.perf_counter() - start)
+        record_json_repair('repaired', categories)
+        return value, True
+
+    def _fix_request(self, text):
+        if not JSON_FIX_ENABLED or '{' not in text:
+            return None
+        tier = MODEL_TIERS.get(JSON_FIX_TIER, MODEL_TIERS['haiku'])
+        model = get_model(tier['model'], DEFAULT_MAX_TOKENS, temperature=0)
+        # 바깥 체인의 콜백(라우트 지연 시간 통계 등)에 섞이지 않도록 별도 콜백으로 집계
+        config = {'callbacks': [TokenUsageCallbackHandler('json_repair')], 'run_name': 'json_repair'}
+        return model, [HumanMessage(content=JSON_FIX_PROMPT.format(text=text))], config
+
+    def _fixed_value(self, text, message):
+        try:
+            value, _ = repair_json(message.content if isinstance(message.content, str) else str(message.content))
+        except ValueError as error:
+            record_json_repair('failed')
+            raise OutputParserException(f"Invalid json output: {text}", llm_output=text) from error
+        record_json_repair('fixed_by_model')
+        return value
+
+    def parse_result(self, result, *, partial=False):
+        if partial:
+            return super().parse_result(result, partial=True)
+        text = result[0].text.strip()
+        value, ok = self._parse_or_repair(text)
+        if ok:
+            return value
+        request = self._fix_request(text)
+        if request is None:
+            record_json_repair('failed')
+            raise OutputParserException(f"Invalid json output: {text}", llm_output=text)
+        model, messages, config = request
+        try:
+            message = model.invoke(messages, config=config)
+        except Exception as error:
+            record_json_repair('failed')
+            raise OutputParserException(f"Invalid json output: {text}", llm_output=text) from error
+        return self._fixed_value(text, message)
+
+    async def aparse_result(self, result, *, partial=False):
+        if partial:
+            return super().parse_result(result, partial=True)
+        text = result[0].text.strip()
+        value, ok = self._parse_or_repair(text)
+        if ok:
+            return value
+        request = self._fix_request(text)
+        if request is None:
+            record_json_repair('failed')
+            raise OutputParserException(f"Invalid json output: {text}", llm_output=text)
+        model, messages, config = request
+        try:
+            message = await model.ainvoke(messages, config=config)
+        except Exception as error:
+            record_json_repair('failed')
+            raise OutputParserException(f"Invalid json output: {text}", llm_output=text) from error
+        return self._fixed_value(text, message)
+
+
+_json_parser = TolerantJsonOutputParser()
+
+
+def register_chain(name, template, input_variables=None, partial_variables=None, prefix=None, image_variable=None):
+    """
+    이름으로 조회할 수 있는 체인(프롬프트 + 모델 + TolerantJsonOutputParser)을 등록합니다.
+
+    Args:
+        name (str): 체인 이름
+        template (str): 프롬프트 템플릿 (prefix가 있으면 요청마다 바뀌는 뒷부분)
+        input_variables (list, optional): 호출 시 전달하는 입력 변수
+        partial_variables (dict, optional): 미리 채워 둘 변수
+        prefix (str, optional): 요청마다 동일한 앞부분. 지정하면 Anthropic 프롬프트 캐시 대상으로 표시
+        image_variable (str, optional): 이미지 data URL을 받는 입력 변수. 지정하면 image content block으로 전달 (prefix 필요)
+    """
+    if prefix is not None:
+        prompt = set_cached_prompt(prefix, template, input_variables, partial_variables, image_variable, cache=PROMPT_CACHE_ENABLED)
+    else:
+        prompt = set_prompt(template, input_variables, partial_variables)
+    template_variables = set(PromptTemplate.from_template(template).input_variables)
+    if image_variable:
+        template_variables.add(image_variable)
+    _chain_specs[name] = {
+        'prompt': prompt,
+        'input_variables': list(input_variables or []),
+        'template_variables': template_variables,
+        # 프롬프트가 바뀌면 함께 바뀌는 버전 (체인 결과를 저장할 때 키에 포함)
+        'version': hashlib.sha256(json.dumps(
+            [prefix, template, partial_variables], sort_keys=True, ensure_ascii=False, default=repr
+        ).encode('utf-8')).hexdigest()[:12],
+    }
+    # 같은 이름으로 다시 등록하면 기존에 구성된 체인을 버림
+    with _chains_lock:
+        for key in [key for key in _chains if key[0] == name]:
+            del _chains[key]
+    return prompt
+
+
+def validate_chains():
+    """
+    등록된 체인의 템플릿 변수가 입력 변수와 partial 변수로 모두 채워지는지 검사합니다.
+    누락된 변수가 있으면 ValueError를 발생시킵니다.
+    """
+    errors = []
+    for name, spec in _chain_specs.items():
+        prompt = spec['prompt']
+        provided = set(spec['input_variables']) | set(prompt.partial_variables)
+        missing = spec['template_variables'] - provided
+        if missing:
+            errors.append(f"{name}: {sorted(missing)}")
+    if errors:
+        raise ValueError("체인 입력 변수가 누락되었습니다: " + ", ".join(errors))
+    return list(_chain_specs)
+
+
+def get_chain_version(name):
+    """
+    등록된 체인의 프롬프트 버전(프롬프트 내용의 해시)을 반환합니다.
+    """
+    if name not in _chain_specs:
+        raise KeyError(f"등록되지 않은 체인입니다: {name}")
+    return _chain_specs[name]['version']
+
+
+def get_chain(name, model=None, with_parser=True):
+    """
+    등록된 체인을 반환합니다. 모델별로 최초 한 번만 구성하고 이후에는 재사용합니다.
+
+    Args:
+        name (str): 등록된 체인 이름
+        model (optional): 사용할 모델. 기본값은 get_langchain_model()
+        with_parser (bool): False이면 파서 없이 프롬프트 + 모델만 구성 (스트리밍용)
+
+    Returns:
+        Runnable: invoke/ainvoke/stream/batch를 바로 호출할 수 있는 체인
+    """
+    if name not in _chain_specs:
+        raise KeyError(f"등록되지 않은 체인입니다: {name}")
+    if model is None:
+        model = get_langchain_model()
+
+    key = (name, id(model), with_parser)
+    entry = _chains.get(key)
+    if entry is None or entry[0] is not model:
+        with _chains_lock:
+            entry = _chains.get(key)
+            if entry is None or entry[0] is not model:
+                chain = _chain_specs[name]['prompt'].pipe(model)
+                if with_parser:
+                    chain = chain.pipe(_json_parser)
+                # 모델 참조를 함께 보관하여 id 재사용으로 인한 충돌을 방지
+                entry = (model, chain)
+                _chains[key] = entry
+    return entry[1]
+
+
+def get_routed_chain(name, route, with_parser=True):
+    """
+    라우터가 선택한 모델로 구성된 등록 체인을 반환합니다.
+
+    Args:
+        name (str): 등록된 체인 이름
+        route (dict): route_request()의 결과
+        with_parser (bool): False이면 파서 없이 프롬프트 + 모델만 구성 (스트리밍용)
+    """
+    return get_chain(name, get_model(route['model'], route['max_tokens']), with_parser)
+
+
+def get_routed_chains(name, routes, endpoint):
+    """
+    배치 항목별로 선택된 라우트의 체인을 반환합니다. (라우트별 토큰 사용량 콜백이 지정됨)
+
+    Args:
+        name (str): 등록된 체인 이름
+        routes (list): 항목별 route_request()의 결과
+        endpoint (str): 토큰 사용량을 기록할 엔드포인트 이름
+
+    Returns:
+        dict: 라우트 이름 -> 체인
+    """
+    chains = {}
+    for route in routes:
+        if route['name'] not in chains:
+            chains[route['name']] = get_routed_chain(name, route).with_config(callbacks=[TokenUsageCallbackHandler(endpoint, route)])
+    return chains
+
+
+def warm_chains(model=None):
+    """
+    등록된 모든 체인을 미리 구성합니다.
+    """
+    for name in _chain_specs:
+        get_chain(name, model)
+        get_chain(name, model, with_parser=False)
+
+
+# Anthropic 프롬프트 캐시 사용 여부
+# 캐시되는 앞부분이 모델별 최소 길이(Sonnet/Opus 1024 토큰, Haiku 2048 토큰)보다 짧으면 Anthropic에서 캐시하지 않으므로
+# 앞부분이 PROMPT_CACHE_MIN_TOKENS보다 짧은 프롬프트는 cache_control을 지정하지 않습니다.
+# (현재 프롬프트의 앞부분은 모두 최소 길이보다 짧아 캐시되지 않으며, 앞부분이 길어지면 자동으로 캐시 대상이 됩니다.
+#  Haiku는 2048 토큰 미만이면 cache_control이 지정되어도 캐시되지 않습니다.)
+PROMPT_CACHE_ENABLED = os.getenv('LANGCHAIN_PROMPT_CACHE', 'True') == 'True'
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv('LANGCHAIN_PROMPT_CACHE_MIN_TOKENS', 1024))
+
+
+def set_cached_prompt(prefix, suffix, input_variables=None, partial_variables=None, image_variable=None, cache=True):
+    """
+    앞부분(prefix)은 캐시 가능한 system 메시지로, 뒷부분(suffix)은 human 메시지 템플릿으로 구성한
+    ChatPromptTemplate을 생성합니다.
+
+    prefix는 partial_variables만 사용할 수 있으며 생성 시 한 번 렌더링되어
+    cache_control이 지정된 content block으로 고정됩니다.
+
+    Args:
+        prefix (str): 요청마다 동일한 앞부분 템플릿
+        suffix (str): 요청마다 바뀌는 뒷부분 템플릿
+        input_variables (list, optional): 호출 시 전달하는 입력 변수
+        partial_variables (dict, optional): 미리 채워 둘 변수
+        image_variable (str, optional): 이미지 data URL을 받는 입력 변수. human 메시지에 image content block으로 추가
+        cache (bool): False이면 cache_control을 지정하지 않음. True여도 앞부분이 PROMPT_CACHE_MIN_TOKENS보다 짧으면 지정하지 않음
+
+    Returns:
+        ChatPromptTemplate: [SystemMessage(prefix, cache_control), HumanMessage([image], suffix)]
+    """
+    if input_variables is None or not isinstance(input_variables, list):
+        input_variables = []
+    if partial_variables is None or not isinstance(partial_variables, dict):
+        partial_variables = {}
+
+    prefix_template = PromptTemplate.from_template(prefix)
+    missing = set(prefix_template.input_variables) - set(partial_variables)
+    if missing:
+        raise ValueError(f"캐시되는 프롬프트 앞부분에는 partial 변수만 사용할 수 있습니다: {sorted(missing)}")
+    prefix_text = prefix_template.format(**{key: partial_variables[key] for key in prefix_template.input_variables})
+
+    suffix_variables = set(PromptTemplate.from_template(suffix).input_variables)
+    system_block = {"type": "text", "text": prefix_text}
+    if cache and calculate_tokens(prefix_text) >= PROMPT_CACHE_MIN_TOKENS:
+        system_block["cache_control"] = {"type": "ephemeral"}
+
+    human = suffix
+    if image_variable:
+        # 이미지는 텍스트가 아닌 image content block으로 전달
+        suffix_variables.add(image_variable)
+        human = [
+            {"type": "image_url", "image_url": {"url": f"{{{image_variable}}}"}},
+            {"type": "text", "text": suffix},
+        ]
+
+    return ChatPromptTemplate(
+        messages=[
+            SystemMessage(content=[system_block]),
+            ("human", human),
+        ],
+        input_variables=[variable for variable in input_variables if variable in suffix_variables],
+        partial_variables={key: value for key, value in partial_variables.items() if key in suffix_variables},
+    )
+
+
 def set_chat_prompt(messages, input_variables=None, partial_variables=None) :
     """
         ChatPromptTemplate 생성 메소드
@@ -122,6 +650,50 @@ def calculate_tokens(text):
     return len(text) // 3
 
 
+def extract_usage(message):
+    """
+    AIMessage의 usage_metadata / response_metadata에서 실제 토큰 사용량을 추출합니다.
+
+    Args:
+        message: LangChain 모델의 응답 메시지 (AIMessage 등)
+
+    Returns:
+        dict: input_tokens(캐시 제외), cache_creation_input_tokens, cache_read_input_tokens,
+              output_tokens, total_tokens, model_name, is_estimated
+              사용량 정보가 없는 경우 None
+    """
+    response_metadata = getattr(message, 'response_metadata', None) or {}
+    model_name = response_metadata.get('model') or response_metadata.get('model_name')
+
+    # Anthropic 원본 usage (input_tokens에 캐시 토큰이 포함되지 않음)
+    raw = response_metadata.get('usage')
+    if isinstance(raw, dict) and 'input_tokens' in raw:
+        input_tokens = raw.get('input_tokens') or 0
+        cache_creation = raw.get('cache_creation_input_tokens') or 0
+        cache_read = raw.get('cache_read_input_tokens') or 0
+        output_tokens = raw.get('output_tokens') or 0
+    else:
+        # LangChain usage_metadata (input_tokens에 캐시 토큰이 포함됨)
+        usage_metadata = getattr(message, 'usage_metadata', None)
+        if not usage_metadata:
+            return None
+        details = usage_metadata.get('input_token_details') or {}
+        cache_creation = details.get('cache_creation') or 0
+        cache_read = details.get('cache_read') or 0
+        input_tokens = max((usage_metadata.get('input_tokens') or 0) - cache_creation - cache_read, 0)
+        output_tokens = usage_metadata.get('output_tokens') or 0
+
+    return {
+        'input_tokens': input_tokens,
+        'cache_creation_input_tokens': cache_creation,
+        'cache_read_input_tokens': cache_read,
+        'output_tokens': output_tokens,
+        'total_tokens': input_tokens + cache_creation + cache_read + output_tokens,
+        'model_name': model_name,
+        'is_estimated': False
+    }
+
+
 def get_token_usage_from_response(response):
     """
     LangChain 응답에서 토큰 사용량 정보를 추출합니다.
@@ -133,6 +705,10 @@ def get_token_usage_from_response(response):
     Returns:
         dict: 입력 토큰 수, 출력 토큰 수, 총 토큰 수를 포함하는 딕셔너리
     """
+    usage = extract_usage(response)
+    if usage is not None:
+        return usage
+
     # 응답 텍스트 추출
     response_text = ""
     if hasattr(response, 'content'):
@@ -160,12 +736,32 @@ def get_token_usage_from_response(response):
     }
 
 
+# 모델별 가격 정보 (1K 토큰당 USD)
+# 2024년 6월 기준 가격, 변경될 수 있음
+MODEL_PRICING = {
+    "claude-3-5-sonnet-20240620": {"input": 3.00 / 1000, "output": 15.00 / 1000},
+    "claude-3-opus-20240229": {"input": 15.00 / 1000, "output": 75.00 / 1000},
+    "claude-3-sonnet-20240229": {"input": 3.00 / 1000, "output": 15.00 / 1000},
+    "claude-3-haiku-20240307": {"input": 0.25 / 1000, "output": 1.25 / 1000},
+    "claude-2.1": {"input": 8.00 / 1000, "output": 24.00 / 1000},
+    "claude-2.0": {"input": 8.00 / 1000, "output": 24.00 / 1000},
+    "claude-instant-1.2": {"input": 1.63 / 1000, "output": 5.51 / 1000}
+}
+
+# 기본 가격 (모델이 목록에 없는 경우)
+DEFAULT_PRICING = {"input": 3.00 / 1000, "output": 15.00 / 1000}
+
+# 프롬프트 캐시 쓰기/읽기 가격 배율 (입력 토큰 가격 기준)
+CACHE_CREATION_PRICE_RATIO = 1.25
+CACHE_READ_PRICE_RATIO = 0.1
+
+
 def estimate_token_cost(usage, model_name=None):
     """
     토큰 사용량에 따른 예상 비용을 계산합니다.
     
     Args:
-        usage (dict): 토큰 사용량 정보 (input_tokens, output_tokens)
+        usage (dict): 토큰 사용량 정보 (input_tokens, output_tokens, cache_creation_input_tokens, cache_read_input_tokens)
         model_name (str, optional): 모델 이름. 기본값은 현재 설정된 모델
         
     Returns:
@@ -173,39 +769,1513 @@ def estimate_token_cost(usage, model_name=None):
     """
     if model_name is None:
         model = get_langchain_model()
-        model_name = model.model_name if hasattr(model, 'model_name') else "claude-3-5-sonnet-20240620"
+        model_name = model.model if hasattr(model, 'model') else DEFAULT_MODEL_NAME
     
     # 추정 여부 확인
     is_estimated = usage.get('is_estimated', False)
     
-    # 모델별 가격 정보 (1K 토큰당 USD)
-    # 2024년 6월 기준 가격, 변경될 수 있음
-    pricing = {
-        "claude-3-5-sonnet-20240620": {"input": 3.00 / 1000, "output": 15.00 / 1000},
-        "claude-3-opus-20240229": {"input": 15.00 / 1000, "output": 75.00 / 1000},
-        "claude-3-sonnet-20240229": {"input": 3.00 / 1000, "output": 15.00 / 1000},
-        "claude-3-haiku-20240307": {"input": 0.25 / 1000, "output": 1.25 / 1000},
-        "claude-2.1": {"input": 8.00 / 1000, "output": 24.00 / 1000},
-        "claude-2.0": {"input": 8.00 / 1000, "output": 24.00 / 1000},
-        "claude-instant-1.2": {"input": 1.63 / 1000, "output": 5.51 / 1000}
-    }
-    
-    # 기본 가격 (모델이 목록에 없는 경우)
-    default_pricing = {"input": 3.00 / 1000, "output": 15.00 / 1000}
-    
-    model_pricing = pricing.get(model_name, default_pricing)
+    model_pricing = MODEL_PRICING.get(model_name, DEFAULT_PRICING)
     
     input_tokens = usage.get('input_tokens', 0)
     output_tokens = usage.get('output_tokens', 0)
+    cache_creation_tokens = usage.get('cache_creation_input_tokens', 0)
+    cache_read_tokens = usage.get('cache_read_input_tokens', 0)
     
     input_cost = input_tokens * model_pricing["input"]
+    cache_creation_cost = cache_creation_tokens * model_pricing["input"] * CACHE_CREATION_PRICE_RATIO
+    cache_read_cost = cache_read_tokens * model_pricing["input"] * CACHE_READ_PRICE_RATIO
     output_cost = output_tokens * model_pricing["output"]
-    total_cost = input_cost + output_cost
+    total_cost = input_cost + cache_creation_cost + cache_read_cost + output_cost
     
     return {
         'input_cost': input_cost,
+        'cache_creation_cost': cache_creation_cost,
+        'cache_read_cost': cache_read_cost,
         'output_cost': output_cost,
         'total_cost': total_cost,
         'currency': 'USD',
         'is_estimated': is_estimated
     }
+
+
+USAGE_FIELDS = ('input_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens', 'output_tokens', 'total_tokens')
+
+# 엔드포인트별 누적 토큰 사용량
+_endpoint_usage = {}
+_endpoint_usage_lock = threading.Lock()
+
+
+def sum_usage(usages):
+    """
+    여러 토큰 사용량 딕셔너리를 합산합니다.
+    """
+    total = {field: 0 for field in USAGE_FIELDS}
+    for usage in usages:
+        for field in USAGE_FIELDS:
+            total[field] += usage.get(field, 0) or 0
+    return total
+
+
+def record_endpoint_usage(endpoint, usage, model_name=None):
+    """
+    엔드포인트별 누적 토큰 사용량과 비용을 기록합니다.
+    """
+    cost = estimate_token_cost(usage, model_name or usage.get('model_name') or DEFAULT_MODEL_NAME)
+    with _endpoint_usage_lock:
+        entry = _endpoint_usage.setdefault(endpoint, {
+            'calls': 0, 'total_cost': 0.0, 'prompt_cache_hits': 0, 'prompt_cache_writes': 0,
+            **{field: 0 for field in USAGE_FIELDS}
+        })
+        entry['calls'] += 1
+        entry['total_cost'] += cost['total_cost']
+        # Anthropic 프롬프트 캐시 적중/생성 횟수
+        if usage.get('cache_read_input_tokens'):
+            entry['prompt_cache_hits'] += 1
+        if usage.get('cache_creation_input_tokens'):
+            entry['prompt_cache_writes'] += 1
+        for field in USAGE_FIELDS:
+            entry[field] += usage.get(field, 0) or 0
+
+
+def get_endpoint_usage():
+    """
+    엔드포인트별 누적 토큰 사용량을 반환합니다.
+    """
+    with _endpoint_usage_lock:
+        usage = {endpoint: dict(entry) for endpoint, entry in _endpoint_usage.items()}
+    for entry in usage.values():
+        entry['prompt_cache_hit_rate'] = entry['prompt_cache_hits'] / entry['calls'] if entry['calls'] else 0.0
+    return usage
+
+
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+    """
+    체인 실행 중 모델 호출마다 실제 토큰 사용량을 수집하는 콜백 핸들러
+    JsonOutputParser가 메시지를 dict로 바꾸기 전에 usage 정보를 가로챕니다.
+
+    RunnableParallel의 하위 체인은 'map:key:<이름>' 태그로 구분하여 하위 체인별로 집계합니다.
+
+    route를 지정하면 모델 호출마다 지연 시간과 비용을 라우트별로 기록합니다.
+
+        handler = TokenUsageCallbackHandler('req_ui_component', route)
+        chain.invoke(inputs, config={'callbacks': [handler]})
+        handler.summary()
+    """
+
+    # 지연 시간 지표로 기록할 체인 단계 (run_type -> 단계 이름, utils.metrics)
+    CHAIN_STAGES = {'prompt': 'prompt_build', 'parser': 'parse'}
+
+    def __init__(self, endpoint=None, route=None):
+        self.endpoint = endpoint
+        self.route = route
+        self.calls = []
+        self._labels = {}
+        self._starts = {}
+        self._models = {}
+        self._first_tokens = set()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def _metric_labels(self, model=''):
+        # 요청 중이면 HTTP 엔드포인트, 아니면(작업 워커 등) 핸들러의 엔드포인트
+        return {'endpoint': get_current_endpoint() or self.endpoint or 'none', 'model': model or (self.route or {}).get('model', '')}
+
+    def _start_model(self, run_id, kwargs):
+        params = kwargs.get('invocation_params') or {}
+        self._models[run_id] = params.get('model') or params.get('model_name') or (self.route or {}).get('model', '')
+        self._starts[run_id] = time.perf_counter()
+
+    def _end_stage(self, run_id):
+        entry = self._stages.pop(run_id, None)
+        if entry is not None:
+            stage, start = entry
+            observe_stage(stage, time.perf_counter() - start, **self._metric_labels())
+
+    def _track(self, run_id, parent_run_id, tags):
+        # 병렬 키 태그는 하위 체인(RunnableSequence)에만 붙으므로 부모 실행의 이름을 상속
+        with self._lock:
+            label = self._labels.get(parent_run_id)
+            for tag in tags or []:
+                if tag.startswith('map:key:'):
+                    label = tag[len('map:key:'):]
+            self._labels[run_id] = label
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, **kwargs):
+        self._track(run_id, parent_run_id, tags)
+        stage = self.CHAIN_STAGES.get(kwargs.get('run_type'))
+        if stage is not None:
+            self._stages[run_id] = (stage, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_stage(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_stage(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, **kwargs):
+        self._track(run_id, parent_run_id, tags)
+        self._start_model(run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, tags=None, **kwargs):
+        self._track(run_id, parent_run_id, tags)
+        self._start_model(run_id, kwargs)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        # 스트리밍 호출에서만 발생하므로 첫 토큰 시간은 스트리밍 엔드포인트에서만 기록됨
+        start = self._starts.get(run_id)
+        if start is None or run_id in self._first_tokens:
+            return
+        self._first_tokens.add(run_id)
+        observe_stage('llm_first_token', time.perf_counter() - start, **self._metric_labels(self._models.get(run_id)))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        self._first_tokens.discard(run_id)
+        labels = self._metric_labels(self._models.pop(run_id, ''))
+        if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+            # 스트리밍 엔드포인트는 응답이 완성되면 남은 생성을 중단하므로 오류가 아닌 취소로 기록
+            LLM_CALLS.inc(status='cancelled', **labels)
+            if start is not None:
+                observe_stage('llm_total', time.perf_counter() - start, **labels)
+            return
+        LLM_CALLS.inc(status='error', **labels)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        latency = time.perf_counter() - start if start is not None else None
+        self._first_tokens.discard(run_id)
+        labels = self._metric_labels(self._models.pop(run_id, ''))
+        LLM_CALLS.inc(status='success', **labels)
+        if latency is not None:
+            observe_stage('llm_total', latency, **labels)
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, 'message', None)
+                usage = extract_usage(message) if message is not None else None
+                if usage is None:
+                    continue
+                with self._lock:
+                    label = self._labels.get(run_id)
+                    self.calls.append({'chain': label, **usage})
+                for field in USAGE_FIELDS:
+                    if field != 'total_tokens' and usage.get(field):
+                        LLM_TOKENS.inc(usage[field], type=field, **labels)
+                if self.endpoint:
+                    record_endpoint_usage(self.endpoint, usage)
+                if self.route:
+                    record_route_usage(self.route['name'], usage, latency)
+
+    @property
+    def total(self):
+        with self._lock:
+            return sum_usage(self.calls)
+
+    def by_chain(self):
+        """
+        하위 체인 이름별 토큰 사용량을 반환합니다.
+        """
+        with self._lock:
+            grouped = {}
+            for call in self.calls:
+                grouped.setdefault(call['chain'], []).append(call)
+        return {label: sum_usage(calls) for label, calls in grouped.items()}
+
+    def summary(self, model_name=None):
+        """
+        요청 전체와 하위 체인별 토큰 사용량, 비용을 반환합니다.
+        """
+        total = self.total
+        if model_name is None and self.calls:
+            model_name = self.calls[0].get('model_name')
+        return {
+            'by_chain': self.by_chain(),
+            'total': total,
+            'cost': estimate_token_cost(total, model_name or DEFAULT_MODEL_NAME),
+            'calls': len(self.calls)
+        }
+
+
+# 모델 라우터
+# 요청의 크기/복잡도(architecture 노드 수, 프롬프트 토큰 수)와 엔드포인트별 정책으로 모델 등급을 선택합니다.
+# LANGCHAIN_ROUTER=False이면 모든 요청에 기본 등급을 사용합니다.
+ROUTER_ENABLED = os.getenv('LANGCHAIN_ROUTER', 'True') == 'True'
+
+MODEL_TIERS = {
+    'haiku': {'model': os.getenv('LANGCHAIN_MODEL_HAIKU', "claude-3-haiku-20240307"), 'max_tokens': 2000},
+    'sonnet': {'model': os.getenv('LANGCHAIN_MODEL_SONNET', DEFAULT_MODEL_NAME), 'max_tokens': DEFAULT_MAX_TOKENS},
+    'opus': {'model': os.getenv('LANGCHAIN_MODEL_OPUS', "claude-3-opus-20240229"), 'max_tokens': DEFAULT_MAX_TOKENS},
+}
+DEFAULT_MODEL_TIER = 'sonnet'
+
+# 엔드포인트별 라우팅 정책
+# tier: 기본 등급, max_tokens: 최대 출력 토큰 수 (없으면 등급 기본값)
+# rules: 위에서부터 처음 만족하는 규칙의 등급을 사용 (max_nodes, max_prompt_tokens 이하인 요청)
+# hedge: True이면 느린 요청에 헤징 요청을 추가로 보냄 (hedged_invoke 참고)
+# 환경 변수 LANGCHAIN_ROUTE_<정책 이름>=haiku 로 등급을 고정할 수 있습니다.
+ROUTE_POLICIES = {
+    # 설명이 짧은 단일 컴포넌트는 Haiku로 생성
+    'req_ui_component': {'tier': 'sonnet', 'rules': [{'tier': 'haiku', 'max_nodes': 1, 'max_prompt_tokens': 120}], 'hedge': True},
+    # 컴포넌트 라이브러리의 비슷한 컴포넌트 수정은 변경된 부분만 반영하면 되므로 Haiku 사용
+    'req_ui_component_edit': {'tier': 'haiku'},
+    # 사주풀이 항목별 요청은 짧은 문장 하나만 생성하므로 Haiku 사용
+    'fortune_item': {'tier': 'haiku', 'max_tokens': 1000},
+    'req_parse_image': {'tier': 'sonnet'},
+    'req_analyze_image': {'tier': 'sonnet'},
+}
+
+# 라우트별 지연 시간 기록 개수 (백분위 계산용)
+ROUTE_LATENCY_WINDOW = int(os.getenv('LANGCHAIN_ROUTE_LATENCY_WINDOW', 200))
+
+# 라우트별 누적 지연 시간/비용
+_route_stats = {}
+_route_stats_lock = threading.Lock()
+
+
+def count_architecture_nodes(architecture):
+    """
+    architecture에 포함된 노드(dict) 수를 셉니다. (하위 목록 포함)
+    """
+    if isinstance(architecture, dict):
+        return 1 + sum(count_architecture_nodes(value) for value in architecture.values())
+    if isinstance(architecture, list):
+        return sum(count_architecture_nodes(value) for value in architecture)
+    return 0
+
+
+def route_request(policy_name, architecture=None, prompt_tokens=None):
+    """
+    요청 특성과 정책에 따라 사용할 모델을 선택합니다.
+
+    Args:
+        policy_name (str): ROUTE_POLICIES의 정책 이름 (보통 엔드포인트 이름)
+        architecture (optional): 요청 architecture. 노드 수와 프롬프트 토큰 수 계산에 사용
+        prompt_tokens (int, optional): 요청마다 바뀌는 프롬프트의 토큰 수. 없으면 architecture로 추정
+
+    Returns:
+        dict: name(라우트 이름), policy, tier, model, max_tokens, nodes, prompt_tokens
+    """
+    policy = ROUTE_POLICIES.get(policy_name, {})
+    nodes = count_architecture_nodes(architecture)
+    if prompt_tokens is None:
+        prompt_tokens = calculate_tokens(json.dumps(architecture, ensure_ascii=False)) if architecture is not None else 0
+
+    tier = policy.get('tier', DEFAULT_MODEL_TIER)
+    if ROUTER_ENABLED:
+        for rule in policy.get('rules', []):
+            if nodes <= rule.get('max_nodes', nodes) and prompt_tokens <= rule.get('max_prompt_tokens', prompt_tokens):
+                tier = rule['tier']
+                break
+        tier = os.getenv(f'LANGCHAIN_ROUTE_{policy_name.upper()}', tier)
+    else:
+        tier = DEFAULT_MODEL_TIER
+    if tier not in MODEL_TIERS:
+        print(f"알 수 없는 모델 등급입니다: {tier} (기본 등급 사용)")
+        tier = DEFAULT_MODEL_TIER
+
+    return {
+        'name': f"{policy_name}:{tier}",
+        'policy': policy_name,
+        'tier': tier,
+        'model': MODEL_TIERS[tier]['model'],
+        'max_tokens': (policy.get('max_tokens') if ROUTER_ENABLED else None) or MODEL_TIERS[tier]['max_tokens'],
+        'nodes': nodes,
+        'prompt_tokens': prompt_tokens,
+    }
+
+
+def record_route_usage(route_name, usage, latency=None):
+    """
+    라우트별 호출 수, 지연 시간, 토큰 사용량, 비용을 기록합니다.
+    """
+    cost = estimate_token_cost(usage, usage.get('model_name') or DEFAULT_MODEL_NAME)
+    with _route_stats_lock:
+        entry = _route_stats.setdefault(route_name, {
+            'calls': 0, 'total_cost': 0.0, 'total_latency': 0.0,
+            'latencies': deque(maxlen=ROUTE_LATENCY_WINDOW),
+            **{field: 0 for field in USAGE_FIELDS}
+        })
+        entry['calls'] += 1
+        entry['total_cost'] += cost['total_cost']
+        if latency is not None:
+            entry['total_latency'] += latency
+            entry['latencies'].append(latency)
+        for field in USAGE_FIELDS:
+            entry[field] += usage.get(field, 0) or 0
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def get_route_stats():
+    """
+    라우트별 누적 통계를 반환합니다. (평균/p50/p90 지연 시간, 평균 비용 포함)
+    """
+    with _route_stats_lock:
+        stats = {name: {**entry, 'latencies': list(entry['latencies'])} for name, entry in _route_stats.items()}
+    for entry in stats.values():
+        latencies = entry.pop('latencies')
+        entry['avg_latency'] = sum(latencies) / len(latencies) if latencies else None
+        entry['p50_latency'] = _percentile(latencies, 0.5)
+        entry['p90_latency'] = _percentile(latencies, 0.9)
+        entry['avg_cost'] = entry['total_cost'] / entry['calls'] if entry['calls'] else 0.0
+    return stats
+
+
+# 요청 헤징
+# 정책에서 hedge를 켠 라우트는 응답이 관측된 p90 지연 시간 안에 오지 않으면 같은 요청을 한 번 더 보내고,
+# 먼저 끝난 응답을 사용합니다. 헤징 요청 수는 해당 라우트 요청의 HEDGE_BUDGET 비율로 제한합니다.
+HEDGE_ENABLED = os.getenv('LANGCHAIN_HEDGE', 'True') == 'True'
+HEDGE_BUDGET = float(os.getenv('LANGCHAIN_HEDGE_BUDGET', 0.05))
+HEDGE_QUANTILE = float(os.getenv('LANGCHAIN_HEDGE_QUANTILE', 0.9))
+# 지연 시간 표본이 이보다 적으면 헤징하지 않음
+HEDGE_MIN_SAMPLES = int(os.getenv('LANGCHAIN_HEDGE_MIN_SAMPLES', 20))
+HEDGE_MIN_DELAY = float(os.getenv('LANGCHAIN_HEDGE_MIN_DELAY', 1.0))
+HEDGE_MAX_WORKERS = int(os.getenv('LANGCHAIN_HEDGE_MAX_WORKERS', 32))
+
+_hedge_stats = {}
+_hedge_lock = threading.Lock()
+_hedge_executor = None
+
+
+def get_route_latency(route_name, quantile, min_samples=HEDGE_MIN_SAMPLES):
+    """
+    라우트의 최근 지연 시간 백분위 값을 반환합니다. 표본이 부족하면 None을 반환합니다.
+    """
+    with _route_stats_lock:
+        entry = _route_stats.get(route_name)
+        latencies = list(entry['latencies']) if entry else []
+    if len(latencies) < max(1, min_samples):
+        return None
+    return _percentile(latencies, quantile)
+
+
+def get_hedge_delay(route):
+    """
+    헤징 요청을 보내기 전까지 기다릴 시간(초)을 반환합니다. 헤징 대상이 아니면 None을 반환합니다.
+    """
+    if not HEDGE_ENABLED or not ROUTE_POLICIES.get(route['policy'], {}).get('hedge'):
+        return None
+    latency = get_route_latency(route['name'], HEDGE_QUANTILE)
+    if latency is None:
+        return None
+    return max(latency, HEDGE_MIN_DELAY)
+
+
+def _record_hedge(route_name, field):
+    with _hedge_lock:
+        entry = _hedge_stats.setdefault(route_name, {
+            'calls': 0, 'hedged': 0, 'budget_skips': 0, 'primary_wins': 0, 'hedge_wins': 0, 'errors': 0
+        })
+        entry[field] += 1
+
+
+def _take_hedge_budget(route_name):
+    """
+    헤징 예산이 남아 있으면 차감하고 True를 반환합니다.
+    """
+    with _hedge_lock:
+        entry = _hedge_stats[route_name]
+        if entry['hedged'] + 1 > entry['calls'] * HEDGE_BUDGET:
+            entry['budget_skips'] += 1
+            return False
+        entry['hedged'] += 1
+        return True
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix='langchain-hedge')
+    return _hedge_executor
+
+
+def hedged_invoke(chain, inputs, route, config=None):
+    """
+    chain.invoke에 헤징을 적용합니다.
+    라우트의 p90 지연 시간 안에 응답이 없으면 같은 요청을 한 번 더 보내고 먼저 성공한 결과를 반환합니다.
+
+    동기 호출은 실행 중인 스레드를 중단할 수 없으므로 늦게 끝난 요청의 결과는 버립니다.
+
+    Args:
+        chain: 실행할 Runnable
+        inputs (dict): 체인 입력
+        route (dict): route_request()의 결과
+        config (dict, optional): 체인 실행 설정 (callbacks 등)
+    """
+    delay = get_hedge_delay(route)
+    if delay is None:
+        return chain.invoke(inputs, config=config)
+
+    name = route['name']
+    _record_hedge(name, 'calls')
+    executor = _get_hedge_executor()
+    # 호출한 스레드의 contextvars(콜백, 추적 정보 등)를 헤징 스레드에서도 유지
+    primary = executor.submit(contextvars.copy_context().run, chain.invoke, inputs, config)
+    done, _ = wait([primary], timeout=delay)
+    if done or not _take_hedge_budget(name):
+        return primary.result()
+
+    print(f"{name} 응답이 {delay:.2f}초 안에 오지 않아 헤징 요청을 보냅니다.")
+    hedge = executor.submit(contextvars.copy_context().run, chain.invoke, inputs, config)
+    outcomes = {primary: 'primary_wins', hedge: 'hedge_wins'}
+    pending = set(outcomes)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                _record_hedge(name, outcomes[future])
+                return future.result()
+            _record_hedge(name, 'errors')
+            error = error or future.exception()
+    raise error
+
+
+async def ahedged_invoke(chain, inputs, route, config=None):
+    """
+    hedged_invoke의 비동기 버전
+    먼저 성공한 결과를 반환하고 나머지 요청은 취소합니다.
+    """
+    delay = get_hedge_delay(route)
+    if delay is None:
+        return await chain.ainvoke(inputs, config=config)
+
+    name = route['name']
+    _record_hedge(name, 'calls')
+    primary = asyncio.ensure_future(chain.ainvoke(inputs, config=config))
+    outcomes = {primary: 'primary_wins'}
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not _take_hedge_budget(name):
+            return await primary
+
+        print(f"{name} 응답이 {delay:.2f}초 안에 오지 않아 헤징 요청을 보냅니다.")
+        hedge = asyncio.ensure_future(chain.ainvoke(inputs, config=config))
+        outcomes[hedge] = 'hedge_wins'
+        pending = set(outcomes)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    _record_hedge(name, outcomes[task])
+                    return task.result()
+                _record_hedge(name, 'errors')
+                error = error or task.exception()
+        raise error
+    finally:
+        # 늦게 끝난 요청(또는 요청 자체가 취소된 경우 모든 요청)을 취소
+        for task in outcomes:
+            if not task.done():
+                task.cancel()
+
+
+def get_hedge_stats():
+    """
+    라우트별 헤징 통계를 반환합니다. (헤징 비율, 헤징 요청의 승률 포함)
+    """
+    with _hedge_lock:
+        stats = {name: dict(entry) for name, entry in _hedge_stats.items()}
+    for entry in stats.values():
+        entry['hedge_rate'] = entry['hedged'] / entry['calls'] if entry['calls'] else 0.0
+        entry['hedge_win_rate'] = entry['hedge_wins'] / entry['hedged'] if entry['hedged'] else 0.0
+    return stats
+
+
+# 항목 묶음(packing) 계획
+# 여러 항목을 K번의 호출로 나눠 요청할 때, K별로 측정한 지연 시간과 비용으로 K를 선택합니다.
+# 점수 = 평균 지연 시간(초) + 평균 비용(USD) x PACKING_COST_WEIGHT (기본값: 1센트 = 1초)
+PACKING_COST_WEIGHT = float(os.getenv('LANGCHAIN_PACKING_COST_WEIGHT', 100))
+# 후보별로 이 횟수만큼 측정한 뒤부터 점수로 선택
+PACKING_MIN_SAMPLES = int(os.getenv('LANGCHAIN_PACKING_MIN_SAMPLES', 3))
+
+_packing_stats = {}
+_packing_lock = threading.Lock()
+
+
+def pack_items(items, pack_count):
+    """
+    항목 목록을 순서를 유지한 채 크기가 거의 같은 pack_count개의 묶음으로 나눕니다.
+    """
+    pack_count = max(1, min(pack_count, len(items)))
+    size, extra = divmod(len(items), pack_count)
+    packs = []
+    start = 0
+    for index in range(pack_count):
+        end = start + size + (1 if index < extra else 0)
+        packs.append(items[start:end])
+        start = end
+    return packs
+
+
+def record_packing_result(name, pack_count, latency, cost):
+    """
+    묶음 수(K)별 실행 결과(지연 시간, 비용)를 기록합니다.
+    """
+    with _packing_lock:
+        entry = _packing_stats.setdefault(name, {}).setdefault(pack_count, {
+            'latencies': deque(maxlen=ROUTE_LATENCY_WINDOW), 'costs': deque(maxlen=ROUTE_LATENCY_WINDOW)
+        })
+        entry['latencies'].append(latency)
+        entry['costs'].append(cost)
+
+
+def get_packing_stats(name=None):
+    """
+    묶음 수(K)별 평균 지연 시간, 평균 비용, 점수를 반환합니다.
+    """
+    with _packing_lock:
+        names = [name] if name is not None else list(_packing_stats)
+        stats = {
+            key: {
+                pack_count: {'samples': len(entry['latencies']), 'avg_latency': sum(entry['latencies']) / len(entry['latencies']), 'avg_cost': sum(entry['costs']) / len(entry['costs'])}
+                for pack_count, entry in _packing_stats.get(key, {}).items() if entry['latencies']
+            }
+            for key in names
+        }
+    for plans in stats.values():
+        for entry in plans.values():
+            entry['score'] = entry['avg_latency'] + entry['avg_cost'] * PACKING_COST_WEIGHT
+    return stats[name] if name is not None else stats
+
+
+def choose_pack_count(name, candidates):
+    """
+    측정 결과로 묶음 수(K)를 선택합니다.
+    표본이 부족한 후보가 있으면 그 후보를 먼저 측정하고, 모두 측정되면 점수가 가장 낮은 K를 반환합니다.
+    """
+    stats = get_packing_stats(name)
+    for pack_count in candidates:
+        if stats.get(pack_count, {}).get('samples', 0) < PACKING_MIN_SAMPLES:
+            return pack_count
+    return min(candidates, key=lambda pack_count: stats[pack_count]['score'])
+
+
+# 응답 캐시 설정
+# architecture에서 요청마다 바뀌는 id 값들 (캐시 키 계산 시 제외)
+VOLATILE_ARCHITECTURE_KEYS = ('newId', 'targetId', 'parentElId', 'curElId')
+RESPONSE_CACHE_TTL = int(os.getenv('LANGCHAIN_CACHE_TTL', 60 * 60 * 24))
+RESPONSE_CACHE_MEMORY_SIZE = int(os.getenv('LANGCHAIN_CACHE_MEMORY_SIZE', 256))
+RESPONSE_CACHE_DISK_SIZE = int(os.getenv('LANGCHAIN_CACHE_DISK_SIZE', 5000))
+RESPONSE_CACHE_PATH = os.getenv(
+    'LANGCHAIN_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'langchain_cache.sqlite3')
+)
+
+# 전역 변수로 캐시 인스턴스 저장
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def canonicalize_architecture(architecture):
+    """
+    architecture 딕셔너리에서 요청마다 바뀌는 id 값을 제거하고 정규화합니다.
+
+    Args:
+        architecture (dict): 클라이언트에서 받은 architecture
+
+    Returns:
+        tuple: (id가 제거된 architecture, 제거된 id 값 딕셔너리)
+    """
+    volatile = {}
+
+    def strip(value):
+        if isinstance(value, dict):
+            result = {}
+            for key, item in value.items():
+                if key in VOLATILE_ARCHITECTURE_KEYS:
+                    # 최상위 id 값만 복원 대상으로 기록
+                    if value is architecture and isinstance(item, str) and item:
+                        volatile[key] = item
+                    continue
+                result[key] = strip(item)
+            return result
+        if isinstance(value, list):
+            return [strip(item) for item in value]
+        return value
+
+    return strip(architecture), volatile
+
+
+def hash_canonical(namespace, value):
+    """
+    정규화된 값을 정렬된 JSON으로 직렬화한 뒤 SHA-256 해시를 계산합니다.
+
+    Args:
+        namespace (str): 캐시 구분자 (엔드포인트 이름 등)
+        value: JSON 직렬화 가능한 값
+
+    Returns:
+        str: 캐시 키로 사용할 해시 문자열
+    """
+    serialized = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(f"{namespace}:{serialized}".encode('utf-8')).hexdigest()
+
+
+def _replace_ids(value, mapping):
+    """
+    응답 내부의 문자열에서 id 값을 일괄 치환합니다.
+    """
+    if isinstance(value, str):
+        # 긴 값부터 치환하여 부분 문자열 충돌을 줄임
+        for source in sorted(mapping, key=len, reverse=True):
+            value = value.replace(source, mapping[source])
+        return value
+    if isinstance(value, dict):
+        return {key: _replace_ids(item, mapping) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_replace_ids(item, mapping) for item in value]
+    return value
+
+
+def strip_volatile_ids(response, volatile):
+    """
+    캐시 저장 전 응답에 포함된 id 값을 placeholder로 바꿉니다.
+    """
+    return _replace_ids(response, {value: f"{{{{__{key}__}}}}" for key, value in volatile.items()})
+
+
+def restore_volatile_ids(response, volatile):
+    """
+    캐시에서 꺼낸 응답의 placeholder를 현재 요청의 id 값으로 되돌립니다.
+    """
+    return _replace_ids(response, {f"{{{{__{key}__}}}}": value for key, value in volatile.items()})
+
+
+class ResponseCache:
+    """
+    LLM 응답 캐시
+    프로세스 내부 LRU(메모리)와 워커 간에 공유되는 SQLite(디스크) 2단계로 구성됩니다.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl=RESPONSE_CACHE_TTL,
+                 memory_size=RESPONSE_CACHE_MEMORY_SIZE, disk_size=RESPONSE_CACHE_DISK_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+        self._init_disk()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_disk(self):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS response_cache ('
+                    'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                    'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS response_cache_accessed ON response_cache (accessed_at)')
+        except sqlite3.Error as e:
+            # 디스크 캐시를 사용할 수 없으면 메모리 캐시만 사용
+            print(f"디스크 캐시 초기화 실패: {e}")
+            self.path = None
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _remember(self, key, value, created_at):
+        with self._lock:
+            self._memory[key] = (value, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def get(self, key):
+        """
+        캐시에서 값을 조회합니다. 만료되었거나 없는 경우 None을 반환합니다.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+        if self.path is not None:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute(
+                        'SELECT value, created_at FROM response_cache WHERE key = ?', (key,)
+                    ).fetchone()
+                    if row is not None and now - row[1] <= self.ttl:
+                        conn.execute('UPDATE response_cache SET accessed_at = ? WHERE key = ?', (now, key))
+                        value = json.loads(row[0])
+                        self._remember(key, value, row[1])
+                        self._count('disk_hits')
+                        return value
+                    if row is not None:
+                        conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+            except sqlite3.Error as e:
+                print(f"디스크 캐시 조회 실패: {e}")
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        """
+        캐시에 값을 저장하고 크기 제한을 넘으면 오래된 항목부터 제거합니다.
+        """
+        now = time.time()
+        self._remember(key, value, now)
+        self._count('sets')
+
+        if self.path is None:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO response_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                    (key, json.dumps(value, ensure_ascii=False), now, now)
+                )
+                conn.execute('DELETE FROM response_cache WHERE created_at < ?', (now - self.ttl,))
+                evicted = conn.execute(
+                    'DELETE FROM response_cache WHERE key IN ('
+                    'SELECT key FROM response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                    (self.disk_size,)
+                ).rowcount
+                if evicted > 0:
+                    with self._lock:
+                        self._stats['evictions'] += evicted
+        except sqlite3.Error as e:
+            print(f"디스크 캐시 저장 실패: {e}")
+
+    def clear(self):
+        """
+        메모리와 디스크 캐시를 모두 비웁니다.
+        """
+        with self._lock:
+            self._memory.clear()
+        if self.path is not None:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM response_cache')
+
+    def stats(self):
+        """
+        캐시 적중/실패 횟수와 현재 크기를 반환합니다.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        hits = stats['memory_hits'] + stats['disk_hits']
+        total = hits + stats['misses']
+        stats['hit_rate'] = hits / total if total else 0.0
+        return stats
+
+
+def get_response_cache():
+    """
+    프로세스 전역 응답 캐시를 반환합니다.
+    아직 생성되지 않은 경우 생성합니다.
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    return _response_cache
+
+
+class _Flight:
+    """
+    진행 중인 동기 호출 하나의 결과를 기다리는 요청들이 공유하는 상태
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    같은 키로 동시에 들어온 호출을 하나로 합치는 single-flight 레이어
+    먼저 들어온 요청(leader)만 실제로 호출하고, 나머지는 그 결과를 함께 받습니다.
+
+    결과 객체는 모든 요청이 공유하므로 호출 측에서 복사(restore_volatile_ids 등) 후 수정해야 합니다.
+
+        flight = get_single_flight()
+        response = flight.do(key, lambda: chain.invoke(inputs))
+        response = await flight.ado(key, lambda: chain.ainvoke(inputs))
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        # 이벤트 루프별 진행 중인 비동기 작업 (루프가 사라지면 함께 정리)
+        self._tasks = weakref.WeakKeyDictionary()
+        self._stats = {'calls': 0, 'coalesced': 0}
+
+    def do(self, key, fn):
+        """
+        동기 호출을 합칩니다. (스레드 기반 WSGI 뷰용)
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self._stats['calls'] += 1
+            else:
+                flight.waiters += 1
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+        return flight.result
+
+    async def ado(self, key, afn):
+        """
+        비동기 호출을 합칩니다. (ASGI 뷰용)
+        실제 호출은 별도 작업으로 실행되므로 한 요청이 취소되어도 나머지 요청은 결과를 받습니다.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = self._tasks.setdefault(loop, {})
+            task = tasks.get(key)
+            if task is None:
+                task = loop.create_task(afn())
+                tasks[key] = task
+                task.add_done_callback(lambda done: tasks.pop(key) if tasks.get(key) is done else None)
+                self._stats['calls'] += 1
+            else:
+                self._stats['coalesced'] += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """
+        실제 호출 수와 합쳐진 요청 수를 반환합니다.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._flights) + sum(len(tasks) for tasks in self._tasks.values())
+        return stats
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight():
+    """
+    프로세스 전역 single-flight 레이어를 반환합니다.
+    """
+    return _single_flight
+
+
+def get_message_text(message):
+    """
+    AIMessage(Chunk)에서 텍스트만 추출합니다.
+    content가 content block 리스트인 경우 text 블록만 이어 붙입니다.
+    """
+    content = message.content if hasattr(message, 'content') else message
+    if isinstance(content, list):
+        return ''.join(
+            block.get('text', '') if isinstance(block, dict) else str(block)
+            for block in content
+        )
+    return content if isinstance(content, str) else str(content)
+
+
+class JsonFieldScanner:
+    """
+    스트리밍되는 텍스트 조각에서 최상위 JSON 객체를 점진적으로 파싱합니다.
+    feed()가 반환하는 이벤트는 (이벤트 이름, 데이터) 튜플입니다.
+        - ('delta', {'field', 'delta'}): streaming_fields 문자열의 추가분
+        - ('field', {'field', 'value'}): 값이 확정된 필드
+        - ('done', dict): 최상위 객체가 완성된 경우 전체 결과
+
+    스트리밍 중에는 로컬 복구(json.loads, repair_json)만 사용합니다.
+    로컬 복구로 파싱할 수 없으면 'done' 대신 unparsed에 텍스트를 남기고, 모델 복구는 스트림이 끝난 뒤 호출한 쪽에서 실행합니다.
+    """
+
+    def __init__(self, streaming_fields=('html',)):
+        self.streaming_fields = streaming_fields
+        self.buffer = ''
+        self.complete = False
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._emitted = set()
+        self._sent = {}
+        self.unparsed = None
+
+    def _scan(self, offset):
+        # 문자열 내부를 제외한 중괄호 깊이를 추적해 최상위 객체의 완성 시점을 찾음
+        for index in range(offset, len(self.buffer)):
+            char = self.buffer[index]
+            if self._start is None:
+                if char == '{':
+                    self._start = index
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self.buffer = self.buffer[:index + 1]
+                    self.complete = True
+                    return
+
+    def feed(self, chunk):
+        """
+        텍스트 조각을 추가하고 새로 발생한 이벤트 목록을 반환합니다.
+        """
+        if self.complete:
+            return []
+        offset = len(self.buffer)
+        self.buffer += chunk
+        self._scan(offset)
+        if self._start is None:
+            return []
+
+        try:
+            partial = parse_partial_json(self.buffer[self._start:])
+        except json.JSONDecodeError:
+            # 로컬 복구가 필요한 응답은 객체가 완성된 뒤에 한 번에 파싱
+            partial = None
+        if not isinstance(partial, dict):
+            partial = {}
+            if not self.complete:
+                return []
+
+        events = []
+        keys = list(partial)
+        for position, key in enumerate(keys):
+            value = partial[key]
+            if key in self.streaming_fields and isinstance(value, str):
+                previous = self._sent.get(key, '')
+                if len(value) > len(previous) and value.startswith(previous):
+                    events.append(('delta', {'field': key, 'delta': value[len(previous):]}))
+                    self._sent[key] = value
+            # 뒤에 다른 키가 등장했거나 객체가 닫혔다면 값이 확정된 것으로 판단
+            elif key not in self._emitted and (position < len(keys) - 1 or self.complete):
+                self._emitted.add(key)
+                events.append(('field', {'field': key, 'value': value}))
+
+        if self.complete:
+            text = self.buffer[self._start:]
+            value, ok = _json_parser._parse_or_repair(text)
+            if ok:
+                events.append(('done', value))
+            else:
+                self.unparsed = text
+        return events
+
+    def finish(self):
+        """
+        스트림이 끝났을 때 남은 결과를 반환합니다. 객체를 찾지 못하면 ValueError를 발생시킵니다.
+        """
+        if self.complete:
+            return []
+        if self._start is not None:
+            result = parse_partial_json(self.buffer[self._start:])
+            if isinstance(result, dict):
+                self.complete = True
+                return [('done', result)]
+        raise ValueError("스트리밍 응답에서 JSON 객체를 찾을 수 없습니다.")
+
+
+def stream_json_fields(chunks, streaming_fields=('html',)):
+    """
+    텍스트 조각 이터레이터를 JsonFieldScanner 이벤트 제너레이터로 변환합니다.
+    최상위 객체가 완성되면 남은 조각을 소비하지 않고 종료합니다.
+    """
+    scanner = JsonFieldScanner(streaming_fields)
+    for chunk in chunks:
+        yield from scanner.feed(chunk)
+        if scanner.complete:
+            break
+    else:
+        yield from scanner.finish()
+        return
+    if scanner.unparsed is not None:
+        # 로컬 복구로 파싱하지 못한 경우에만 스트림이 끝난 뒤 모델 복구 (TolerantJsonOutputParser)
+        yield ('done', _json_parser.parse(scanner.unparsed))
+
+
+async def astream_json_fields(chunks, streaming_fields=('html',)):
+    """
+    stream_json_fields의 비동기 버전
+    모델 복구는 동기 호출이므로 이벤트 루프를 막지 않도록 스트림이 끝난 뒤 sync_to_async로 실행합니다.
+    """
+    scanner = JsonFieldScanner(streaming_fields)
+    async for chunk in chunks:
+        for event in scanner.feed(chunk):
+            yield event
+        if scanner.complete:
+            break
+    else:
+        for event in scanner.finish():
+            yield event
+        return
+    if scanner.unparsed is not None:
+        yield ('done', await sync_to_async(_json_parser.parse, thread_sensitive=False)(scanner.unparsed))
+
+
+def format_sse_event(event, data):
+    """
+    Server-Sent Events 형식의 메시지 문자열을 생성합니다.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# 비동기 엔드포인트별 동시 실행 제한 설정
+# LANGCHAIN_ASYNC_CONCURRENCY_<ENDPOINT> 환경 변수로 엔드포인트별 값을 지정할 수 있음
+ASYNC_CONCURRENCY_DEFAULT = int(os.getenv('LANGCHAIN_ASYNC_CONCURRENCY', 32))
+
+# 이벤트 루프별 세마포어 저장 (asyncio.Semaphore는 생성된 루프에서만 사용 가능)
+_async_limiters = weakref.WeakKeyDictionary()
+
+
+def get_async_concurrency(endpoint):
+    """
+    엔드포인트의 최대 동시 실행 수를 반환합니다.
+    """
+    return int(os.getenv(f'LANGCHAIN_ASYNC_CONCURRENCY_{endpoint.upper()}', ASYNC_CONCURRENCY_DEFAULT))
+
+
+def get_async_limiter(endpoint):
+    """
+    현재 이벤트 루프에서 엔드포인트별 동시 실행 수를 제한하는 세마포어를 반환합니다.
+
+    Args:
+        endpoint (str): 엔드포인트 이름
+
+    Returns:
+        asyncio.Semaphore: 엔드포인트 전용 세마포어
+    """
+    loop = asyncio.get_running_loop()
+    limiters = _async_limiters.setdefault(loop, {})
+    if endpoint not in limiters:
+        limiters[endpoint] = asyncio.Semaphore(get_async_concurrency(endpoint))
+    return limiters[endpoint]
+
+
+# 배치 요청의 최대 동시 실행 수
+BATCH_MAX_CONCURRENCY = int(os.getenv('LANGCHAIN_BATCH_MAX_CONCURRENCY', 5))
+
+
+def get_batch_concurrency(requested=None):
+    """
+    요청된 동시 실행 수를 1 ~ BATCH_MAX_CONCURRENCY 범위로 제한합니다.
+    """
+    try:
+        requested = int(requested) if requested is not None else BATCH_MAX_CONCURRENCY
+    except (TypeError, ValueError):
+        requested = BATCH_MAX_CONCURRENCY
+    return max(1, min(requested, BATCH_MAX_CONCURRENCY))
+
+
+def _timed(chain=None):
+    """
+    체인 실행 결과와 소요 시간을 함께 반환하는 Runnable을 생성합니다.
+    실패한 항목은 예외를 결과로 담아 배치 전체가 중단되지 않도록 합니다.
+    chain이 None이면 입력으로 (체인, 체인 입력) 튜플을 받아 항목마다 해당 체인을 실행합니다.
+    """
+    def run(inputs, config):
+        runnable, inputs = (chain, inputs) if chain is not None else inputs
+        start = time.perf_counter()
+        try:
+            return {'status': 'Success', 'message': runnable.invoke(inputs, config=config), 'latency': time.perf_counter() - start}
+        except Exception as e:
+            return {'status': 'Error', 'message': str(e), 'latency': time.perf_counter() - start}
+
+    async def arun(inputs, config):
+        runnable, inputs = (chain, inputs) if chain is not None else inputs
+        start = time.perf_counter()
+        try:
+            return {'status': 'Success', 'message': await runnable.ainvoke(inputs, config=config), 'latency': time.perf_counter() - start}
+        except Exception as e:
+            return {'status': 'Error', 'message': str(e), 'latency': time.perf_counter() - start}
+
+    return RunnableLambda(run, afunc=arun)
+
+
+def batch_with_latency(chain, inputs, max_concurrency=None, callbacks=None):
+    """
+    여러 입력을 chain.batch로 동시에 실행하고 입력 순서대로 항목별 결과를 반환합니다.
+
+    Args:
+        chain: 실행할 Runnable
+        inputs (list): 체인 입력 목록
+        max_concurrency (int, optional): 최대 동시 실행 수
+        callbacks (list, optional): 항목 실행에 전달할 콜백 핸들러
+
+    Returns:
+        list: 항목별 {'status', 'message', 'latency'} 딕셔너리
+    """
+    if not inputs:
+        return []
+    return _timed(chain).batch(inputs, config={'max_concurrency': get_batch_concurrency(max_concurrency), 'callbacks': callbacks})
+
+
+async def abatch_with_latency(chain, inputs, max_concurrency=None, callbacks=None):
+    """
+    batch_with_latency의 비동기 버전
+    """
+    if not inputs:
+        return []
+    return await _timed(chain).abatch(inputs, config={'max_concurrency': get_batch_concurrency(max_concurrency), 'callbacks': callbacks})
+
+
+def batch_each_with_latency(items, max_concurrency=None):
+    """
+    항목마다 다른 체인(항목별로 라우팅된 모델 등)을 하나의 동시 실행 제한 안에서 실행하고 입력 순서대로 항목별 결과를 반환합니다.
+    체인별로 나눠 차례로 실행하면 전체 시간이 그룹별 시간의 합이 되므로, 모든 항목을 한 번에 배치로 실행합니다.
+
+    Args:
+        items (list): (체인, 체인 입력) 튜플 목록 (항목별 콜백은 chain.with_config(callbacks=...)로 지정)
+        max_concurrency (int, optional): 전체 항목의 최대 동시 실행 수
+
+    Returns:
+        list: 항목별 {'status', 'message', 'latency'} 딕셔너리
+    """
+    if not items:
+        return []
+    return _timed().batch(list(items), config={'max_concurrency': get_batch_concurrency(max_concurrency)})
+
+
+async def abatch_each_with_latency(items, max_concurrency=None):
+    """
+    batch_each_with_latency의 비동기 버전
+    """
+    if not items:
+        return []
+    return await _timed().abatch(list(items), config={'max_concurrency': get_batch_concurrency(max_concurrency)})
+
+
+# Anthropic 호출 속도 제한 (프로세스 전역)
+# 분당 요청 수(RPM)와 분당 토큰 수(TPM) 버킷을 모두 통과한 호출만 실행하고, 나머지는 대기열에서 순서대로 기다립니다.
+# 값이 0 이하이면 해당 버킷은 제한하지 않습니다.
+GOVERNOR_ENABLED = os.getenv('LANGCHAIN_GOVERNOR', 'True') == 'True'
+GOVERNOR_RPM = int(os.getenv('LANGCHAIN_GOVERNOR_RPM', 50))
+GOVERNOR_TPM = int(os.getenv('LANGCHAIN_GOVERNOR_TPM', 40000))
+GOVERNOR_MAX_QUEUE = int(os.getenv('LANGCHAIN_GOVERNOR_MAX_QUEUE', 256))
+GOVERNOR_MAX_WAIT = float(os.getenv('LANGCHAIN_GOVERNOR_MAX_WAIT', 60))
+
+# 이미지 content block 하나의 사전 토큰 추정치 (prepare_image로 축소된 이미지 기준 최대값)
+IMAGE_BLOCK_TOKEN_ESTIMATE = 1600
+
+# 대기열 맨 앞이 아닌 비동기 요청이 순서를 확인하는 간격 (초)
+GOVERNOR_POLL_INTERVAL = 0.01
+
+
+class RateLimitExceeded(Exception):
+    """
+    대기열이 가득 찼거나 대기 시간 제한 안에 호출할 수 없을 때 발생하는 예외
+    """
+
+
+class TokenBucket:
+    """
+    분당 허용량만큼 연속적으로 채워지는 토큰 버킷 (호출 측에서 잠금 필요)
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount, now):
+        """
+        amount만큼 사용할 수 있을 때까지 남은 시간(초)을 반환합니다.
+        """
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        # 버킷 크기보다 큰 요청은 가득 찼을 때 통과
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def consume(self, amount, now):
+        if self.capacity <= 0:
+            return
+        self._refill(now)
+        self.available -= amount
+
+
+class RateGovernor:
+    """
+    모든 Anthropic 호출이 통과하는 속도 제한기
+    RPM/TPM 버킷, 최대 길이가 정해진 FIFO 대기열, 대기 시간 제한(deadline)을 제공합니다.
+
+        governor = get_rate_governor()
+        governor.acquire(estimated_tokens)          # 동기 호출 전
+        await governor.aacquire(estimated_tokens)   # 비동기 호출 전
+        governor.settle(estimated_tokens, actual)   # 실제 사용량으로 TPM 보정
+    """
+
+    def __init__(self, rpm=GOVERNOR_RPM, tpm=GOVERNOR_TPM, max_queue=GOVERNOR_MAX_QUEUE, max_wait=GOVERNOR_MAX_WAIT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._waits = deque(maxlen=ROUTE_LATENCY_WINDOW)
+        self._stats = {'acquired': 0, 'rejected': 0, 'timeouts': 0, 'total_wait': 0.0, 'max_queue_depth': 0}
+
+    def _enqueue(self):
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self._stats['rejected'] += 1
+                raise RateLimitExceeded(f"Anthropic 호출 대기열이 가득 찼습니다. (최대 {self.max_queue}건)")
+            ticket = object()
+            self._queue.append(ticket)
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], len(self._queue))
+            return ticket
+
+    def _try_acquire(self, ticket, tokens, deadline, start):
+        """
+        대기열 맨 앞이면 버킷에서 차감을 시도합니다. (잠금 상태에서 호출)
+
+        Returns:
+            float | None: 0이면 통과, 양수면 기다릴 시간, None이면 앞선 요청을 기다림
+        """
+        now = time.monotonic()
+        if self._queue[0] is ticket:
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait == 0:
+                self.requests.consume(1, now)
+                self.tokens.consume(tokens, now)
+                self._queue.popleft()
+                self._record_wait(now - start)
+                self._cond.notify_all()
+                return 0.0
+        else:
+            wait = None
+        # 제한 시간 안에 통과할 수 없으면 바로 포기
+        if now >= deadline or (wait is not None and now + wait > deadline):
+            self._queue.remove(ticket)
+            self._stats['timeouts'] += 1
+            self._cond.notify_all()
+            raise RateLimitExceeded(f"Anthropic 호출 대기 시간이 제한({deadline - start:.1f}초)을 초과합니다.")
+        return wait
+
+    def _record_wait(self, waited):
+        self._stats['acquired'] += 1
+        self._stats['total_wait'] += waited
+        self._waits.append(waited)
+
+    def acquire(self, tokens=0, timeout=None):
+        """
+        호출할 수 있을 때까지 현재 스레드에서 기다립니다.
+
+        Args:
+            tokens (int): 사전 추정 토큰 수
+            timeout (float, optional): 최대 대기 시간(초). 기본값은 max_wait
+        """
+        start = time.monotonic()
+        deadline = start + (self.max_wait if timeout is None else timeout)
+        ticket = self._enqueue()
+        with self._cond:
+            while True:
+                wait = self._try_acquire(ticket, tokens, deadline, start)
+                if wait == 0:
+                    return
+                # 맨 앞이 아니면 앞선 요청이 통과하거나 포기할 때까지 대기
+                self._cond.wait(wait if wait is not None else deadline - time.monotonic())
+
+    async def aacquire(self, tokens=0, timeout=None):
+        """
+        acquire의 비동기 버전 (이벤트 루프를 막지 않음)
+        """
+        start = time.monotonic()
+        deadline = start + (self.max_wait if timeout is None else timeout)
+        ticket = self._enqueue()
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_acquire(ticket, tokens, deadline, start)
+                if wait == 0:
+                    return
+                await asyncio.sleep(wait if wait is not None else GOVERNOR_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            with self._cond:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._cond.notify_all()
+            raise
+
+    def settle(self, estimated, actual):
+        """
+        사전 추정치와 실제 사용 토큰 수의 차이만큼 TPM 버킷을 보정합니다.
+        """
+        if actual is None:
+            return
+        with self._cond:
+            self.tokens.consume(actual - estimated, time.monotonic())
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        대기열 길이, 대기 시간, 버킷 잔량 등 속도 제한 지표를 반환합니다.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            stats = dict(self._stats)
+            waits = list(self._waits)
+            stats.update({
+                'queue_depth': len(self._queue),
+                'available_requests': self.requests.available if self.requests.capacity > 0 else None,
+                'available_tokens': self.tokens.available if self.tokens.capacity > 0 else None,
+            })
+        stats['avg_wait'] = stats['total_wait'] / stats['acquired'] if stats['acquired'] else 0.0
+        stats['p90_wait'] = _percentile(waits, 0.9)
+        return stats
+
+
+_rate_governor = RateGovernor()
+
+
+def get_rate_governor():
+    """
+    프로세스 전역 속도 제한기를 반환합니다.
+    """
+    return _rate_governor
+
+
+def estimate_message_tokens(messages):
+    """
+    모델에 전달할 메시지 목록의 입력 토큰 수를 사전 추정합니다.
+    """
+    tokens = 0
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            tokens += calculate_tokens(content)
+            continue
+        for block in content:
+            if isinstance(block, str):
+                tokens += calculate_tokens(block)
+            elif block.get('type') in ('image', 'image_url'):
+                tokens += IMAGE_BLOCK_TOKEN_ESTIMATE
+            else:
+                tokens += calculate_tokens(block.get('text', ''))
+    return tokens
+
+
+def _actual_tokens(message):
+    usage = getattr(message, 'usage_metadata', None)
+    return usage.get('total_tokens') if usage else None
+
+
+class GovernedChatAnthropic(PooledChatAnthropic):
+    """
+    호출 전에 프로세스 전역 속도 제한기(RateGovernor)를 통과하는 ChatAnthropic
+    응답을 받으면 실제 토큰 사용량으로 TPM 버킷을 보정합니다.
+    """
+
+    def _acquire(self, estimated):
+        # 속도 제한기 대기 시간을 지표로 기록
+        start = time.perf_counter()
+        get_rate_governor().acquire(estimated)
+        observe_stage('queue_wait', time.perf_counter() - start, model=self.model)
+
+    async def _aacquire(self, estimated):
+        start = time.perf_counter()
+        await get_rate_governor().aacquire(estimated)
+        observe_stage('queue_wait', time.perf_counter() - start, model=self.model)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.streaming:
+            # 스트리밍 모드는 _stream에서 제한
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        estimated = estimate_message_tokens(messages)
+        self._acquire(estimated)
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        get_rate_governor().settle(estimated, _actual_tokens(result.generations[0].message))
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.streaming:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        estimated = estimate_message_tokens(messages)
+        await self._aacquire(estimated)
+        result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        get_rate_governor().settle(estimated, _actual_tokens(result.generations[0].message))
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        estimated = estimate_message_tokens(messages)
+        self._acquire(estimated)
+        actual = 0
+        try:
+            for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                actual += _actual_tokens(chunk.message) or 0
+                yield chunk
+        finally:
+            get_rate_governor().settle(estimated, actual or None)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        estimated = estimate_message_tokens(messages)
+        await self._aacquire(estimated)
+        actual = 0
+        try:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                actual += _actual_tokens(chunk.message) or 0
+                yield chunk
+        finally:
+            get_rate_governor().settle(estimated, actual or None)
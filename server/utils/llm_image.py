@@ -0,0 +1,104 @@
+import os
+import io
+import base64
+from PIL import Image
+from utils.metrics import stage_timer
+
+# Claude에 전달할 이미지 설정
+# 긴 변이 1568px 또는 약 1.15MP를 넘는 이미지는 Anthropic에서 어차피 축소하므로 서버에서 먼저 줄여 전송량을 줄입니다.
+IMAGE_MAX_EDGE = int(os.getenv('LANGCHAIN_IMAGE_MAX_EDGE', 1568))
+IMAGE_MAX_PIXELS = int(os.getenv('LANGCHAIN_IMAGE_MAX_PIXELS', 1150000))
+IMAGE_FORMAT = os.getenv('LANGCHAIN_IMAGE_FORMAT', 'JPEG').upper()
+IMAGE_QUALITY = int(os.getenv('LANGCHAIN_IMAGE_QUALITY', 85))
+
+# 이미지 토큰 추정: 토큰 ≈ (가로 x 세로) / 750
+IMAGE_PIXELS_PER_TOKEN = 750
+
+MEDIA_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+}
+
+
+def decode_base64_image(data):
+    """
+    base64 문자열(data URL 포함)을 바이트로 디코딩합니다.
+
+    Args:
+        data (str | bytes): base64 문자열, 'data:image/png;base64,...' 형식 또는 원본 바이트
+
+    Returns:
+        bytes: 이미지 바이트
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return bytes(data)
+    # 'data:image/jpeg;base64,' 형식으로 시작하는 경우 처리
+    if 'base64,' in data:
+        data = data.split('base64,', 1)[1]
+    return base64.b64decode(data)
+
+
+def estimate_image_tokens(width, height):
+    """
+    Claude가 이미지에 사용하는 입력 토큰 수를 추정합니다.
+    """
+    return max(1, (width * height) // IMAGE_PIXELS_PER_TOKEN)
+
+
+def prepare_image(data, max_edge=IMAGE_MAX_EDGE, max_pixels=IMAGE_MAX_PIXELS, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    """
+    이미지를 한 번만 디코딩하여 모델이 활용하는 해상도로 축소하고 다시 압축합니다.
+
+    Args:
+        data (str | bytes): base64 문자열 또는 이미지 바이트
+        max_edge (int): 긴 변의 최대 픽셀 수
+        max_pixels (int): 최대 픽셀 수 (가로 x 세로)
+        image_format (str): 재압축 형식 (JPEG, WEBP, PNG)
+        quality (int): JPEG/WEBP 압축 품질
+
+    Returns:
+        dict: media_type, data(base64), data_url, width, height, original_bytes, encoded_bytes, estimated_tokens
+    """
+    with stage_timer('image_decode'):
+        raw = decode_base64_image(data)
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+
+    with stage_timer('image_resize'):
+        width, height = image.size
+        scale = min(1.0, max_edge / max(width, height), (max_pixels / (width * height)) ** 0.5)
+        if scale < 1.0:
+            image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            # JPEG는 알파 채널을 지원하지 않으므로 흰 배경에 합성
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.convert('RGBA').split()[-1])
+            image = background
+
+        buffer = io.BytesIO()
+        if image_format == 'PNG':
+            image.save(buffer, format=image_format, optimize=True)
+        else:
+            image.save(buffer, format=image_format, quality=quality)
+        encoded = base64.b64encode(buffer.getvalue()).decode('ascii')
+    media_type = MEDIA_TYPES.get(image_format, 'image/jpeg')
+
+    return {
+        'media_type': media_type,
+        'data': encoded,
+        'data_url': f"data:{media_type};base64,{encoded}",
+        'width': image.width,
+        'height': image.height,
+        'original_bytes': len(raw),
+        'encoded_bytes': buffer.tell(),
+        'estimated_tokens': estimate_image_tokens(image.width, image.height),
+    }
+
+
+def image_summary(prepared):
+    """
+    응답에 포함할 이미지 처리 정보를 반환합니다. (이미지 데이터 제외)
+    """
+    return {key: value for key, value in prepared.items() if key not in ('data', 'data_url')}
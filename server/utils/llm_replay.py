@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Anthropic 호출 기록/재생 설정
+# live(기본값): 실제 호출, record: 실제 호출 + 코퍼스에 기록, replay: 기록된 응답과 지연 시간으로 재생 (API 호출 없음)
+LLM_MODE = os.getenv('LANGCHAIN_LLM_MODE', 'live')
+LLM_CORPUS_PATH = os.getenv(
+    'LANGCHAIN_LLM_CORPUS_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'langchain_corpus.sqlite3')
+)
+# 재생 속도 배율 (1.0 = 기록된 시간 그대로, 0 = 지연 없이 재생)
+REPLAY_SPEED = float(os.getenv('LANGCHAIN_REPLAY_SPEED', 1.0))
+# 같은 프롬프트 기록이 없을 때 대신 사용할 기록을 고르는 시드 (같은 시드 = 같은 선택)
+REPLAY_SEED = os.getenv('LANGCHAIN_REPLAY_SEED', '0')
+# 재생 스트리밍 청크 크기 (문자 수)
+REPLAY_CHUNK_SIZE = int(os.getenv('LANGCHAIN_REPLAY_CHUNK_SIZE', 16))
+
+
+def _compact_block(block):
+    # 이미지 데이터는 해시로 바꿔 코퍼스를 작게 유지
+    if isinstance(block, dict):
+        if block.get('type') == 'image_url':
+            url = block['image_url']['url'] if isinstance(block.get('image_url'), dict) else block.get('image_url', '')
+            return {'type': 'image_url', 'image_url': {'url': 'sha256:' + hashlib.sha256(url.encode('utf-8')).hexdigest()}}
+        if block.get('type') == 'image' and isinstance(block.get('source'), dict):
+            data = block['source'].get('data', '')
+            return {'type': 'image', 'source': {'type': 'sha256', 'data': hashlib.sha256(data.encode('utf-8')).hexdigest()}}
+    return block
+
+
+def compact_messages(messages):
+    """
+    프롬프트 메시지를 기록용 형식(역할, 내용)으로 변환합니다. 이미지 데이터는 해시로 대체합니다.
+    """
+    compact = []
+    for message in messages:
+        content = message.content
+        if not isinstance(content, str):
+            content = [_compact_block(block) for block in content]
+        compact.append({'type': message.type, 'content': content})
+    return compact
+
+
+def prompt_key(model_name, messages):
+    """
+    (모델, 프롬프트 메시지)에 대한 기록 키를 생성합니다.
+    """
+    payload = json.dumps([model_name, compact_messages(messages)], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+
+def _unpack(value):
+    return json.loads(zlib.decompress(value).decode('utf-8'))
+
+
+def _message_text(message):
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return ''.join(block.get('text', '') if isinstance(block, dict) else block for block in content)
+
+
+class ExchangeCorpus:
+    """
+    모델 호출 기록(프롬프트, 응답, 토큰 사용량, 지연 시간)을 저장하는 SQLite 코퍼스
+    프롬프트와 응답은 zlib으로 압축하여 저장합니다.
+    """
+
+    def __init__(self, path=LLM_CORPUS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+        # 같은 프롬프트 키를 재생한 횟수 (같은 프롬프트의 기록이 여러 개면 차례로 재생)
+        self._draws = {}
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS exchanges ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, model TEXT NOT NULL, '
+                'prompt BLOB NOT NULL, response BLOB NOT NULL, usage TEXT, '
+                'latency REAL NOT NULL, first_token_latency REAL, created_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS exchanges_key ON exchanges (key)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, model_name, messages, message, latency, first_token_latency=None):
+        """
+        모델 호출 하나를 기록합니다.
+
+        Args:
+            model_name (str): 모델 이름
+            messages (list): 모델에 전달한 프롬프트 메시지
+            message (AIMessage): 모델 응답
+            latency (float): 응답 완료까지 걸린 시간(초)
+            first_token_latency (float, optional): 스트리밍 시 첫 청크까지 걸린 시간(초)
+        """
+        usage = getattr(message, 'usage_metadata', None)
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT INTO exchanges (key, model, prompt, response, usage, latency, first_token_latency, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (prompt_key(model_name, messages), model_name, _pack(compact_messages(messages)),
+                     _pack(message_to_dict(message)), json.dumps(usage) if usage else None,
+                     latency, first_token_latency, time.time())
+                )
+        except sqlite3.Error as e:
+            print(f"모델 호출 기록 실패: {e}")
+            return
+        with self._lock:
+            self._entries = None
+
+    def entries(self):
+        """
+        기록된 호출 목록을 반환합니다. (재생용, 메모리에 한 번만 읽음)
+        """
+        with self._lock:
+            if self._entries is None:
+                with self._connect() as conn:
+                    rows = conn.execute(
+                        'SELECT key, model, response, latency, first_token_latency FROM exchanges ORDER BY id'
+                    ).fetchall()
+                self._entries = [
+                    {'key': key, 'model': model, 'message': messages_from_dict([_unpack(response)])[0],
+                     'latency': latency, 'first_token_latency': first_token_latency}
+                    for key, model, response, latency, first_token_latency in rows
+                ]
+            return self._entries
+
+    def find(self, model_name, messages, seed=REPLAY_SEED):
+        """
+        프롬프트에 대한 기록을 찾습니다.
+        같은 프롬프트의 기록이 여러 개면 시드로 정한 위치부터 호출할 때마다 차례로 골라, 같은 프롬프트를 반복해도 기록된 지연 시간 분포를 재생합니다.
+        같은 프롬프트의 기록이 없으면 같은 모델(없으면 전체)의 기록 중 프롬프트 해시와 시드로 하나를 고르므로
+        같은 입력에는 항상 같은 응답과 지연 시간이 재생되고, 여러 입력에 대해서는 기록된 지연 시간 분포를 따릅니다.
+
+        Returns:
+            tuple: (기록, 같은 프롬프트 기록 여부)
+        """
+        key = prompt_key(model_name, messages)
+        entries = self.entries()
+        offset = int(hashlib.sha256(f"{seed}:{key}".encode('utf-8')).hexdigest(), 16)
+        matches = [entry for entry in entries if entry['key'] == key]
+        if matches:
+            with self._lock:
+                draw = self._draws.get(key, 0)
+                self._draws[key] = draw + 1
+            return matches[(offset + draw) % len(matches)], True
+        candidates = [entry for entry in entries if entry['model'] == model_name] or entries
+        if not candidates:
+            raise LookupError(f"재생할 모델 호출 기록이 없습니다: {self.path}")
+        return candidates[offset % len(candidates)], False
+
+    def stats(self):
+        """
+        모델별 기록 수와 지연 시간 통계를 반환합니다.
+        """
+        stats = {}
+        for entry in self.entries():
+            stats.setdefault(entry['model'], []).append(entry['latency'])
+        return {
+            model: {'count': len(latencies), 'avg_latency': sum(latencies) / len(latencies), 'max_latency': max(latencies)}
+            for model, latencies in stats.items()
+        }
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+
+def get_exchange_corpus():
+    """
+    프로세스 전역 모델 호출 코퍼스를 반환합니다.
+    """
+    global _corpus
+    if _corpus is None:
+        with _corpus_lock:
+            if _corpus is None:
+                _corpus = ExchangeCorpus()
+    return _corpus
+
+
+class RecordingChatModel(BaseChatModel):
+    """
+    실제 모델 호출을 그대로 수행하면서 프롬프트, 응답, 토큰 사용량, 지연 시간을 코퍼스에 기록하는 모델
+    """
+    chat_model: BaseChatModel
+    corpus: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return f"recording-{self.chat_model._llm_type}"
+
+    @property
+    def model_name(self):
+        return getattr(self.chat_model, 'model', None) or getattr(self.chat_model, 'model_name', '')
+
+    def _corpus(self):
+        return self.corpus or get_exchange_corpus()
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        start = time.perf_counter()
+        result = self.chat_model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._corpus().record(self.model_name, messages, result.generations[0].message, time.perf_counter() - start)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        start = time.perf_counter()
+        result = await self.chat_model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._corpus().record(self.model_name, messages, result.generations[0].message, time.perf_counter() - start)
+        return result
+
+    def _record_stream(self, messages, message, start, first_token_at):
+        # 끝까지 받은 스트림만 기록 (소비자가 중간에 닫은 스트림의 일부 응답과 짧은 지연 시간을 완료된 호출처럼 재생하지 않도록)
+        if message is not None:
+            self._corpus().record(self.model_name, messages, AIMessage(**message.model_dump(exclude={'type', 'tool_call_chunks'})),
+                                  time.perf_counter() - start, first_token_at - start)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        first_token_at = None
+        message = None
+        for chunk in self.chat_model._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            first_token_at = first_token_at or time.perf_counter()
+            message = chunk.message if message is None else message + chunk.message
+            yield chunk
+        self._record_stream(messages, message, start, first_token_at)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        first_token_at = None
+        message = None
+        async for chunk in self.chat_model._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            first_token_at = first_token_at or time.perf_counter()
+            message = chunk.message if message is None else message + chunk.message
+            yield chunk
+        self._record_stream(messages, message, start, first_token_at)
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    코퍼스에 기록된 응답을 기록된 지연 시간으로 재생하는 모델 (API 호출 없음)
+    스트리밍은 기록된 첫 청크 지연 시간 후 나머지 시간 동안 응답을 나눠 전달합니다.
+    (스트리밍 없이 기록된 호출은 응답 시간 전체가 지난 뒤 바로 전달)
+    """
+    model_name: str
+    corpus: Any = None
+    speed: float = REPLAY_SPEED
+
+    @property
+    def _llm_type(self) -> str:
+        return 'replay-chat-model'
+
+    def _find(self, messages):
+        entry, _ = (self.corpus or get_exchange_corpus()).find(self.model_name, messages)
+        return entry
+
+    def _timing(self, entry, chunk_count):
+        first_token = entry['first_token_latency']
+        if first_token is None:
+            first_token = entry['latency']
+        return first_token * self.speed, max(entry['latency'] - first_token, 0) * self.speed / max(chunk_count, 1)
+
+    def _chunks(self, entry):
+        text = _message_text(entry['message'])
+        return [text[index:index + REPLAY_CHUNK_SIZE] for index in range(0, len(text), REPLAY_CHUNK_SIZE)]
+
+    def _last_chunk(self, entry):
+        message = entry['message']
+        return ChatGenerationChunk(message=AIMessageChunk(content='', usage_metadata=message.usage_metadata, response_metadata=message.response_metadata))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        entry = self._find(messages)
+        time.sleep(entry['latency'] * self.speed)
+        return ChatResult(generations=[ChatGeneration(message=entry['message'].model_copy())])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        entry = self._find(messages)
+        await asyncio.sleep(entry['latency'] * self.speed)
+        return ChatResult(generations=[ChatGeneration(message=entry['message'].model_copy())])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        entry = self._find(messages)
+        chunks = self._chunks(entry)
+        first_token, interval = self._timing(entry, len(chunks))
+        time.sleep(first_token)
+        for index, chunk in enumerate(chunks):
+            if index:
+                time.sleep(interval)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        yield self._last_chunk(entry)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        entry = self._find(messages)
+        chunks = self._chunks(entry)
+        first_token, interval = self._timing(entry, len(chunks))
+        await asyncio.sleep(first_token)
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(interval)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        yield self._last_chunk(entry)
@@ -0,0 +1,170 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# 단계별 지연 시간 지표
+# 요청 처리의 단계(본문 파싱, 프롬프트 구성, 속도 제한 대기, 모델 첫 토큰/전체 시간, 응답 파싱/복구, 이미지 처리 단계)를
+# 엔드포인트와 모델 이름 레이블로 히스토그램에 기록하고 /metrics 에서 Prometheus 텍스트 형식으로 제공합니다.
+# prometheus_client 없이 동작하며 지표는 프로세스별로 집계됩니다. (워커가 여러 개면 Prometheus에서 합산)
+METRICS_ENABLED = os.getenv('METRICS', 'True') == 'True'
+# 히스토그램 구간(초). 이미지 처리 단계(수 ms)부터 큰 컴포넌트 생성(수십 초)까지
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 현재 요청의 엔드포인트 (api.middleware.metrics_middleware가 설정, 스레드/비동기 작업에는 contextvars로 전달)
+_current_endpoint = contextvars.ContextVar('metrics_endpoint', default='')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    레이블별 누적 카운터
+    """
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram:
+    """
+    레이블별 히스토그램 (구간별 누적 개수, 합계, 개수)
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            entry['buckets'][index] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def snapshot(self, **labels):
+        """
+        레이블 조합의 개수와 합계를 반환합니다. 기록이 없으면 None을 반환합니다.
+        """
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            return {'count': entry['count'], 'sum': entry['sum']} if entry else None
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, {**entry, 'buckets': list(entry['buckets'])}) for key, entry in self._values.items())
+        lines = []
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry['buckets']):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(entry['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {entry['count']}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency until the response is returned.', ('endpoint', 'method', 'status'))
+STAGE_LATENCY = Histogram('langchain_stage_duration_seconds', 'Latency of each request stage.', ('endpoint', 'model', 'stage'))
+LLM_CALLS = Counter('langchain_llm_calls_total', 'Model calls by outcome.', ('endpoint', 'model', 'status'))
+LLM_TOKENS = Counter('langchain_llm_tokens_total', 'Model tokens by type.', ('endpoint', 'model', 'type'))
+
+_metrics = [REQUEST_LATENCY, STAGE_LATENCY, LLM_CALLS, LLM_TOKENS]
+
+
+def set_current_endpoint(endpoint):
+    """
+    현재 요청의 엔드포인트를 설정합니다. 반환된 토큰은 reset_current_endpoint에 전달합니다.
+    """
+    return _current_endpoint.set(endpoint)
+
+
+def reset_current_endpoint(token):
+    _current_endpoint.reset(token)
+
+
+def get_current_endpoint():
+    return _current_endpoint.get()
+
+
+def observe_stage(stage, seconds, endpoint=None, model=''):
+    """
+    단계 소요 시간을 기록합니다. endpoint를 지정하지 않으면 현재 요청의 엔드포인트를 사용합니다.
+    """
+    if not METRICS_ENABLED:
+        return
+    STAGE_LATENCY.observe(seconds, endpoint=endpoint or get_current_endpoint() or 'none', model=model, stage=stage)
+
+
+@contextmanager
+def stage_timer(stage, endpoint=None, model=''):
+    """
+    with 블록의 실행 시간을 단계 지연 시간으로 기록합니다.
+
+        with stage_timer('mser', model='opencv'):
+            regions, _ = mser.detectRegions(gray)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, endpoint, model)
+
+
+def render_metrics():
+    """
+    모든 지표를 Prometheus 텍스트 형식(0.0.4)으로 반환합니다.
+    """
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,115 @@
+import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# 단계별 파이프라인(DAG) 실행 설정
+# 서로 의존하지 않는 단계는 동시에 실행하고, 각 단계는 필수 입력(requires 단계 결과)이 준비되는 즉시 시작합니다.
+# 선택 입력(optional)은 기다리지 않고, 시작 시점에 이미 끝난 결과만 전달합니다.
+PIPELINE_MAX_WORKERS = int(os.getenv('PIPELINE_MAX_WORKERS', 8))
+
+
+def validate_pipeline(stages):
+    """
+    단계 정의를 검사합니다. 없는 단계에 의존하거나 순환 의존이 있으면 ValueError를 발생시킵니다.
+    """
+    for name, spec in stages.items():
+        missing = [dep for dep in _dependencies(spec) if dep not in stages]
+        if missing:
+            raise ValueError(f"{name} 단계가 없는 단계에 의존합니다: {', '.join(missing)}")
+
+    resolved = set()
+    remaining = dict(stages)
+    while remaining:
+        # 선택 선행 단계는 시작을 막지 않으므로 순환 검사는 필수 선행 단계만 봅니다
+        ready = [name for name, spec in remaining.items() if all(dep in resolved for dep in spec.get('requires', ()))]
+        if not ready:
+            raise ValueError(f"순환 의존이 있습니다: {', '.join(sorted(remaining))}")
+        for name in ready:
+            resolved.add(name)
+            del remaining[name]
+
+
+def _dependencies(spec):
+    return list(spec.get('requires', ())) + list(spec.get('optional', ()))
+
+
+def _run_stage(run, inputs, origin):
+    started = time.perf_counter()
+    try:
+        result = {'status': 'Success', 'result': run(inputs)}
+    except Exception as e:
+        print(f"파이프라인 단계 실행 오류: {e}")
+        result = {'status': 'Error', 'error': str(e)}
+    finished = time.perf_counter()
+    result.update({'started': started - origin, 'finished': finished - origin, 'latency': finished - started})
+    return result
+
+
+def run_pipeline(stages, inputs=None, max_workers=None):
+    """
+    의존 관계가 있는 단계들을 필수 입력이 준비되는 즉시 병렬로 실행합니다.
+    한 단계가 실패해도 나머지 단계는 계속 실행하며, 필수 선행 단계(requires)가 실패한 단계만 건너뜁니다.
+
+        run_pipeline({
+            'text': {'run': extract_text},
+            'description': {'run': describe},
+            'construct': {'run': construct, 'requires': ['description'], 'optional': ['text']},
+        }, {'image_url': image_url})
+
+    Args:
+        stages (dict): 단계 이름 -> {'run': 함수, 'requires': 필수 선행 단계, 'optional': 기다리지 않는 선행 단계}
+            run은 초기 입력에 선행 단계 결과(단계 이름 키)를 더한 dict를 받습니다.
+            optional 단계는 시작 시점에 이미 성공한 경우에만 결과가 들어가고, 실패했거나 아직 실행 중이면 None입니다.
+        inputs (dict, optional): 모든 단계에 전달할 초기 입력
+        max_workers (int, optional): 동시에 실행할 최대 단계 수. 기본값은 PIPELINE_MAX_WORKERS
+
+    Returns:
+        dict: stages(단계별 status, result 또는 error, started, finished, latency),
+              elapsed(전체 시간), sequential(단계 시간의 합 = 순차 실행 시 예상 시간), speedup
+    """
+    validate_pipeline(stages)
+    inputs = inputs or {}
+    results = {}
+    pending = dict(stages)
+    running = {}
+    origin = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers or PIPELINE_MAX_WORKERS) as executor:
+        while pending or running:
+            # 건너뛴 단계로 다른 단계가 준비될 수 있으므로 더 이상 바뀌지 않을 때까지 반복
+            progressed = True
+            while progressed:
+                progressed = False
+                for name in list(pending):
+                    spec = pending[name]
+                    requires = spec.get('requires', ())
+                    if any(dep not in results for dep in requires):
+                        continue
+                    del pending[name]
+                    progressed = True
+                    failed = [dep for dep in requires if results[dep]['status'] != 'Success']
+                    if failed:
+                        now = time.perf_counter() - origin
+                        results[name] = {'status': 'Skipped', 'error': f"선행 단계 실패: {', '.join(failed)}",
+                                         'started': now, 'finished': now, 'latency': 0.0}
+                        continue
+                    stage_inputs = {**inputs, **{dep: results.get(dep, {}).get('result') for dep in _dependencies(spec)}}
+                    # 요청 범위의 contextvars(콜백, 모델 호출 기록 등)를 단계 스레드에 전달
+                    future = executor.submit(contextvars.copy_context().run, _run_stage, spec['run'], stage_inputs, origin)
+                    running[future] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    elapsed = time.perf_counter() - origin
+    sequential = sum(result['latency'] for result in results.values())
+    return {
+        'stages': {name: results[name] for name in stages},
+        'elapsed': elapsed,
+        'sequential': sequential,
+        'speedup': sequential / elapsed if elapsed > 0 else 1.0,
+    }
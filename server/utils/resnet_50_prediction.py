@@ -5,30 +5,44 @@ from tensorflow.keras.applications.resnet50 import ResNet50, preprocess_input, d
 from tensorflow.keras.preprocessing import image
 from PIL import Image
 import matplotlib.pyplot as plt
+from utils.image_store import cached_image_result
+from utils.metrics import stage_timer
 
 def predict_from_base64(base64_string):
     """
     Base64 인코딩된 이미지를 ResNet50 모델로 예측합니다.
     
     Args:
-        base64_string (str): Base64로 인코딩된 이미지 문자열
+        base64_string (str | bytes): Base64로 인코딩된 이미지 문자열 또는 업로드된 이미지 바이트
         
     Returns:
         predictions (list): 상위 5개 예측 결과 (클래스 ID, 클래스명, 확률)
     """
+    # 같은 이미지의 예측 결과는 이미지 결과 저장소에서 가져옴 (모델 로드 생략)
+    predictions, _ = cached_image_result('resnet50_predict', base64_string, _predict)
+    return predictions
+
+
+def _predict(base64_string):
     # ResNet50 모델 로드 (ImageNet으로 사전 훈련됨)
     model = ResNet50(weights='imagenet')
     
     try:
-        # Base64 문자열이 'data:image/jpeg;base64,' 형식으로 시작하는 경우 처리
-        if 'base64,' in base64_string:
-            base64_string = base64_string.split('base64,')[1]
-        
-        # Base64 디코딩
-        img_data = base64.b64decode(base64_string)
+        if isinstance(base64_string, (bytes, bytearray, memoryview)):
+            # 업로드된 이미지 바이트는 디코딩 없이 그대로 사용
+            img_data = base64_string
+        else:
+            # Base64 문자열이 'data:image/jpeg;base64,' 형식으로 시작하는 경우 처리
+            if 'base64,' in base64_string:
+                base64_string = base64_string.split('base64,')[1]
+            
+            # Base64 디코딩
+            img_data = base64.b64decode(base64_string)
         
         # 이미지 열기
-        img = Image.open(io.BytesIO(img_data))
+        with stage_timer('image_decode', model='resnet50'):
+            img = Image.open(io.BytesIO(img_data))
+            img.load()
         
         # 이미지 크기 조정 (224x224는 ResNet50의 입력 크기)
         img = img.resize((224, 224))
@@ -55,7 +69,8 @@ def predict_from_base64(base64_string):
         processed_img = preprocess_input(img_batch)
         
         # 예측 실행
-        predictions = model.predict(processed_img, verbose=0)
+        with stage_timer('backbone_forward', model='resnet50'):
+            predictions = model.predict(processed_img, verbose=0)
         
         # 예측 결과 디코딩 (상위 5개)
         decoded_predictions = decode_predictions(predictions, top=5)[0]
@@ -15,6 +15,8 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+from utils.image_store import cached_image_result
+from utils.metrics import stage_timer
 
 class UIComponentDetector:
     def __init__(self):
@@ -195,11 +197,12 @@ class UIComponentDetector:
         gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
         
         # Apply MSER (Maximally Stable Extremal Regions)
-        mser = cv2.MSER_create()
-        regions, _ = mser.detectRegions(gray)
-        
-        # Filter and merge text regions
-        hulls = [cv2.convexHull(p.reshape(-1, 1, 2)) for p in regions]
+        with stage_timer('mser', model='opencv'):
+            mser = cv2.MSER_create()
+            regions, _ = mser.detectRegions(gray)
+            
+            # Filter and merge text regions
+            hulls = [cv2.convexHull(p.reshape(-1, 1, 2)) for p in regions]
         
         # Filter small regions
         hulls = [h for h in hulls if cv2.contourArea(h) > 50]
@@ -217,7 +220,8 @@ class UIComponentDetector:
             })
         
         # Merge overlapping regions
-        text_regions = self._merge_overlapping_regions(text_regions)
+        with stage_timer('region_merge', model='opencv'):
+            text_regions = self._merge_overlapping_regions(text_regions)
         
         return text_regions
     
@@ -279,6 +283,13 @@ class UIComponentDetector:
 
 # Example usage
 def detect_ui_components(base64_data):
+    # 같은 이미지의 감지 결과는 이미지 결과 저장소에서 가져옴 (오류 결과는 저장하지 않음)
+    results, _ = cached_image_result('ui_component_detector', base64_data, _detect_ui_components,
+                                     cacheable=lambda results: 'error' not in results)
+    return results
+
+
+def _detect_ui_components(base64_data):
     try:
         detector = UIComponentDetector()
         
@@ -286,33 +297,39 @@ def detect_ui_components(base64_data):
         if not base64_data:
             return {"error": "Base64 데이터가 비어 있습니다."}
         
-        # base64 데이터에서 헤더 제거 (있는 경우)
-        if ',' in base64_data:
-            base64_data = base64_data.split(',', 1)[1]
-        
-        # base64 패딩 수정 - 길이가 4의 배수가 되도록 '=' 추가
-        base64_data = base64_data.strip()
-        padding_needed = len(base64_data) % 4
-        if padding_needed:
-            base64_data += '=' * (4 - padding_needed)
-        
-        try:
-            # base64 디코딩 시도
-            image_bytes = base64.b64decode(base64_data)
-        except Exception as e:
-            return {"error": f"Base64 디코딩 오류: {str(e)}"}
+        if isinstance(base64_data, (bytes, bytearray, memoryview)):
+            # 업로드된 이미지 바이트는 디코딩 없이 그대로 사용
+            image_bytes = base64_data
+        else:
+            # base64 데이터에서 헤더 제거 (있는 경우)
+            if ',' in base64_data:
+                base64_data = base64_data.split(',', 1)[1]
+            
+            # base64 패딩 수정 - 길이가 4의 배수가 되도록 '=' 추가
+            base64_data = base64_data.strip()
+            padding_needed = len(base64_data) % 4
+            if padding_needed:
+                base64_data += '=' * (4 - padding_needed)
+            
+            try:
+                # base64 디코딩 시도
+                image_bytes = base64.b64decode(base64_data)
+            except Exception as e:
+                return {"error": f"Base64 디코딩 오류: {str(e)}"}
         
         try:
             # 이미지 열기 시도
-            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+            with stage_timer('image_decode', model='pil'):
+                image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
         except Exception as e:
             # 디버깅을 위해 디코딩된 데이터의 처음 몇 바이트 확인
-            preview = str(image_bytes[:20]) if image_bytes else "빈 데이터"
+            preview = str(bytes(image_bytes[:20])) if image_bytes else "빈 데이터"
             return {"error": f"이미지 파일을 열 수 없습니다: {str(e)}, 데이터 미리보기: {preview}"}
         
         print("시작")
         # Detect components using sliding window
-        components = detector.detect_components_with_sliding_window(image)
+        with stage_timer('sliding_window', model='opencv'):
+            components = detector.detect_components_with_sliding_window(image)
         print("TEXT 영역")
         # Detect text regions
         text_regions = detector.detect_text_regions(image)
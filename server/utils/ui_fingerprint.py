@@ -0,0 +1,315 @@
+import os
+import re
+import json
+import random
+import hashlib
+
+# architecture 구조 지문 설정
+# architecture를 태그 트리 shingle 집합으로 바꾸고 MinHash 서명과 LSH 밴드로 비슷한 구조를 빠르게 찾습니다.
+# 텍스트(label 등)는 구조에서 제외하므로 라벨만 다른 같은 레이아웃은 같은 구조가 됩니다.
+FINGERPRINT_NUM_PERM = int(os.getenv('LANGCHAIN_FINGERPRINT_NUM_PERM', 64))
+FINGERPRINT_BANDS = int(os.getenv('LANGCHAIN_FINGERPRINT_BANDS', 16))
+# 경로 shingle에 포함할 최대 조상 수
+FINGERPRINT_PATH_DEPTH = 3
+
+# 구조가 아닌 텍스트 필드 (라벨 치환 대상)
+TEXT_KEYS = ('label', 'description', 'placeholder', 'text', 'title')
+CHILDREN_KEYS = ('child', 'children')
+# 라벨을 치환하지 않는 속성 (값이 식별자인 속성)
+IDENTIFIER_ATTRIBUTES = ('id', 'key', 'ref', 'name', 'type', 'className', 'class', 'htmlFor', 'src', 'href')
+# 새 라벨에 있으면 JSX가 깨질 수 있어 치환하지 않는 문자
+LABEL_UNSAFE_CHARS = '<>{}"\''
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_permutations = {}
+
+
+def _node_token(node):
+    tag = node.get('tag')
+    return f"{node.get('type', '')}/{tag}" if tag else str(node.get('type', ''))
+
+
+def _children(node):
+    for key in CHILDREN_KEYS:
+        children = node.get(key)
+        if isinstance(children, list):
+            return [child for child in children if isinstance(child, dict)]
+    return []
+
+
+def architecture_structure(architecture):
+    """
+    architecture에서 텍스트 필드를 제외한 구조를 반환합니다.
+    """
+    if isinstance(architecture, dict):
+        return {key: architecture_structure(value) for key, value in architecture.items() if key not in TEXT_KEYS}
+    if isinstance(architecture, list):
+        return [architecture_structure(item) for item in architecture]
+    return architecture
+
+
+def architecture_labels(architecture):
+    """
+    architecture의 텍스트 필드 값을 순회 순서대로 반환합니다. (같은 구조끼리는 같은 위치의 라벨이 대응됨)
+
+    Returns:
+        list: [(경로, 값), ...]
+    """
+    labels = []
+
+    def visit(value, path):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key in TEXT_KEYS and isinstance(item, str):
+                    labels.append((f"{path}.{key}", item))
+                else:
+                    visit(item, f"{path}.{key}")
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                visit(item, f"{path}[{index}]")
+
+    visit(architecture, '$')
+    return labels
+
+
+def architecture_shingles(architecture):
+    """
+    architecture의 태그 트리 shingle 집합을 반환합니다.
+
+    - 조상 경로 (최대 FINGERPRINT_PATH_DEPTH단계)
+    - 부모 -> 자식, 이웃한 형제 순서
+    - 속성/스타일 키, 텍스트 필드 유무 (값은 스타일만 포함)
+
+    같은 shingle이 여러 번 나오면 순번을 붙여 노드 수 차이도 유사도에 반영합니다.
+    """
+    shingles = []
+
+    def visit(node, ancestors):
+        token = _node_token(node)
+        path = ancestors[-FINGERPRINT_PATH_DEPTH:] + [token]
+        shingles.append('p:' + '>'.join(path))
+        for key in ('attributes', 'style'):
+            values = node.get(key)
+            if isinstance(values, dict):
+                for name, value in values.items():
+                    shingles.append(f"{key[0]}:{token}.{name}" + (f"={value}" if key == 'style' else ''))
+        for key in TEXT_KEYS:
+            if node.get(key):
+                shingles.append(f"t:{token}.{key}")
+
+        children = _children(node)
+        previous = '^'
+        for child in children:
+            child_token = _node_token(child)
+            shingles.append(f"e:{token}>{child_token}")
+            shingles.append(f"s:{token}:{previous}+{child_token}")
+            previous = child_token
+        if children:
+            shingles.append(f"s:{token}:{previous}+$")
+        for child in children:
+            visit(child, path)
+
+    if isinstance(architecture, dict):
+        visit(architecture, [])
+
+    counts = {}
+    result = []
+    for shingle in shingles:
+        counts[shingle] = counts.get(shingle, 0) + 1
+        result.append(f"{shingle}#{counts[shingle]}")
+    return sorted(set(result))
+
+
+def _get_permutations(num_perm):
+    permutations = _permutations.get(num_perm)
+    if permutations is None:
+        # 서명은 데이터베이스에 저장되므로 프로세스마다 같은 순열을 사용
+        generator = random.Random(1)
+        permutations = [(generator.randrange(1, _MERSENNE_PRIME), generator.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+        _permutations[num_perm] = permutations
+    return permutations
+
+
+def minhash_signature(shingles, num_perm=FINGERPRINT_NUM_PERM):
+    """
+    shingle 집합의 MinHash 서명을 계산합니다. 두 서명에서 같은 위치의 값이 같은 비율이 Jaccard 유사도의 추정값입니다.
+    """
+    hashes = [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big') for shingle in shingles]
+    if not hashes:
+        return [_MAX_HASH] * num_perm
+    return [min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes) for a, b in _get_permutations(num_perm)]
+
+
+def lsh_buckets(signature, bands=FINGERPRINT_BANDS):
+    """
+    서명을 밴드로 나눠 밴드별 버킷 키를 반환합니다. 한 밴드라도 버킷이 같으면 후보가 됩니다.
+
+    Returns:
+        list: [(밴드 번호, 버킷 키), ...]
+    """
+    rows = max(1, len(signature) // bands)
+    return [
+        (band, hashlib.blake2b(json.dumps(signature[band * rows:(band + 1) * rows]).encode('utf-8'), digest_size=8).hexdigest())
+        for band in range(bands)
+    ]
+
+
+def estimate_similarity(signature, other):
+    """
+    두 MinHash 서명으로 Jaccard 유사도를 추정합니다.
+    """
+    if not signature or len(signature) != len(other):
+        return 0.0
+    return sum(1 for a, b in zip(signature, other) if a == b) / len(signature)
+
+
+def jaccard_similarity(shingles, other):
+    """
+    두 shingle 집합의 Jaccard 유사도를 계산합니다.
+    """
+    shingles, other = set(shingles), set(other)
+    union = shingles | other
+    return len(shingles & other) / len(union) if union else 1.0
+
+
+def _skip_string(code, index):
+    quote = code[index]
+    index += 1
+    while index < len(code):
+        if code[index] == '\\':
+            index += 2
+            continue
+        if code[index] == quote:
+            return index + 1
+        index += 1
+    return len(code)
+
+
+def _skip_expression(code, index):
+    depth = 0
+    while index < len(code):
+        char = code[index]
+        if char in '\'"`':
+            index = _skip_string(code, index)
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return index + 1
+        index += 1
+    return len(code)
+
+
+def _tag_segments(code, index, segments):
+    start = index
+    while index < len(code) and code[index] != '>':
+        char = code[index]
+        if char == '{':
+            segments.append(('code', code[start:index]))
+            end = _skip_expression(code, index)
+            segments.append(('code', code[index:end]))
+            start = index = end
+        elif char in '"\'':
+            end = _skip_string(code, index)
+            if end - index < 2 or code[end - 1] != char:
+                # 닫히지 않은 문자열은 나머지를 코드로 처리
+                index = len(code)
+                break
+            name = re.search(r'([\w:.-]*)\s*=\s*$', code[start:index])
+            kind = 'value' if name and name.group(1) and name.group(1) not in IDENTIFIER_ATTRIBUTES else 'code'
+            segments.append(('code', code[start:index + 1]))
+            segments.append((kind, code[index + 1:end - 1]))
+            start = end - 1
+            index = end
+        else:
+            index += 1
+    end = index + 1 if index < len(code) else len(code)
+    segments.append(('code', code[start:end]))
+    return end
+
+
+def jsx_segments(code):
+    """
+    JSX 코드를 (종류, 문자열) 조각으로 나눕니다. 조각을 순서대로 이어 붙이면 원래 코드가 됩니다.
+
+    Returns:
+        list: [(종류, 문자열), ...]
+              종류는 'text'(텍스트 노드), 'value'(속성의 문자열 값), 'code'(태그/속성 이름, {...} 표현식 등)
+    """
+    segments = []
+    index = 0
+    while index < len(code):
+        char = code[index]
+        if char == '{':
+            end = _skip_expression(code, index)
+            segments.append(('code', code[index:end]))
+        elif char == '<':
+            end = _tag_segments(code, index, segments)
+        else:
+            end = index
+            while end < len(code) and code[end] not in '<{':
+                end += 1
+            segments.append(('text', code[index:end]))
+        index = end
+    return segments
+
+
+def substitute_labels(component, source_labels, target_labels):
+    """
+    같은 구조의 컴포넌트에서 라벨만 바꿉니다. (모델 호출 없이 재사용)
+    라벨은 html의 텍스트 노드와 속성의 문자열 값(id, className 등 식별자 속성 제외)에서만 바꾸므로
+    표현식, 상태/함수 이름(예: setEmail), functions는 바뀌지 않습니다.
+    바뀌는 라벨이 그 위치에 그대로 들어 있지 않거나, 같은 라벨을 서로 다른 값으로 바꿔야 하거나,
+    새 라벨에 JSX 특수 문자가 있으면 치환할 수 없습니다.
+
+    Args:
+        component: 저장된 컴포넌트 (dict)
+        source_labels (list): 저장된 컴포넌트를 생성한 architecture의 architecture_labels
+        target_labels (list): 요청 architecture의 architecture_labels
+
+    Returns:
+        치환한 컴포넌트 또는 치환할 수 없으면 None
+    """
+    if [path for path, _ in source_labels] != [path for path, _ in target_labels]:
+        return None
+
+    mapping = {}
+    for (_, source), (_, target) in zip(source_labels, target_labels):
+        if source == target:
+            continue
+        if not source or mapping.get(source, target) != target or any(char in target for char in LABEL_UNSAFE_CHARS):
+            return None
+        mapping[source] = target
+    if not mapping:
+        return component
+    if not isinstance(component, dict) or not isinstance(component.get('html'), str):
+        return None
+
+    segments = jsx_segments(component['html'])
+    editable = [text for kind, text in segments if kind != 'code']
+    expressions = [text for kind, text in segments if kind == 'code' and text.startswith('{')]
+    unchanged = {source for _, source in source_labels if source not in mapping}
+    for source in mapping:
+        # 라벨이 텍스트/속성 값에 없거나(모델이 다시 쓴 경우) 바뀌지 않는 다른 라벨의 일부이면 치환하지 않음
+        if not any(source in text for text in editable) or any(source in other for other in unchanged):
+            return None
+        # {...} 표현식 안의 문자열/JSX에도 라벨이 있으면 일부만 바뀌므로 치환하지 않음 (식별자의 일부는 제외)
+        token = re.compile(r'(?<![\w$])' + re.escape(source) + r'(?![\w$])')
+        if any(token.search(text) for text in expressions):
+            return None
+
+    # 긴 라벨부터 placeholder로 바꾼 뒤 새 라벨로 바꿔 치환 결과가 다시 치환되지 않도록 함
+    placeholders = {f"\u0000{index}\u0000": source for index, source in enumerate(sorted(mapping, key=len, reverse=True))}
+
+    def replace(text):
+        for placeholder, source in placeholders.items():
+            text = text.replace(source, placeholder)
+        for placeholder, source in placeholders.items():
+            text = text.replace(placeholder, mapping[source])
+        return text
+
+    html = ''.join(text if kind == 'code' else replace(text) for kind, text in segments)
+    return {**component, 'html': html}
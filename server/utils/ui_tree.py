@@ -0,0 +1,284 @@
+import os
+import re
+import json
+from utils.langchain import calculate_tokens
+
+# 증분 생성 설정 (기본값 꺼짐)
+# 켜면 트리 id(treeId 또는 id)가 있고 최상위 하위 노드(child/children)가 INCREMENTAL_MIN_CHILDREN개 이상인 architecture를
+# 하위 트리별로 생성한 뒤 합쳐서(stitch) 반환하고, 같은 트리의 다음 요청에서는 바뀐 하위 트리만 다시 생성합니다.
+# 하위 트리는 서로를 모른 채 생성되므로 한 번에 생성한 결과와 다를 수 있어 요청하는 쪽에서 켜야 합니다.
+INCREMENTAL_ENABLED = os.getenv('LANGCHAIN_INCREMENTAL', 'False') == 'True'
+INCREMENTAL_MIN_CHILDREN = int(os.getenv('LANGCHAIN_INCREMENTAL_MIN_CHILDREN', 2))
+
+# 분할 생성 설정
+# architecture(하위 트리)의 토큰 수가 토큰 예산을 넘으면 하위 트리로 다시 나눠 병렬로 생성합니다.
+# 큰 페이지도 각 호출의 출력이 max_tokens 안에 들어오고, 전체 시간은 가장 큰 하위 트리의 생성 시간에 가까워집니다.
+# 토큰 예산을 지정하지 않으면 선택된 모델의 max_tokens / SPLIT_OUTPUT_RATIO를 사용합니다.
+SPLIT_ENABLED = os.getenv('LANGCHAIN_SPLIT', 'True') == 'True'
+SPLIT_TOKEN_BUDGET = int(os.getenv('LANGCHAIN_SPLIT_TOKEN_BUDGET', 0))
+# architecture 토큰 1개당 생성되는 JSX 코드 토큰 수 (대략적인 값)
+SPLIT_OUTPUT_RATIO = float(os.getenv('LANGCHAIN_SPLIT_OUTPUT_RATIO', 2))
+SPLIT_MAX_CONCURRENCY = int(os.getenv('LANGCHAIN_SPLIT_MAX_CONCURRENCY', 8))
+
+# 하위 노드 목록 키 (client/src/types의 DOMBluePrint.child)
+CHILDREN_KEYS = ('child', 'children')
+# 합친 결과의 최상위 태그로 사용할 수 있는 태그
+CONTAINER_TAGS = ('div', 'ul', 'li', 'section', 'span', 'p', 'form', 'header', 'footer', 'main', 'nav')
+
+_IMPORT = re.compile(r'^\s*import\s+(?:([A-Za-z_$][\w$]*)\s*,?\s*)?(?:\{([^}]*)\})?\s*from\s+[\'"]([^\'"]+)[\'"]\s*;?\s*$')
+
+
+def get_children_key(architecture):
+    """
+    architecture의 하위 노드 목록 키를 반환합니다. 하위 노드가 없으면 None을 반환합니다.
+    """
+    if not isinstance(architecture, dict):
+        return None
+    for key in CHILDREN_KEYS:
+        children = architecture.get(key)
+        if isinstance(children, list) and children:
+            return key
+    return None
+
+
+def split_architecture(architecture):
+    """
+    architecture를 최상위 노드(shell, 하위 노드 제외)와 하위 노드 목록으로 나눕니다.
+
+    Returns:
+        tuple: (shell, children)
+    """
+    key = get_children_key(architecture)
+    if key is None:
+        return dict(architecture), []
+    shell = {name: value for name, value in architecture.items() if name != key}
+    return shell, architecture[key]
+
+
+def estimate_architecture_tokens(architecture):
+    """
+    architecture의 프롬프트 토큰 수를 추정합니다.
+    """
+    return calculate_tokens(json.dumps(architecture, ensure_ascii=False))
+
+
+def split_token_budget(max_tokens):
+    """
+    분할 생성의 토큰 예산을 반환합니다. LANGCHAIN_SPLIT_TOKEN_BUDGET이 없으면 모델의 최대 출력 토큰 수로 계산합니다.
+    """
+    return SPLIT_TOKEN_BUDGET or int(max_tokens / SPLIT_OUTPUT_RATIO)
+
+
+def plan_architecture(architecture, budget):
+    """
+    architecture를 생성 단위(하위 트리)로 나누는 계획을 만듭니다.
+    최상위 노드는 증분 생성 대상(INCREMENTAL_ENABLED, 트리 id가 있고 하위 노드가 INCREMENTAL_MIN_CHILDREN개 이상)이거나
+    토큰 수가 budget을 넘으면(분할 생성) 나누고, 그 아래 하위 트리는 토큰 수가 budget을 넘을 때만 다시 나눕니다.
+
+    Args:
+        architecture (dict): 요청 architecture
+        budget (int): 토큰 예산 (split_token_budget)
+
+    Returns:
+        dict: {'unit': architecture} (그대로 생성) 또는 {'shell', 'new_id', 'children': [하위 계획, ...]} (나눠서 생성 후 합침)
+    """
+
+    def plan(node, min_children):
+        shell, children = split_architecture(node)
+        splittable = bool(children) and all(isinstance(child, dict) for child in children)
+        if splittable and ((min_children and len(children) >= min_children) or (SPLIT_ENABLED and estimate_architecture_tokens(node) > budget)):
+            new_id = node.get('newId', '')
+            return {
+                'shell': shell,
+                'new_id': new_id,
+                'children': [plan(unit_architecture(child, new_id, index), None) for index, child in enumerate(children)],
+            }
+        return {'unit': node}
+
+    incremental = INCREMENTAL_ENABLED and get_tree_id(architecture) is not None
+    return plan(architecture, INCREMENTAL_MIN_CHILDREN if incremental else None)
+
+
+def plan_units(plan):
+    """
+    계획에서 실제로 생성할 하위 트리 목록을 순서대로 반환합니다.
+    """
+    if 'unit' in plan:
+        return [plan['unit']]
+    return [unit for child in plan['children'] for unit in plan_units(child)]
+
+
+def compose_plan(plan, fragments):
+    """
+    plan_units 순서로 생성한 결과를 계획에 따라 아래에서부터 합칩니다.
+
+    Returns:
+        tuple: (합친 컴포넌트, 오류 메시지 목록)
+    """
+    fragments = iter(fragments)
+    errors = []
+
+    def compose(node):
+        if 'unit' in node:
+            return next(fragments)
+        children = [compose(child) for child in node['children']]
+        component = stitch_components(node['shell'], node['new_id'], children)
+        errors.extend(validate_stitched(component, children))
+        return component
+
+    return compose(plan), errors
+
+
+def get_tree_id(architecture):
+    """
+    요청 간에 같은 컴포넌트 트리를 식별하는 id를 반환합니다. (treeId > id)
+    newId는 요청마다 바뀌므로 사용하지 않습니다.
+    """
+    for key in ('treeId', 'id'):
+        value = architecture.get(key)
+        if isinstance(value, str) and value:
+            return value
+    return None
+
+
+def unit_architecture(child, parent_id, index):
+    """
+    하위 노드를 단독으로 생성할 수 있도록 newId를 채워 반환합니다.
+    """
+    if isinstance(child.get('newId'), str) and child['newId']:
+        return child
+    return {**child, 'newId': f"{parent_id or 'node'}-{index}"}
+
+
+def diff_units(previous, current):
+    """
+    이전 요청과 현재 요청의 하위 트리 해시 목록을 비교합니다.
+
+    Returns:
+        dict: added(새로 생기거나 바뀐 하위 트리 수), removed, unchanged
+    """
+    previous = previous or []
+    remaining = list(previous)
+    unchanged = 0
+    for unit in current:
+        if unit in remaining:
+            remaining.remove(unit)
+            unchanged += 1
+    return {'added': len(current) - unchanged, 'removed': len(remaining), 'unchanged': unchanged}
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [item for item in value if isinstance(item, str)]
+    return [value] if isinstance(value, str) and value.strip() else []
+
+
+def merge_imports(imports):
+    """
+    import 문을 모듈별로 합칩니다. (예: React, { useState } + { useEffect } -> React, { useState, useEffect })
+    해석할 수 없는 import 문은 중복만 제거합니다.
+    """
+    modules = {}
+    others = []
+    for statement in imports:
+        match = _IMPORT.match(statement)
+        if match is None:
+            if statement not in others:
+                others.append(statement)
+            continue
+        default, named, module = match.groups()
+        entry = modules.setdefault(module, {'default': None, 'named': []})
+        entry['default'] = entry['default'] or default
+        for name in (named or '').split(','):
+            name = name.strip()
+            if name and name not in entry['named']:
+                entry['named'].append(name)
+
+    merged = []
+    for module, entry in modules.items():
+        parts = [entry['default']] if entry['default'] else []
+        if entry['named']:
+            parts.append('{ ' + ', '.join(entry['named']) + ' }')
+        merged.append(f"import {', '.join(parts)} from '{module}';")
+    return merged + others
+
+
+def _component_name(shell):
+    words = re.findall(r'[A-Za-z0-9]+', str(shell.get('component_name') or shell.get('type') or ''))
+    name = ''.join(word[:1].upper() + word[1:] for word in words)
+    return name if name and not name[0].isdigit() else 'Container'
+
+
+def _sub_component(name, fragment):
+    """
+    하위 트리 결과를 부모 컴포넌트 안에서 선언하는 하위 컴포넌트 코드로 만듭니다.
+    상태/함수/styles는 하위 컴포넌트 범위에 있으므로 다른 하위 트리와 이름이 같아도 충돌하지 않습니다.
+    """
+    lines = [f"const {name} = () => {{"]
+    styles = fragment.get('styles')
+    if isinstance(styles, dict) and styles:
+        lines.append(f"  const styles = {json.dumps(styles, ensure_ascii=False)};")
+    lines.extend(f"  {statement}" for statement in _as_list(fragment.get('functions')))
+    lines.append("  return (")
+    lines.append(str(fragment.get('html', '')))
+    lines.append("  );")
+    lines.append("};")
+    return '\n'.join(lines)
+
+
+def stitch_components(shell, new_id, fragments):
+    """
+    하위 트리별로 생성한 컴포넌트를 하나의 컴포넌트로 합칩니다.
+    각 하위 트리는 하위 컴포넌트(컴포넌트이름Part순번)로 선언하고 최상위 노드에서 순서대로 렌더링하므로
+    하위 트리의 html과 functions는 바꾸지 않습니다.
+    (하위 컴포넌트는 부모 컴포넌트 안에서 선언되므로 부모가 다시 렌더링되면 상태가 초기화됩니다. 부모에는 상태가 없음)
+
+    Args:
+        shell (dict): 하위 노드를 제외한 최상위 노드
+        new_id (str): 최상위 노드의 id
+        fragments (list): 하위 트리별 생성 결과 (req_ui_component 응답 형식)
+
+    Returns:
+        dict: req_ui_component 응답 형식의 컴포넌트
+    """
+    tag = shell.get('tag') if shell.get('tag') in CONTAINER_TAGS else 'div'
+    style = shell.get('style')
+    style_attribute = f" style={{{json.dumps(style, ensure_ascii=False)}}}" if isinstance(style, dict) and style else ''
+    component_name = _component_name(shell)
+
+    elements = []
+    functions = []
+    imports = []
+    for index, fragment in enumerate(fragments):
+        # 형식이 잘못된 결과는 validate_stitched에서 오류로 처리
+        fragment = fragment if isinstance(fragment, dict) else {}
+        name = f"{component_name}Part{index + 1}"
+        functions.append(_sub_component(name, fragment))
+        elements.append(f"  <{name} />")
+        imports.extend(_as_list(fragment.get('imports')))
+
+    return {
+        'new_id': new_id,
+        'html': f'<{tag} id="{new_id}"{style_attribute}>\n' + '\n'.join(elements) + f'\n</{tag}>',
+        'functions': functions,
+        'component_name': component_name,
+        'imports': merge_imports(imports),
+    }
+
+
+def validate_stitched(component, fragments):
+    """
+    합칠 하위 트리 결과를 검증합니다.
+
+    Returns:
+        list: 오류 메시지 목록 (비어 있으면 정상)
+    """
+    errors = []
+    for index, fragment in enumerate(fragments):
+        if not isinstance(fragment, dict) or not isinstance(fragment.get('html'), str) or not fragment['html'].strip():
+            errors.append(f"하위 트리 {index}의 html이 없습니다.")
+        elif fragment.get('new_id') and str(fragment['new_id']) not in fragment['html']:
+            errors.append(f"하위 트리 {index}의 id({fragment['new_id']})가 html에 없습니다.")
+    return errors
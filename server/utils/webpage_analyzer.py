@@ -9,6 +9,21 @@ from PIL import Image
 import io
 import os
 import base64
+from utils.image_store import cached_image_result, image_metadata, KIND_FEATURES
+from utils.metrics import stage_timer
+
+
+def _image_bytes(img_input):
+    """
+    base64 문자열(data URL 포함)이면 디코딩하고, 이미지 바이트면 복사 없이 그대로 반환합니다.
+    """
+    if isinstance(img_input, (bytes, bytearray, memoryview)):
+        return img_input
+    # base64 문자열이 'data:image/jpeg;base64,' 같은 프리픽스를 포함할 경우 제거
+    if ',' in img_input:
+        img_input = img_input.split(',')[1]
+    return base64.b64decode(img_input)
+
 
 class WebpageAnalyzer:
     def __init__(self):
@@ -64,21 +79,17 @@ class WebpageAnalyzer:
         # 실제 구현에서는 웹페이지 스크린샷 데이터셋으로 훈련 필요
         return None  # 실제 구현 필요
     
-    def preprocess_screenshot(self, img_input, is_base64=False):
+    def load_screenshot(self, img_input, is_base64=False):
         """
-        웹페이지 스크린샷 전처리
+        웹페이지 스크린샷을 224x224 이미지로 불러오기 (전처리와 결과 시각화에서 사용)
         
         Args:
-            img_input: 이미지 경로 또는 base64 인코딩된 이미지 문자열
+            img_input: 이미지 경로, base64 인코딩된 이미지 문자열 또는 이미지 바이트
             is_base64: 입력이 base64 인코딩된 문자열인지 여부
         """
-        if is_base64:
-            # Base64 문자열에서 이미지 로드
-            # base64 문자열이 'data:image/jpeg;base64,' 같은 프리픽스를 포함할 경우 제거
-            if ',' in img_input:
-                img_input = img_input.split(',')[1]
-                
-            img_data = base64.b64decode(img_input)
+        if is_base64 or isinstance(img_input, (bytes, bytearray, memoryview)):
+            # Base64 문자열 또는 업로드된 바이트에서 이미지 로드
+            img_data = _image_bytes(img_input)
             img = Image.open(io.BytesIO(img_data))
             
             # 이미지가 RGBA 모드인 경우 RGB로 변환 (알파 채널 제거)
@@ -90,6 +101,18 @@ class WebpageAnalyzer:
             # 파일 경로에서 이미지 로드
             img = image.load_img(img_input, target_size=(224, 224), color_mode='rgb')
         
+        return img
+    
+    def preprocess_screenshot(self, img_input, is_base64=False):
+        """
+        웹페이지 스크린샷 전처리
+        
+        Args:
+            img_input: 이미지 경로, base64 인코딩된 이미지 문자열 또는 이미지 바이트
+            is_base64: 입력이 base64 인코딩된 문자열인지 여부
+        """
+        img = self.load_screenshot(img_input, is_base64)
+        
         # 이미지 배열로 변환
         img_array = image.img_to_array(img)
         img_array = np.expand_dims(img_array, axis=0)
@@ -113,7 +136,8 @@ class WebpageAnalyzer:
                 print(f"RGB로 변환된 이미지 형태: {processed_img.shape}")
             
             # 특징 추출
-            features = self.feature_model.predict(processed_img)
+            with stage_timer('backbone_forward', model='resnet50'):
+                features = self.feature_model.predict(processed_img)
             return features
         except ValueError as e:
             print(f"특징 추출 중 오류 발생: {e}")
@@ -127,27 +151,16 @@ class WebpageAnalyzer:
         웹페이지 스크린샷에서 UI 요소 탐지
         
         Args:
-            img_input: 이미지 경로 또는 base64 인코딩된 이미지 문자열
+            img_input: 이미지 경로, base64 인코딩된 이미지 문자열 또는 이미지 바이트
             is_base64: 입력이 base64 인코딩된 문자열인지 여부
         """
         # 실제 구현에서는 객체 탐지 모델 사용
         # 여기서는 샘플 결과를 위해 이미지 크기만 추출
         
-        if is_base64:
-            # Base64 문자열에서 이미지 로드
-            if ',' in img_input:
-                img_input = img_input.split(',')[1]
-                
-            img_data = base64.b64decode(img_input)
-            img_array = np.frombuffer(img_data, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                # 이미지 로드에 실패한 경우 다른 방법으로 시도
-                pil_img = Image.open(io.BytesIO(img_data))
-                if pil_img.mode == 'RGBA':
-                    pil_img = pil_img.convert('RGB')
-                img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+        if is_base64 or isinstance(img_input, (bytes, bytearray, memoryview)):
+            # 크기만 필요하므로 전체 디코딩 대신 이미지 헤더(저장소에 공유되는 메타데이터) 사용
+            metadata = image_metadata(_image_bytes(img_input))
+            width, height = metadata['width'], metadata['height']
         else:
             # 파일 경로에서 이미지 로드
             img = cv2.imread(img_input)
@@ -155,8 +168,7 @@ class WebpageAnalyzer:
                 # 다른 방법으로 시도
                 pil_img = Image.open(img_input).convert('RGB')
                 img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-        
-        height, width = img.shape[:2]
+            height, width = img.shape[:2]
         
         # 샘플 UI 요소 (실제 구현에서는 모델이 탐지)
         sample_elements = [
@@ -276,18 +288,39 @@ class WebpageAnalyzer:
         웹페이지 스크린샷 분석 및 결과 반환
         
         Args:
-            screenshot_input: 이미지 경로 또는 base64 인코딩된 이미지 문자열
+            screenshot_input: 이미지 경로, base64 인코딩된 이미지 문자열 또는 이미지 바이트
             is_base64: 입력이 base64 인코딩된 문자열인지 여부
         """
         try:
-            # 이미지 전처리
-            processed_img, original_img = self.preprocess_screenshot(screenshot_input, is_base64)
-            
-            # 특징 추출
-            features = self.extract_features(processed_img)
+            # 전처리와 UI 요소 탐지에서 각각 디코딩하지 않도록 한 번만 디코딩
+            if is_base64:
+                screenshot_input = _image_bytes(screenshot_input)
+
+            decoded = {}
+
+            def compute_features(_):
+                # 이미지 전처리 (저장소에 특징이 있으면 전처리도 하지 않음)
+                with stage_timer('image_decode', model='resnet50'):
+                    processed_img, decoded['original'] = self.preprocess_screenshot(screenshot_input, is_base64)
+                return self.extract_features(processed_img)
+
+            # 특징 추출 (같은 이미지의 특징은 이미지 결과 저장소에서 가져옴, 오류 시의 더미 특징은 저장하지 않음)
+            if isinstance(screenshot_input, (bytes, bytearray, memoryview)):
+                features, _ = cached_image_result(
+                    'resnet50_backbone', screenshot_input, compute_features,
+                    kind=KIND_FEATURES, cacheable=lambda features: bool(np.any(features))
+                )
+            else:
+                features = compute_features(screenshot_input)
+
+            # 저장소에서 특징을 가져온 경우 시각화할 이미지만 불러옴 (ResNet50 전처리 없이)
+            original_img = decoded.get('original')
+            if original_img is None:
+                original_img = self.load_screenshot(screenshot_input, is_base64)
             
             # UI 요소 탐지
-            ui_elements = self.detect_ui_elements(screenshot_input, is_base64)
+            with stage_timer('ui_detection', model='opencv'):
+                ui_elements = self.detect_ui_elements(screenshot_input, is_base64)
             
             # 웹페이지 기능 분류
             webpage_function = self.classify_webpage_function(features)